@@ -25,10 +25,12 @@
         'security/wallet_security.xml',
         'security/ir.model.access.csv',
         'data/wallet_sequences.xml',
+        'data/wallet_cron.xml',
         'views/wallet_transaction_views.xml',
         'views/wallet_topup_views.xml',
         'views/res_partner_views.xml',
         'views/portal_templates.xml',
+        'wizard/wallet_topup_bulk_views.xml',
         'data/wallet_product_data.xml',
         'data/email_templates.xml',
     ],
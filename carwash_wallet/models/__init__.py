@@ -2,4 +2,7 @@
 
 from . import res_partner
 from . import wallet_transaction
+from . import wallet_ledger
 from . import wallet_topup
+from . import wallet_topup_state_log
+from . import wallet_hold
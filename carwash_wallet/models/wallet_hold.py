@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from datetime import timedelta
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# A hold nobody captured or released frees its funds after this long
+HOLD_TTL_MINUTES = 30
+
+
+class WalletHold(models.Model):
+    _name = 'wallet.hold'
+    _description = 'Wallet Balance Hold'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Reference',
+        required=True,
+        readonly=True,
+        index=True,
+        help='POS order or lane reference the funds are reserved for'
+    )
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Customer',
+        required=True,
+        readonly=True,
+        ondelete='restrict'
+    )
+
+    amount = fields.Monetary(
+        string='Held Amount',
+        currency_field='currency_id',
+        required=True,
+        readonly=True
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        related='partner_id.currency_id'
+    )
+
+    state = fields.Selection([
+        ('active', 'Active'),
+        ('captured', 'Captured'),
+        ('released', 'Released'),
+        ('expired', 'Expired')
+    ], string='Status', default='active', required=True, readonly=True)
+
+    expires_at = fields.Datetime(
+        string='Expires At',
+        required=True,
+        readonly=True
+    )
+
+    wallet_transaction_id = fields.Many2one(
+        'wallet.transaction',
+        string='Wallet Transaction',
+        readonly=True,
+        help='Debit posted when the hold was captured'
+    )
+
+    def init(self):
+        # available balance sums the active holds of one customer; the reaper scans by expiry
+        tools.create_index(
+            self._cr, 'wallet_hold_active_partner_idx', self._table,
+            ['partner_id', 'expires_at'], where="state = 'active'",
+        )
+        tools.create_index(
+            self._cr, 'wallet_hold_active_expiry_idx', self._table,
+            ['expires_at'], where="state = 'active'",
+        )
+
+    @api.model
+    def _held_amounts(self, partner_ids):
+        """Sum of unexpired active holds per customer, in one aggregate over the partial index"""
+        self.flush_model(['partner_id', 'amount', 'state', 'expires_at'])
+        self.env.cr.execute("""
+            SELECT partner_id, SUM(amount)
+              FROM wallet_hold
+             WHERE state = 'active' AND partner_id = ANY(%s) AND expires_at > %s
+             GROUP BY partner_id
+        """, (list(partner_ids), fields.Datetime.now()))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _available_balance(self, partner):
+        """Wallet balance minus the funds reserved by active holds"""
+        return partner.wallet_balance - self._held_amounts(partner.ids).get(partner.id, 0.0)
+
+    @api.model
+    def _place(self, partner, amount, reference, ttl_minutes=HOLD_TTL_MINUTES):
+        """Reserve ``amount`` of the customer's balance for a POS order and return the hold.
+
+        The availability check and the insert are one statement against the
+        customer's row in ``wallet_hold_total``, never against ``res_partner``.
+        Two lanes placing holds on the same customer conflict on that row: under
+        repeatable read the lane that waited gets a serialization error and is
+        retried, instead of checking against a snapshot that misses the other
+        lane's hold. Top-ups and other partner writes are not held up by it.
+        """
+        if amount <= 0:
+            raise UserError('Hold amount must be greater than zero')
+        # funds of this customer's lapsed holds are free again, reaped or not
+        self._expire(partner_ids=partner.ids)
+        self.flush_model()
+        partner.flush_recordset(['wallet_balance'])
+        now = fields.Datetime.now()
+        self.env.cr.execute("""
+            WITH reserved AS (
+                INSERT INTO wallet_hold_total AS t (partner_id, held_amount)
+                SELECT p.id, %(amount)s
+                  FROM res_partner p
+                 WHERE p.id = %(partner)s AND COALESCE(p.wallet_balance, 0) >= %(amount)s
+                    ON CONFLICT (partner_id) DO UPDATE
+                   SET held_amount = t.held_amount + EXCLUDED.held_amount
+                 WHERE (SELECT COALESCE(wallet_balance, 0) FROM res_partner WHERE id = t.partner_id)
+                       - t.held_amount >= EXCLUDED.held_amount
+             RETURNING t.partner_id
+            )
+            INSERT INTO wallet_hold (name, partner_id, amount, state, expires_at,
+                                     create_uid, create_date, write_uid, write_date)
+            SELECT %(name)s, partner_id, %(amount)s, 'active', %(expires)s, %(uid)s, %(now)s, %(uid)s, %(now)s
+              FROM reserved
+         RETURNING id
+        """, {
+            'partner': partner.id,
+            'amount': amount,
+            'name': reference,
+            'now': now,
+            'expires': now + timedelta(minutes=ttl_minutes),
+            'uid': self.env.uid,
+        })
+        row = self.env.cr.fetchone()
+        self.env['wallet.hold.total'].invalidate_model()
+        partner.invalidate_recordset(['wallet_held_amount', 'wallet_available_balance'])
+        if not row:
+            available = self._available_balance(partner)
+            raise UserError('Insufficient wallet balance: %.2f available, %.2f requested' % (available, amount))
+        return self.browse(row[0])
+
+    def action_capture(self, amount=None):
+        """Debit the held funds (or less, for a smaller final bill) and close the hold"""
+        self.ensure_one()
+
+        if self.state != 'active' or self.expires_at <= fields.Datetime.now():
+            raise UserError('Only active, unexpired holds can be captured')
+        amount = self.amount if amount is None else amount
+        if amount <= 0 or amount > self.amount:
+            raise UserError('Captured amount must be positive and not exceed the held amount')
+
+        # claim the hold first: a concurrent capture or release of the same hold finds nothing to update
+        if not self._transition('captured'):
+            raise UserError('This hold was already captured or released')
+
+        # the debit may not eat into funds the customer's other holds reserved
+        reserved = self._held_amounts(self.partner_id.ids).get(self.partner_id.id, 0.0)
+        wallet_transaction = self.partner_id._post_wallet_entry(
+            'debit',
+            amount,
+            self.name,
+            f'POS wallet payment {self.name}',
+            reserved=reserved
+        )
+        self.wallet_transaction_id = wallet_transaction
+        return wallet_transaction
+
+    def action_release(self):
+        """Give the held funds back, e.g. when the POS order is cancelled"""
+        self._transition('released')
+        return True
+
+    def _transition(self, state):
+        """Move active holds to ``state`` and free their funds; returns the holds that moved"""
+        if not self:
+            return self
+        self.flush_recordset(['state'])
+        moved = self._close("id IN %s", [tuple(self.ids)], state)
+        self.invalidate_recordset(['state', 'write_uid', 'write_date'])
+        return self.browse(moved)
+
+    def _close(self, where, params, state):
+        """Move the active holds matching ``where`` to ``state`` and take them off the
+        customers' held totals in the same statement; returns the ids that moved."""
+        self.env['wallet.hold.total'].flush_model()
+        self.env.cr.execute("""
+            WITH moved AS (
+                UPDATE wallet_hold
+                   SET state = %s,
+                       write_uid = %s,
+                       write_date = (now() at time zone 'UTC')
+                 WHERE state = 'active' AND """ + where + """
+             RETURNING id, partner_id, amount
+            ), freed AS (
+                UPDATE wallet_hold_total t
+                   SET held_amount = GREATEST(t.held_amount - agg.total, 0)
+                  FROM (SELECT partner_id, SUM(amount) AS total FROM moved GROUP BY partner_id) agg
+                 WHERE t.partner_id = agg.partner_id
+            )
+            SELECT id FROM moved
+        """, [state, self.env.uid] + params)
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['wallet.hold.total'].invalidate_model()
+        return ids
+
+    @api.model
+    def _expire(self, partner_ids=None, limit=None):
+        """Mark lapsed active holds expired, optionally only those of ``partner_ids``"""
+        where = "id IN (SELECT id FROM wallet_hold WHERE state = 'active' AND expires_at <= %s"
+        params = [fields.Datetime.now()]
+        if partner_ids is not None:
+            where += " AND partner_id = ANY(%s)"
+            params.append(list(partner_ids))
+        where += " ORDER BY expires_at"
+        if limit:
+            where += " LIMIT %s"
+            params.append(limit)
+        where += " FOR UPDATE SKIP LOCKED)"
+        self.flush_model(['state', 'expires_at'])
+        expired = self._close(where, params, 'expired')
+        self.invalidate_model(['state', 'write_uid', 'write_date'])
+        return expired
+
+    @api.model
+    def _cron_reap_expired(self, batch_size=5000):
+        """Mark expired holds in bounded SQL batches. Returns how many were reaped."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        total = 0
+        while True:
+            count = len(self._expire(limit=batch_size))
+            total += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        if total:
+            _logger.info("Reaped %s expired wallet holds", total)
+        return total
+
+
+class WalletHoldTotal(models.Model):
+    _name = 'wallet.hold.total'
+    _description = 'Wallet Held Total'
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Customer',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    held_amount = fields.Float(
+        string='Held Amount',
+        readonly=True,
+        help='Sum of the active holds of the customer, kept by the hold statements themselves'
+    )
+
+    # the unique index is what placing a hold upserts on
+    _sql_constraints = [
+        ('partner_uniq', 'unique(partner_id)', 'There is already a held total for this customer.'),
+    ]
+
+    def init(self):
+        # customers with active holds from before the totals existed
+        self._cr.execute("""
+            INSERT INTO wallet_hold_total (partner_id, held_amount)
+            SELECT partner_id, SUM(amount) FROM wallet_hold WHERE state = 'active' GROUP BY partner_id
+                ON CONFLICT (partner_id) DO NOTHING
+        """)
+
+
+class ResPartnerWalletHold(models.Model):
+    _inherit = 'res.partner'
+
+    wallet_held_amount = fields.Monetary(
+        string='Held in Wallet',
+        currency_field='currency_id',
+        compute='_compute_wallet_available_balance'
+    )
+
+    wallet_available_balance = fields.Monetary(
+        string='Available Wallet Balance',
+        currency_field='currency_id',
+        compute='_compute_wallet_available_balance'
+    )
+
+    def _compute_wallet_available_balance(self):
+        """Balance minus active holds, for the whole recordset in one aggregate query"""
+        held = self.env['wallet.hold']._held_amounts([pid for pid in self.ids if isinstance(pid, int)])
+        for partner in self:
+            partner.wallet_held_amount = held.get(partner.id, 0.0)
+            partner.wallet_available_balance = partner.wallet_balance - partner.wallet_held_amount
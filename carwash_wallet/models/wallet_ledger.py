@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, tools
+from odoo.exceptions import UserError
+
+# Balances are compared with this tolerance before a debit is refused
+AMOUNT_TOLERANCE = 0.005
+
+
+class WalletTransactionLedger(models.Model):
+    _inherit = 'wallet.transaction'
+
+    topup_id = fields.Many2one(
+        'wallet.topup',
+        string='Top-up',
+        readonly=True,
+        ondelete='restrict',
+        help='Top-up this credit was posted for'
+    )
+
+    def init(self):
+        super(WalletTransactionLedger, self).init()
+        # one posted credit per customer and reference: two credits can never share a payment reference
+        if not tools.index_exists(self._cr, 'wallet_transaction_credit_reference_uniq'):
+            self._cr.execute("""
+                CREATE UNIQUE INDEX wallet_transaction_credit_reference_uniq
+                    ON wallet_transaction (partner_id, reference)
+                 WHERE transaction_type = 'credit' AND state = 'done'
+            """)
+        # one posted credit per top-up: a replayed confirmation cannot credit twice
+        if not tools.index_exists(self._cr, 'wallet_transaction_credit_topup_uniq'):
+            self._cr.execute("""
+                CREATE UNIQUE INDEX wallet_transaction_credit_topup_uniq
+                    ON wallet_transaction (topup_id)
+                 WHERE transaction_type = 'credit' AND state = 'done' AND topup_id IS NOT NULL
+            """)
+
+
+class ResPartnerWalletLedger(models.Model):
+    _inherit = 'res.partner'
+
+    def _post_wallet_entry(self, transaction_type, amount, reference, description, reserved=0.0, **values):
+        """Write one done ledger row and move the stored balance by it; returns the wallet.transaction.
+
+        The customer row is locked first. Under repeatable read, a row another
+        transaction changed after our snapshot raises a serialization error (and
+        the request is retried) instead of being read stale, so debits are
+        checked and balance_before/after chained against the real balance.
+
+        Credits are idempotent per top-up (``topup_id`` in ``values``): a
+        replay returns the row already posted for it. A reference another
+        credit of the customer already used is refused rather than silently
+        swallowed, since that credit paid for something else. A debit must leave
+        ``reserved`` (funds held for other orders) in the wallet.
+        """
+        self.ensure_one()
+        if amount <= 0:
+            raise UserError('Amount must be greater than zero')
+        self.flush_recordset(['wallet_balance'])
+        self.env.cr.execute("SELECT COALESCE(wallet_balance, 0) FROM res_partner WHERE id = %s FOR UPDATE", (self.id,))
+        balance = self.env.cr.fetchone()[0]
+        Transaction = self.env['wallet.transaction'].sudo()
+
+        if transaction_type == 'credit':
+            topup_id = values.get('topup_id') or False
+            if topup_id:
+                posted = Transaction.search([
+                    ('topup_id', '=', topup_id),
+                    ('transaction_type', '=', 'credit'),
+                    ('state', '=', 'done')
+                ], limit=1)
+                if posted:
+                    return posted
+            if Transaction.search_count([
+                ('partner_id', '=', self.id),
+                ('reference', '=', reference),
+                ('transaction_type', '=', 'credit'),
+                ('state', '=', 'done')
+            ], limit=1):
+                raise UserError(f'Reference {reference} was already credited to this customer')
+            new_balance = balance + amount
+        else:
+            if balance - reserved < amount - AMOUNT_TOLERANCE:
+                raise UserError('Insufficient wallet balance: %.2f available, %.2f requested' % (
+                    balance - reserved, amount))
+            new_balance = balance - amount
+
+        transaction = Transaction.create(dict(values, **{
+            'partner_id': self.id,
+            'transaction_type': transaction_type,
+            'amount': amount,
+            'balance_before': balance,
+            'balance_after': new_balance,
+            'reference': reference,
+            'description': description,
+            'transaction_date': fields.Datetime.now(),
+            'state': 'done',
+        }))
+        self.env.cr.execute("UPDATE res_partner SET wallet_balance = %s WHERE id = %s", (new_balance, self.id))
+        self.invalidate_recordset(['wallet_balance'])
+        return transaction
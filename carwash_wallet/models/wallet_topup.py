@@ -1,7 +1,29 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 from odoo.exceptions import UserError
+from datetime import timedelta
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Draft/pending top-ups older than this are abandoned checkouts
+TOPUP_EXPIRE_HOURS = 48
+
+# Happy-path transitions; in high-volume mode these go to the state log instead of the chatter
+ROUTINE_TRANSITIONS = {
+    (False, 'draft'),
+    ('draft', 'pending'),
+    ('pending', 'paid'),
+    ('pending', 'credited'),
+    ('paid', 'credited'),
+}
+
+
+class _BenchmarkRollback(Exception):
+    pass
 
 
 class WalletTopup(models.Model):
@@ -16,7 +38,7 @@ class WalletTopup(models.Model):
         copy=False,
         readonly=True,
         index=True,
-        default=lambda self: self.env['ir.sequence'].next_by_code('wallet.topup') or 'New'
+        default='New'
     )
     
     partner_id = fields.Many2one(
@@ -77,12 +99,86 @@ class WalletTopup(models.Model):
     
     notes = fields.Text(string='Notes')
     
+    def init(self):
+        # list views sort on create_date; the sweeper only looks at open top-ups
+        tools.create_index(self._cr, 'wallet_topup_create_date_idx', self._table, ['create_date DESC', 'id DESC'])
+        tools.create_index(
+            self._cr, 'wallet_topup_open_idx', self._table,
+            ['create_date', 'id'], where="state IN ('draft', 'pending')",
+        )
+    
+    state_log_ids = fields.One2many(
+        'wallet.topup.state.log',
+        'topup_id',
+        string='State History',
+        readonly=True
+    )
+    
+    @api.model
+    def _high_volume_mode(self):
+        """Whether routine state changes skip chatter tracking (system parameter carwash_wallet.topup_high_volume)"""
+        if 'wallet_topup_high_volume' in self.env.context:
+            return self.env.context['wallet_topup_high_volume']
+        value = self.env['ir.config_parameter'].sudo().get_param('carwash_wallet.topup_high_volume')
+        return value not in (None, False, '', '0', 'False', 'false')
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Generate sequence for top-up references, one reservation for the whole batch"""
+        unnamed = [vals for vals in vals_list if vals.get('name', 'New') == 'New']
+        if unnamed:
+            for vals, name in zip(unnamed, self._reserve_references(len(unnamed))):
+                vals['name'] = name
+        if not self._high_volume_mode():
+            return super(WalletTopup, self).create(vals_list)
+        # no creation message, follower subscription or initial tracking
+        topups = super(WalletTopup, self.with_context(tracking_disable=True)).create(vals_list)
+        StateLog = self.env['wallet.topup.state.log']
+        for state in set(topups.mapped('state')):
+            StateLog._log({topup.id: False for topup in topups if topup.state == state}, state)
+        return topups.with_env(self.env)
+    
     @api.model
-    def create(self, vals):
-        """Generate sequence for top-up reference"""
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code('wallet.topup') or 'New'
-        return super(WalletTopup, self).create(vals)
+    def _reserve_references(self, count):
+        """Return ``count`` top-up references drawn from the wallet.topup sequence in a single call.
+        
+        A standard sequence hands out the whole block in one ``nextval`` query; a
+        no-gap sequence bumps its counter once under its row lock. Sequences with
+        date ranges fall back to one ``next_by_code`` per reference.
+        """
+        seq = self.env['ir.sequence'].sudo().search([
+            ('code', '=', 'wallet.topup'),
+            ('company_id', 'in', [self.env.company.id, False])
+        ], order='company_id', limit=1)
+        if not seq or seq.use_date_range:
+            return [self.env['ir.sequence'].next_by_code('wallet.topup') or 'New' for _i in range(count)]
+        if seq.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval('ir_sequence_%03d') FROM generate_series(1, %%s)" % seq.id, (count,))
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            step = seq.number_increment
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + %s
+                 WHERE id = %s
+             RETURNING number_next - %s
+            """, (step * count, seq.id, step * count))
+            first = self.env.cr.fetchone()[0]
+            numbers = [first + step * i for i in range(count)]
+            seq.invalidate_recordset(['number_next'])
+        return [seq.get_next_char(number) for number in numbers]
+    
+    def write(self, vals):
+        if 'state' not in vals or not self._high_volume_mode():
+            return super(WalletTopup, self).write(vals)
+        old_states = {topup.id: topup.state for topup in self}
+        routine = all((old, vals['state']) in ROUTINE_TRANSITIONS for old in old_states.values())
+        # manual and exceptional transitions (cancellations, corrections) keep full chatter tracking
+        records = self.with_context(tracking_disable=True) if routine else self
+        res = super(WalletTopup, records).write(vals)
+        self.env['wallet.topup.state.log']._log(old_states, vals['state'])
+        return res
     
     def action_request_payment(self):
         """Generate payment link for customer"""
@@ -101,20 +197,23 @@ class WalletTopup(models.Model):
         }
     
     def action_confirm_payment(self, payment_reference):
-        """Confirm payment received from payment gateway"""
+        """Confirm payment received from payment gateway and credit the wallet"""
         self.ensure_one()
         
         if self.state != 'pending':
             raise UserError('Can only confirm payment for pending top-ups')
         
+        wallet_transaction = self._credit_wallet(payment_reference or self.name)
+        
+        # pending -> credited in a single write (one UPDATE, one state change to track)
         self.write({
-            'state': 'paid',
+            'state': 'credited',
             'payment_reference': payment_reference,
-            'payment_date': fields.Datetime.now()
+            'payment_date': fields.Datetime.now(),
+            'wallet_transaction_id': wallet_transaction.id
         })
         
-        # Credit the wallet
-        self.action_credit_wallet()
+        return wallet_transaction
     
     def action_credit_wallet(self):
         """Credit the amount to customer's wallet"""
@@ -123,25 +222,31 @@ class WalletTopup(models.Model):
         if self.state != 'paid':
             raise UserError('Payment must be confirmed before crediting wallet')
         
-        # Add balance to customer wallet
-        new_balance = self.partner_id.add_wallet_balance(
-            amount=self.amount,
-            reference=self.payment_reference or self.name,
-            description=f'Wallet top-up via {self.name}'
-        )
-        
-        # Link to the created wallet transaction
-        wallet_transaction = self.env['wallet.transaction'].search([
-            ('partner_id', '=', self.partner_id.id),
-            ('reference', '=', self.payment_reference or self.name)
-        ], limit=1)
+        wallet_transaction = self._credit_wallet(self.payment_reference or self.name)
         
         self.write({
             'state': 'credited',
-            'wallet_transaction_id': wallet_transaction.id if wallet_transaction else False
+            'wallet_transaction_id': wallet_transaction.id
         })
         
-        return new_balance
+        return True
+    
+    def _credit_wallet(self, reference):
+        """Add the top-up amount to the customer's wallet and return the wallet.transaction created for it.
+        
+        The ledger row is written here rather than looked up afterwards by
+        (partner, reference). The credit is keyed on this top-up, so a replayed
+        confirmation returns the existing row, while a reference already
+        credited by another top-up is refused.
+        """
+        return self.partner_id._post_wallet_entry(
+            'credit',
+            self.amount,
+            reference,
+            f'Wallet top-up via {self.name}',
+            payment_transaction_id=self.payment_transaction_id.id,
+            topup_id=self.id
+        )
     
     def action_cancel(self):
         """Cancel the top-up request"""
@@ -152,6 +257,122 @@ class WalletTopup(models.Model):
         
         self.state = 'cancelled'
     
+    @api.model
+    def _create_bulk(self, partner_amounts, credit=False, chunk_size=500):
+        """Create top-ups for many customers, request payment for them or credit them right away.
+        
+        ``partner_amounts`` is a list of ``(partner_id, amount)``. Each chunk is
+        created with one ``create`` call and moved to its next state with one
+        ``write``. Nothing is committed here: the batch is one transaction, so
+        a request Odoo retries after a serialization failure starts over
+        instead of crediting the chunks of the failed attempt a second time.
+        ``credit=True`` is for prepaid corporate accounts: the top-ups are
+        credited immediately using their own reference. Returns the ids of the
+        created top-ups.
+        """
+        if any(amount <= 0 for _partner_id, amount in partner_amounts):
+            raise UserError('Top-up amount must be greater than zero')
+        topup_ids = []
+        for chunk in tools.split_every(chunk_size, partner_amounts, list):
+            topups = self.create([{'partner_id': partner_id, 'amount': amount} for partner_id, amount in chunk])
+            topups.write({'state': 'pending'})
+            if credit:
+                for topup in topups:
+                    topup.wallet_transaction_id = topup._credit_wallet(topup.name)
+                topups.write({'state': 'credited', 'payment_date': fields.Datetime.now()})
+            topup_ids += topups.ids
+        _logger.info("Created %s wallet top-ups in bulk (credited: %s)", len(topup_ids), credit)
+        return topup_ids
+    
+    @api.model
+    def _cron_expire_stale(self, max_age_hours=TOPUP_EXPIRE_HOURS, batch_size=1000):
+        """Cancel abandoned draft/pending top-ups in bounded SQL batches.
+
+        Goes around the ORM on purpose: expiring thousands of checkouts must not
+        load them one by one or post a chatter message for each. Returns how
+        many top-ups were cancelled.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.flush_model(['state', 'notes'])
+        cutoff = fields.Datetime.now() - timedelta(hours=max_age_hours)
+        note = 'Expired: no payment after %s hours' % max_age_hours
+        total = 0
+        while True:
+            # the transitions still land in the compact state log
+            self.env.cr.execute("""
+                WITH stale AS (
+                    SELECT id, state FROM wallet_topup
+                     WHERE state IN ('draft', 'pending') AND create_date < %s
+                     ORDER BY create_date, id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                ), expired AS (
+                    UPDATE wallet_topup t
+                       SET state = 'cancelled',
+                           notes = COALESCE(t.notes || E'\\n', '') || %s,
+                           write_uid = %s,
+                           write_date = (now() at time zone 'UTC')
+                      FROM stale
+                     WHERE t.id = stale.id
+                 RETURNING t.id, stale.state AS old_state
+                )
+                INSERT INTO wallet_topup_state_log (topup_id, old_state, new_state, user_id, date)
+                SELECT id, old_state, 'cancelled', %s, (now() at time zone 'UTC') FROM expired
+            """, (cutoff, batch_size, note, self.env.uid, self.env.uid))
+            count = self.env.cr.rowcount
+            total += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        self.invalidate_model(['state', 'notes', 'write_uid', 'write_date', 'state_log_ids'])
+        if total:
+            _logger.info("Expired %s abandoned wallet top-ups", total)
+        return total
+    
+    @api.model
+    def _benchmark_tracking_modes(self, count=100):
+        """Compare full chatter tracking with high-volume mode over ``count`` top-up lifecycles.
+
+        Each mode creates top-ups and walks them draft -> pending -> paid -> credited
+        inside a savepoint that is rolled back afterwards. Returns, per mode, the
+        rows written to each table and the mean lifecycle latency in milliseconds.
+        Run it from ``odoo shell``: ``env['wallet.topup']._benchmark_tracking_modes(500)``.
+        """
+        tables = ['wallet_topup', 'wallet_topup_state_log', 'mail_message', 'mail_tracking_value', 'mail_followers']
+        partner = self.env.user.partner_id
+        results = {}
+        for mode, high_volume in (('tracking', False), ('high_volume', True)):
+            Topup = self.with_context(wallet_topup_high_volume=high_volume)
+            self.env.cr.execute(' UNION ALL '.join(
+                "SELECT COALESCE(max(id), 0) FROM %s" % table for table in tables))
+            watermarks = [row[0] for row in self.env.cr.fetchall()]
+            try:
+                with self.env.cr.savepoint():
+                    start = time.perf_counter()
+                    for _i in range(count):
+                        topup = Topup.create({'partner_id': partner.id, 'amount': 1.0})
+                        for state in ('pending', 'paid', 'credited'):
+                            topup.write({'state': state})
+                        topup.flush_recordset()
+                    self.env.flush_all()
+                    elapsed = time.perf_counter() - start
+                    self.env.cr.execute(' UNION ALL '.join(
+                        "SELECT count(*) FROM %s WHERE id > %%s" % table for table in tables), watermarks)
+                    rows = dict(zip(tables, (row[0] for row in self.env.cr.fetchall())))
+                    raise _BenchmarkRollback()
+            except _BenchmarkRollback:
+                pass
+            self.env.invalidate_all()
+            results[mode] = {
+                'rows': rows,
+                'rows_per_topup': sum(rows.values()) / float(count),
+                'latency_ms': elapsed * 1000.0 / count,
+            }
+            _logger.info("Top-up benchmark (%s): %.1f rows and %.2f ms per lifecycle, %s",
+                         mode, results[mode]['rows_per_topup'], results[mode]['latency_ms'], rows)
+        return results
+    
     def _compute_access_url(self):
         """Compute portal URL for this record"""
         super(WalletTopup, self)._compute_access_url()
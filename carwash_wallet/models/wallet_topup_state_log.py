@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+
+
+class WalletTopupStateLog(models.Model):
+    """Append-only record of top-up state transitions, used instead of chatter tracking in high-volume mode"""
+    _name = 'wallet.topup.state.log'
+    _description = 'Wallet Top-up State Transition'
+    _order = 'id desc'
+    # one narrow row per transition: no create_uid/write_uid/write_date columns
+    _log_access = False
+
+    topup_id = fields.Many2one('wallet.topup', string='Top-up', required=True, readonly=True, ondelete='cascade')
+    old_state = fields.Char(string='From', readonly=True)
+    new_state = fields.Char(string='To', required=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True, ondelete='set null')
+    date = fields.Datetime(string='Date', required=True, readonly=True, default=fields.Datetime.now)
+
+    def init(self):
+        tools.create_index(self._cr, 'wallet_topup_state_log_topup_idx', self._table, ['topup_id', 'id'])
+
+    @api.model
+    def _log(self, old_states, new_state):
+        """Append one row per top-up whose state changed; ``old_states`` maps top-up id to its previous state"""
+        now = fields.Datetime.now()
+        return self.sudo().create([{
+            'topup_id': topup_id,
+            'old_state': old_state or False,
+            'new_state': new_state,
+            'user_id': self.env.uid,
+            'date': now,
+        } for topup_id, old_state in old_states.items() if old_state != new_state])
+
+    def write(self, vals):
+        raise UserError('Top-up state history cannot be modified')
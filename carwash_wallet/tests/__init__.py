@@ -0,0 +1,2 @@
+from . import test_wallet_topup
+from . import test_wallet_hold
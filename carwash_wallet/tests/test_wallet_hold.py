@@ -0,0 +1,114 @@
+from odoo import api, SUPERUSER_ID
+from odoo.exceptions import UserError
+from odoo.sql_db import db_connect
+from odoo.tests.common import TransactionCase, tagged
+from odoo.tools import mute_logger
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from psycopg2.errors import SerializationFailure
+
+
+class TestWalletHold(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletHold, self).setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Hold Customer', 'wallet_balance': 100.00})
+        self.Hold = self.env['wallet.hold']
+
+    def test_01_place_within_available_balance(self):
+        """Test holds reduce the available balance and a hold beyond it is refused."""
+        self.Hold._place(self.partner, 60.00, 'POS-1')
+        self.assertAlmostEqual(self.partner.wallet_available_balance, 40.00, 2)
+
+        with self.assertRaises(UserError):
+            self.Hold._place(self.partner, 50.00, 'POS-2')
+        self.assertEqual(self.Hold.search_count([('partner_id', '=', self.partner.id)]), 1)
+        self.assertAlmostEqual(self.partner.wallet_balance, 100.00, 2, "Placing a hold must not move the balance")
+
+    def test_02_capture_debits_ledger(self):
+        """Test capturing a hold posts one debit for the final amount and frees the rest."""
+        hold = self.Hold._place(self.partner, 60.00, 'POS-3')
+        tx = hold.action_capture(45.00)
+
+        self.assertEqual(hold.state, 'captured')
+        self.assertEqual(hold.wallet_transaction_id, tx)
+        self.assertEqual((tx.transaction_type, tx.reference, tx.state), ('debit', 'POS-3', 'done'))
+        self.assertAlmostEqual(tx.balance_after, 55.00, 2)
+        self.assertAlmostEqual(self.partner.wallet_balance, 55.00, 2)
+        self.assertAlmostEqual(self.partner.wallet_available_balance, 55.00, 2)
+        with self.assertRaises(UserError):
+            hold.action_capture()
+
+    def test_03_release_and_reap(self):
+        """Test released and expired holds stop reserving funds."""
+        released = self.Hold._place(self.partner, 30.00, 'POS-4')
+        expired = self.Hold._place(self.partner, 30.00, 'POS-5')
+        released.action_release()
+        expired.write({'expires_at': expired.expires_at - timedelta(hours=1)})
+
+        self.assertAlmostEqual(self.partner.wallet_available_balance, 100.00, 2)
+        self.assertGreaterEqual(self.Hold._cron_reap_expired(), 1)
+        self.assertEqual((released.state, expired.state), ('released', 'expired'))
+
+    def test_04_held_total_and_capture_against_other_holds(self):
+        """Test the held total follows the holds and a capture cannot spend another hold's funds."""
+        first = self.Hold._place(self.partner, 60.00, 'POS-6')
+        self.Hold._place(self.partner, 30.00, 'POS-7')
+        total = self.env['wallet.hold.total'].search([('partner_id', '=', self.partner.id)])
+        self.assertAlmostEqual(total.held_amount, 90.00, 2)
+
+        # the balance moved outside the holds, so only 50.00 is left beside the other hold
+        self.partner._post_wallet_entry('debit', 20.00, 'POS-OTHER', 'Counter sale')
+        with self.assertRaises(UserError):
+            first.action_capture()
+        self.assertEqual(first.state, 'active', "A refused capture keeps the hold")
+        self.assertAlmostEqual(total.held_amount, 90.00, 2)
+
+        first.action_capture(50.00)
+        self.assertAlmostEqual(total.held_amount, 30.00, 2)
+        self.assertAlmostEqual(self.partner.wallet_available_balance, 0.00, 2)
+
+
+@tagged('-at_install', 'post_install')
+class TestWalletHoldConcurrency(TransactionCase):
+    """Two lanes placing holds on the same customer from separate committed transactions."""
+
+    def setUp(self):
+        super(TestWalletHoldConcurrency, self).setUp()
+        self.db = db_connect(self.env.cr.dbname)
+        with self.db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.partner_id = env['res.partner'].create({'name': 'Fleet Card', 'wallet_balance': 100.00}).id
+            cr.commit()
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with self.db.cursor() as cr:
+            cr.execute("DELETE FROM wallet_hold WHERE partner_id = %s", (self.partner_id,))
+            cr.execute("DELETE FROM res_partner WHERE id = %s", (self.partner_id,))
+            cr.commit()
+
+    def _place(self, cr, reference):
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        return env['wallet.hold']._place(env['res.partner'].browse(self.partner_id), 80.00, reference).id
+
+    def test_01_second_lane_cannot_overdraw(self):
+        """Test a lane that waited on another lane's hold fails instead of reading a stale snapshot."""
+        with self.db.cursor() as cr_a, self.db.cursor() as cr_b, ThreadPoolExecutor(max_workers=1) as pool:
+            # lane B's snapshot is taken before lane A commits its hold
+            cr_b.execute("SELECT wallet_balance FROM res_partner WHERE id = %s", (self.partner_id,))
+            self._place(cr_a, 'LANE-A')
+            with self.assertRaises(SerializationFailure), mute_logger('odoo.sql_db'):
+                lane_b = pool.submit(self._place, cr_b, 'LANE-B')
+                cr_a.commit()
+                lane_b.result(timeout=30)
+            cr_b.rollback()
+
+            # the retried request sees lane A's hold
+            with self.assertRaises(UserError):
+                self._place(cr_b, 'LANE-B')
+            cr_b.rollback()
+
+        with self.db.cursor() as cr:
+            cr.execute("SELECT name FROM wallet_hold WHERE partner_id = %s AND state = 'active'", (self.partner_id,))
+            self.assertEqual(cr.fetchall(), [('LANE-A',)])
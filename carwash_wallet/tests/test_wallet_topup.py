@@ -0,0 +1,56 @@
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase
+
+
+class TestWalletTopup(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletTopup, self).setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Top-up Customer', 'wallet_balance': 10.00})
+        self.Topup = self.env['wallet.topup']
+
+    def _pending(self, amount):
+        topup = self.Topup.create({'partner_id': self.partner.id, 'amount': amount})
+        topup.action_request_payment()
+        return topup
+
+    def test_01_confirm_links_ledger_row(self):
+        """Test confirming a payment credits the wallet and links the ledger row it wrote."""
+        topup = self._pending(25.00)
+        topup.action_confirm_payment('FLW-TOPUP-1')
+
+        self.assertEqual(topup.state, 'credited')
+        tx = topup.wallet_transaction_id
+        self.assertEqual((tx.partner_id, tx.transaction_type, tx.reference, tx.state),
+                         (self.partner, 'credit', 'FLW-TOPUP-1', 'done'))
+        self.assertAlmostEqual(tx.balance_before, 10.00, 2)
+        self.assertAlmostEqual(tx.balance_after, 35.00, 2)
+        self.assertAlmostEqual(self.partner.wallet_balance, 35.00, 2)
+
+    def test_02_reused_reference_is_refused(self):
+        """Test a replayed top-up credits once and another top-up cannot reuse its reference."""
+        first = self._pending(25.00)
+        first.action_confirm_payment('FLW-TOPUP-2')
+        self.assertEqual(first._credit_wallet('FLW-TOPUP-2'), first.wallet_transaction_id)
+
+        second = self._pending(25.00)
+        with self.assertRaises(UserError):
+            second.action_confirm_payment('FLW-TOPUP-2')
+
+        self.assertEqual(second.state, 'pending')
+        self.assertFalse(second.wallet_transaction_id)
+        self.assertEqual(first.wallet_transaction_id.topup_id, first)
+        self.assertAlmostEqual(self.partner.wallet_balance, 35.00, 2)
+        self.assertEqual(self.env['wallet.transaction'].search_count([
+            ('partner_id', '=', self.partner.id), ('reference', '=', 'FLW-TOPUP-2')]), 1)
+
+    def test_03_bulk_credit(self):
+        """Test a bulk credit run creates, credits and links one ledger row per top-up."""
+        other = self.env['res.partner'].create({'name': 'Fleet Vehicle', 'wallet_balance': 0.00})
+        topup_ids = self.Topup._create_bulk([(self.partner.id, 5.00), (other.id, 7.00)], credit=True, chunk_size=1)
+
+        topups = self.Topup.browse(topup_ids)
+        self.assertEqual(set(topups.mapped('state')), {'credited'})
+        self.assertEqual(len(topups.wallet_transaction_id), 2)
+        self.assertAlmostEqual(self.partner.wallet_balance, 15.00, 2)
+        self.assertAlmostEqual(other.wallet_balance, 7.00, 2)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+from . import wallet_topup_bulk
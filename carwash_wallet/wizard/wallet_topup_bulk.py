@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class WalletTopupBulk(models.TransientModel):
+    _name = 'wallet.topup.bulk'
+    _description = 'Bulk Wallet Top-up'
+
+    partner_ids = fields.Many2many(
+        'res.partner',
+        string='Customers',
+        required=True,
+        help='One top-up is created per customer (e.g. every vehicle of a fleet client)'
+    )
+
+    amount = fields.Float(
+        string='Amount per Top-up',
+        required=True
+    )
+
+    mode = fields.Selection([
+        ('request', 'Request Payment'),
+        ('credit', 'Credit Now (prepaid account)')
+    ], string='Mode', default='request', required=True)
+
+    chunk_size = fields.Integer(
+        string='Chunk Size',
+        default=500,
+        help='Top-ups created and moved to their next state per batch of queries'
+    )
+
+    def action_create(self):
+        """Create the top-ups and open them"""
+        self.ensure_one()
+
+        if self.mode == 'credit' and not self.env.user.has_group('base.group_system'):
+            raise UserError('Only administrators can credit top-ups without payment')
+
+        topup_ids = self.env['wallet.topup']._create_bulk(
+            [(partner.id, self.amount) for partner in self.partner_ids],
+            credit=self.mode == 'credit',
+            chunk_size=max(self.chunk_size, 1)
+        )
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Top-ups',
+            'res_model': 'wallet.topup',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', topup_ids)],
+        }
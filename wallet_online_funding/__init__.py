@@ -1,4 +1,5 @@
 from . import controllers
 from . import models
+from . import services
 from . import tests
 
@@ -6,9 +6,17 @@
     'category': 'Website',
     'depends': ['base', 'contacts','payment', 'mail', 'website'],
     'data': [
+        'security/ir.model.access.csv',
         'data/mail_templates.xml',
         'data/wallet_data.xml',
+        'data/wallet_cron.xml',
         'views/wallet_views.xml',
+        'views/wallet_reconciliation_views.xml',
+        'views/wallet_provider_account_views.xml',
+        'views/wallet_archive_views.xml',
+        'views/wallet_rollup_views.xml',
+        'views/wallet_balance_audit_views.xml',
+        'views/wallet_bulk_job_views.xml',
     ],
     'installable': True,
     'application': False,
@@ -0,0 +1 @@
+# Load-test tooling; run outside the Odoo server, see run_benchmark.py
@@ -0,0 +1,109 @@
+"""Local Flutterwave-compatible stub: answers verify_by_reference and delivers webhooks.
+
+Standard library only, so both the test suite and the benchmark runner can use it.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+import json
+import threading
+import time
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub._hit()
+        if stub.latency:
+            time.sleep(stub.latency)
+        if stub.fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if stub.secret_key and self.headers.get('Authorization') != 'Bearer %s' % stub.secret_key:
+            self.send_response(401)
+            self.end_headers()
+            return
+        url = urlparse(self.path)
+        if url.path != '/v3/transactions/verify_by_reference':
+            self.send_response(404)
+            self.end_headers()
+            return
+        tx_ref = (parse_qs(url.query).get('tx_ref') or [''])[0]
+        if tx_ref in stub.declined:
+            body = {'status': 'error', 'message': 'No transaction was found for this id', 'data': None}
+        else:
+            body = {'status': 'success', 'data': {'tx_ref': tx_ref, 'status': 'successful', 'amount': 100}}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FlutterwaveStub(object):
+    """Run with ``start()``/``stop()``; ``base_url`` is what wallet_online_funding.flutterwave_api_base should point to.
+
+    Every reference verifies as successful except those in ``declined``;
+    ``fail`` answers 503, ``latency`` (seconds) delays each answer and, once
+    ``secret_key`` is set, other keys are answered 401.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.fail = False
+        self.declined = set()
+        self.secret_key = None
+        self.hits = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _StubHandler)
+        self.server.stub = self
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%s' % (host, port)
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def webhook_payload(tx_ref, amount, event_id=None):
+        """A ``charge.completed`` event as Flutterwave sends it."""
+        return {
+            'event': 'charge.completed',
+            'data': {
+                'id': event_id,
+                'tx_ref': tx_ref,
+                'amount': amount,
+                'currency': 'NGN',
+                'status': 'successful',
+            },
+        }
+
+    @staticmethod
+    def deliver_webhook(url, payload, secret_hash=None, timeout=10):
+        """POST a webhook to the Odoo route and return ``(http status, parsed body)``."""
+        headers = {'Content-Type': 'application/json'}
+        if secret_hash:
+            headers['verif-hash'] = secret_hash
+        request = Request(url, data=json.dumps(payload).encode(), headers=headers, method='POST')
+        with urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
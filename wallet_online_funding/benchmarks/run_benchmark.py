@@ -0,0 +1,367 @@
+"""Load test of the wallet funding flow against a running Odoo server.
+
+Seeds benchmark data through ``wallet.benchmark``, points the Flutterwave
+settings at a local stub, then drives each operation in turn at the requested
+concurrency and writes a JSON report (throughput, latency percentiles, SQL
+queries per request, ledger invariants) so runs can be compared across releases:
+
+    python run_benchmark.py --url http://localhost:8069 --db bench --password admin \\
+        --partners 100000 --transactions-per-partner 30 --concurrency 16 --duration 60 \\
+        --output results.json
+
+Run Odoo with enough workers for the concurrency (``--workers``); the stub must be
+reachable from the server (``--stub-host``). Exits with status 1 when an
+invariant is violated.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import math
+import platform
+import re
+import secrets
+import sys
+import threading
+import time
+
+import requests
+
+try:
+    from .provider_stub import FlutterwaveStub
+except ImportError:
+    from provider_stub import FlutterwaveStub
+
+OPERATIONS = ('fund_submit', 'webhook', 'topup_confirm', 'wallet_page')
+# operation -> route label of the wallet_request_sql_queries histogram
+QUERY_ROUTES = {'fund_submit': 'fund_submit', 'webhook': 'flutterwave_webhook'}
+WEBHOOK_CRON = ('wallet_online_funding', 'ir_cron_process_webhook_events')
+TOPUP_PARTNER_REF = 'wallet_bench_topup'
+
+
+class OdooClient(object):
+    """JSON-RPC client (``/jsonrpc``) plus a logged-in HTTP session per thread."""
+
+    def __init__(self, url, db, login, password, timeout=60):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.login = login
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+        self.uid = self._jsonrpc('common', 'login', db, login, password)
+        if not self.uid:
+            raise SystemExit('Login failed for %s on %s' % (login, db))
+
+    def _jsonrpc(self, service, method, *args):
+        response = requests.post(self.url + '/jsonrpc', json={
+            'jsonrpc': '2.0', 'method': 'call', 'id': 1,
+            'params': {'service': service, 'method': method, 'args': args},
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        if body.get('error'):
+            error = body['error']
+            raise RuntimeError((error.get('data') or {}).get('message') or error.get('message'))
+        return body.get('result')
+
+    def call(self, model, method, *args, **kwargs):
+        return self._jsonrpc('object', 'execute_kw', self.db, self.uid, self.password, model, method, list(args), kwargs)
+
+    def ref(self, module, name):
+        rows = self.call('ir.model.data', 'search_read', [('module', '=', module), ('name', '=', name)], ['res_id'])
+        return rows[0]['res_id'] if rows else False
+
+    def has_model(self, model):
+        return bool(self.call('ir.model', 'search_count', [('model', '=', model)]))
+
+    @property
+    def http(self):
+        """A requests session of the current thread, authenticated on first use."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def web_login(self):
+        response = self.http.post(self.url + '/web/session/authenticate', json={
+            'jsonrpc': '2.0', 'method': 'call',
+            'params': {'db': self.db, 'login': self.login, 'password': self.password},
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        if response.json().get('error'):
+            raise RuntimeError('Web login failed')
+        self._local.logged_in = True
+
+    def ensure_web_login(self):
+        if not getattr(self._local, 'logged_in', False):
+            self.web_login()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(math.ceil(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def scrape_queries(client, token):
+    """{route: (sum, count)} of the SQL-queries histogram from ``/wallet/metrics`` (one worker's view)."""
+    response = requests.get(client.url + '/wallet/metrics', headers={'Authorization': 'Bearer %s' % token},
+                            timeout=client.timeout)
+    if response.status_code != 200:
+        return {}
+    values = collections.defaultdict(lambda: [0.0, 0.0])
+    for line in response.text.splitlines():
+        match = re.match(r'wallet_request_sql_queries_(sum|count)\{route="([^"]+)"\} (\S+)$', line)
+        if match:
+            kind, route, value = match.groups()
+            values[route][0 if kind == 'sum' else 1] = float(value)
+    return {route: tuple(value) for route, value in values.items()}
+
+
+class Benchmark(object):
+
+    def __init__(self, client, stub, args):
+        self.client = client
+        self.stub = stub
+        self.args = args
+        self.token = secrets.token_hex(16)
+        self.secret_hash = args.secret_hash or secrets.token_hex(16)
+        self.customers = []
+        self.pending_refs = collections.deque()
+        self.topup_partner_id = None
+
+    # -- setup ----------------------------------------------------------------
+
+    def configure(self):
+        """Route provider traffic to the stub; the legacy parameters apply when no merchant account exists."""
+        params = {
+            'wallet_online_funding.flutterwave_api_base': self.stub.base_url,
+            'wallet_online_funding.flw_direct_link': self.stub.base_url + '/pay',
+            'wallet_online_funding.flw_secret_key': 'FLWSECK_TEST-bench',
+            'wallet_online_funding.metrics_token': self.token,
+        }
+        if not self.args.secret_hash:
+            params['wallet_online_funding.flw_secret_hash'] = self.secret_hash
+        for key, value in params.items():
+            self.client.call('ir.config_parameter', 'set_param', key, value)
+        if self.client.call('wallet.provider.account', 'search_count', [('provider', '=', 'flutterwave')]):
+            print('warning: a Flutterwave merchant account is configured; its payment link and '
+                  'webhook hash are used instead of the stub settings (pass --secret-hash)', file=sys.stderr)
+
+    def seed(self):
+        result = {'partners': 0, 'transactions': 0}
+        if self.args.partners:
+            start = time.perf_counter()
+            result = self.client.call('wallet.benchmark', 'seed', self.args.partners,
+                                      self.args.transactions_per_partner, self.args.seed_batch)
+            result['seconds'] = round(time.perf_counter() - start, 3)
+        self.customers = self.client.call('res.partner', 'search_read', [('ref', '=', 'wallet_bench')],
+                                          ['email', 'phone'], limit=self.args.customer_pool)
+        if not self.customers:
+            raise SystemExit('No benchmark customers: run with --partners > 0 first')
+        return result
+
+    # -- operations -------------------------------------------------------------
+
+    def op_fund_submit(self, i):
+        customer = self.customers[i % len(self.customers)]
+        response = self.client.http.post(self.client.url + '/wallet/fund/submit', data={
+            'email': customer['email'], 'phone': customer['phone'], 'amount': 100 + i % 900,
+        }, allow_redirects=False, timeout=self.client.timeout)
+        tx_ref = (parse_qs(urlparse(response.headers.get('Location') or '').query).get('tx_ref') or [None])[0]
+        if not tx_ref:
+            raise RuntimeError('fund_submit answered %s without a redirect' % response.status_code)
+        self.pending_refs.append((tx_ref, 100 + i % 900))
+
+    def op_webhook(self, i):
+        try:
+            tx_ref, amount = self.pending_refs.popleft()
+        except IndexError:
+            raise RuntimeError('no pending checkout left to confirm')
+        payload = FlutterwaveStub.webhook_payload(tx_ref, amount, event_id=900000000 + i)
+        deliveries = 2 if self.args.redeliver and i % self.args.redeliver == 0 else 1
+        for _ in range(deliveries):
+            status, body = FlutterwaveStub.deliver_webhook(
+                self.client.url + '/wallet/flutterwave/webhook', payload, self.secret_hash, self.client.timeout)
+            result = (body or {}).get('result') or {}
+            if status != 200 or result.get('status') == 'error':
+                raise RuntimeError('webhook rejected: %s' % (result.get('message') or status))
+
+    def op_topup_confirm(self, i):
+        topup_id = self.client.call('wallet.topup', 'create', {'partner_id': self.topup_partner_id, 'amount': 50})
+        self.client.call('wallet.topup', 'action_request_payment', [topup_id])
+        self.client.call('wallet.topup', 'action_confirm_payment', [topup_id], 'BENCH-TOPUP-%s' % topup_id)
+
+    def op_wallet_page(self, i):
+        self.client.ensure_web_login()
+        response = self.client.http.get(self.client.url + '/wallet', timeout=self.client.timeout)
+        if response.status_code != 200:
+            raise RuntimeError('/wallet answered %s' % response.status_code)
+
+    # -- driver -----------------------------------------------------------------
+
+    def run_operation(self, name):
+        """Run ``name`` at the configured concurrency until the duration or iteration budget is used up."""
+        operation = getattr(self, 'op_%s' % name)
+        latencies, errors = [], collections.Counter()
+        lock = threading.Lock()
+        counter = itertools.count()
+        iterations = self.args.iterations
+        if name == 'webhook':
+            iterations = len(self.pending_refs)
+        deadline = time.monotonic() + self.args.duration
+
+        def worker():
+            while time.monotonic() < deadline:
+                i = next(counter)
+                if iterations and i >= iterations:
+                    return
+                start = time.perf_counter()
+                try:
+                    operation(i)
+                except Exception as e:
+                    with lock:
+                        errors[str(e)[:200]] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        before = scrape_queries(self.client, self.token)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(self.args.concurrency)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+        after = scrape_queries(self.client, self.token)
+
+        latencies.sort()
+        result = {
+            'count': len(latencies),
+            'errors': sum(errors.values()),
+            'error_samples': dict(errors.most_common(5)),
+            'seconds': round(elapsed, 3),
+            'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) * 1000.0, 2) if latencies else None,
+                'p50': _ms(percentile(latencies, 50)),
+                'p95': _ms(percentile(latencies, 95)),
+                'p99': _ms(percentile(latencies, 99)),
+                'max': _ms(latencies[-1] if latencies else None),
+            },
+            'queries_per_request': None,
+        }
+        route = QUERY_ROUTES.get(name)
+        if route and route in after:
+            total, count = after[route][0] - before.get(route, (0, 0))[0], after[route][1] - before.get(route, (0, 0))[1]
+            result['queries_per_request'] = round(total / count, 2) if count else None
+        return result
+
+    def drain_webhooks(self):
+        """Process the queued webhook events now instead of waiting for the cron; returns the elapsed seconds."""
+        cron_id = self.client.ref(*WEBHOOK_CRON)
+        due = [('state', '=', 'pending'), ('next_attempt_at', '<=', datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))]
+        start = time.perf_counter()
+        remaining = self.client.call('wallet.webhook.event', 'search_count', due)
+        while remaining:
+            self.client.call('ir.cron', 'method_direct_trigger', [cron_id])
+            left = self.client.call('wallet.webhook.event', 'search_count', due)
+            if left >= remaining:
+                # only retries rescheduled into the future are left
+                break
+            remaining = left
+        return round(time.perf_counter() - start, 3)
+
+    def run(self):
+        operations = [name.strip() for name in self.args.operations.split(',') if name.strip()]
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise SystemExit('Unknown operations: %s' % ', '.join(sorted(unknown)))
+        if 'topup_confirm' in operations:
+            if self.client.has_model('wallet.topup'):
+                # a customer of its own: top-ups credit the wallet outside the funding ledger checked below
+                self.topup_partner_id = self.client.call('res.partner', 'create', {
+                    'name': 'Bench Top-up Customer', 'ref': TOPUP_PARTNER_REF})
+            else:
+                print('warning: carwash_wallet is not installed, skipping topup_confirm', file=sys.stderr)
+                operations.remove('topup_confirm')
+
+        self.configure()
+        report = {
+            'meta': {
+                'started_at': datetime.datetime.utcnow().isoformat() + 'Z',
+                'url': self.client.url,
+                'db': self.client.db,
+                'server_version': self.client._jsonrpc('common', 'version').get('server_version'),
+                'python': platform.python_version(),
+                'concurrency': self.args.concurrency,
+                'duration': self.args.duration,
+                'iterations': self.args.iterations,
+                'stub_latency': self.args.stub_latency,
+            },
+            'seed': self.seed(),
+            'operations': {},
+        }
+        for name in operations:
+            report['operations'][name] = self.run_operation(name)
+            if name == 'webhook':
+                report['operations'][name]['drain_seconds'] = self.drain_webhooks()
+        report['stub_requests'] = self.stub.hits
+        report['invariants'] = self.client.call('wallet.benchmark', 'check_invariants')
+        report['passed'] = not any(report['invariants'].values())
+        return report
+
+
+def _ms(seconds):
+    return round(seconds * 1000.0, 2) if seconds is not None else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--partners', type=int, default=0, help='benchmark customers to add before the run')
+    parser.add_argument('--transactions-per-partner', type=int, default=20)
+    parser.add_argument('--seed-batch', type=int, default=2000)
+    parser.add_argument('--customer-pool', type=int, default=5000,
+                        help='seeded customers whose email/phone the funding form uses')
+    parser.add_argument('--operations', default=','.join(OPERATIONS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per operation')
+    parser.add_argument('--iterations', type=int, default=0, help='cap per operation (0: duration only)')
+    parser.add_argument('--redeliver', type=int, default=10,
+                        help='deliver every Nth webhook twice to check idempotency (0: never)')
+    parser.add_argument('--stub-host', default='127.0.0.1')
+    parser.add_argument('--stub-port', type=int, default=0)
+    parser.add_argument('--stub-latency', type=float, default=0.05, help='seconds per provider answer')
+    parser.add_argument('--secret-hash', help='webhook hash of an existing Flutterwave merchant account')
+    parser.add_argument('--output', help='JSON report path (default: stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stub = FlutterwaveStub(args.stub_host, args.stub_port, latency=args.stub_latency).start()
+    try:
+        client = OdooClient(args.url, args.db, args.login, args.password)
+        report = Benchmark(client, stub, args).run()
+    finally:
+        stub.stop()
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,4 @@
 from . import wallet_controller
+from . import wallet_metrics
+from . import wallet_bulk
 
@@ -1,8 +1,12 @@
 from odoo import http
 from odoo.http import request
+import hmac
 import json
 import logging
 
+from ..services import metrics
+from .wallet_metrics import instrumented
+
 _logger = logging.getLogger(__name__)
 
 class WalletFundingController(http.Controller):
@@ -30,57 +34,75 @@ class WalletFundingController(http.Controller):
 
 
     @http.route('/wallet/flutterwave/callback', type='json', auth='public', methods=['POST'], csrf=False)
+    @instrumented('flutterwave_callback')
     def flutterwave_callback(self, **kwargs):
-        """Receive webhook from Flutterwave after payment"""
+        """Receive webhook from Flutterwave after payment
+
+        The callback credits inline, so unlike the webhook route it refuses
+        every request while no webhook secret hash is configured.
+        """
         try:
             data = json.loads(request.httprequest.data)
-            _logger.info("Flutterwave Webhook Data: %s", data)
-
-            # Confirm successful transaction
-            if data.get('status') == 'successful':
-                email = data.get('customer', {}).get('email')
-                phone = data.get('customer', {}).get('phone_number')
-                amount = float(data.get('amount', 0.0))
-
-                if not amount:
-                    _logger.warning("No amount received in webhook")
-                    return {"status": "error", "message": "Invalid amount"}
-
-                # Find customer by email or phone
-                partner = None
-                if email:
-                    partner = request.env['res.partner'].sudo().search([('email', '=', email)], limit=1)
-                if not partner and phone:
-                    partner = request.env['res.partner'].sudo().search([('phone', '=', phone)], limit=1)
-
-                if not partner:
-                    _logger.warning("No partner found for email %s or phone %s", email, phone)
-                    return {"status": "error", "message": "Customer not found"}
-
-                # Update wallet balance (assuming eWallet is stored in partner)
-                new_balance = partner.wallet_balance + amount
-                partner.sudo().write({'wallet_balance': new_balance})
-
-                # Send notification email
-                request.env['mail.mail'].sudo().create({
-                    'subject': 'Wallet Funded Successfully',
-                    'email_to': partner.email,
-                    'body_html': f"""
-                        <p>Hello {partner.name},</p>
-                        <p>Your wallet has been funded with <b>₦{amount:,.2f}</b>.</p>
-                        <p>New balance: <b>₦{new_balance:,.2f}</b></p>
-                        <p>Thank you for your patronage.</p>
-                    """
-                }).send()
-
-                _logger.info("Wallet credited successfully for partner %s", partner.name)
-                return {"status": "success"}
+            _logger.info("Flutterwave callback received for tx_ref %s", data.get('tx_ref'))
 
-            else:
-                _logger.warning("Unsuccessful payment callback received")
-                return {"status": "error", "message": "Payment not successful"}
+            # Same signature check as the webhook route, against the default Flutterwave account
+            config = request.env['wallet.provider.account'].sudo()._get_config('flutterwave')
+            signature = request.httprequest.headers.get('verif-hash') or ''
+            secret_hash = config.get('secret_hash')
+            if not secret_hash or not hmac.compare_digest(signature, secret_hash):
+                _logger.error("Callback signature mismatch for tx_ref %s", data.get('tx_ref'))
+                metrics.outcome('flutterwave_callback', 'invalid_signature')
+                return {"status": "error", "message": "Invalid signature"}
+
+            # Same idempotency store as the webhook route: a redelivery never credits twice
+            Idempotency = request.env['wallet.webhook.idempotency'].sudo()
+            event_key = Idempotency._event_key(data, data.get('tx_ref') or data.get('flw_ref'))
+            if not event_key:
+                _logger.warning("Callback without event id or tx_ref")
+                return {"status": "error", "message": "Missing event id"}
+            return Idempotency._run_once('flutterwave', event_key, lambda: self._credit_from_callback(data))
 
         except Exception as e:
             _logger.error("Flutterwave Callback Error: %s", str(e))
             return {"status": "error", "message": str(e)}
 
+    def _credit_from_callback(self, data):
+        # Confirm successful transaction
+        if data.get('status') == 'successful':
+            email = data.get('customer', {}).get('email')
+            phone = data.get('customer', {}).get('phone_number')
+            amount = float(data.get('amount', 0.0))
+
+            if not amount:
+                _logger.warning("No amount received in webhook")
+                return {"status": "error", "message": "Invalid amount"}
+
+            # Find customer by normalized email or phone
+            with metrics.timed('lookup'):
+                partner = request.env['wallet.partner.resolver'].sudo()._resolve(email=email, phone=phone)
+
+            if not partner:
+                _logger.warning("No partner found for email %s or phone %s", email, phone)
+                metrics.outcome('flutterwave_callback', 'partner_not_found')
+                return {"status": "error", "message": "Customer not found"}
+
+            # Credit through an applied ledger row, never by writing the balance directly
+            with metrics.timed('apply'):
+                tx = request.env['wallet.transaction'].sudo()._fund_from_callback(
+                    partner, amount, data.get('tx_ref') or data.get('flw_ref'))
+            if not tx:
+                metrics.outcome('flutterwave_callback', 'duplicate')
+                return {"status": "success"}
+
+            # Queue notification email (sent by the outbox dispatcher)
+            with metrics.timed('notify'):
+                request.env['wallet.notification'].sudo()._enqueue_funding(partner, amount)
+            metrics.outcome('flutterwave_callback', 'success')
+
+            _logger.info("Wallet credited successfully for partner %s", partner.name)
+            return {"status": "success"}
+
+        else:
+            _logger.warning("Unsuccessful payment callback received")
+            metrics.outcome('flutterwave_callback', 'verification_failed')
+            return {"status": "error", "message": "Payment not successful"}
@@ -0,0 +1,71 @@
+from odoo import http
+from odoo.exceptions import UserError
+from odoo.http import request
+import hmac
+import json
+import logging
+
+from .wallet_metrics import instrumented
+
+_logger = logging.getLogger(__name__)
+
+# Per-row results returned per status call
+BULK_REPORT_PAGE = 1000
+
+
+class WalletBulkController(http.Controller):
+
+    def _authorized(self):
+        token = request.env['ir.config_parameter'].sudo().get_param('wallet_online_funding.bulk_api_token')
+        auth = request.httprequest.headers.get('Authorization') or ''
+        return bool(token) and hmac.compare_digest(auth, 'Bearer %s' % token)
+
+    @http.route(['/wallet/bulk/transactions'], type='http', auth='public', methods=['POST'], csrf=False)
+    @instrumented('bulk_submit')
+    def bulk_submit(self, name=None, dry_run=None, **kw):
+        """Validate and post a batch of credits/debits; requires ``Authorization: Bearer <wallet_online_funding.bulk_api_token>``.
+
+        The body is either JSON ``{"name": ..., "dry_run": false, "rows": [{"partner_id" or "email",
+        "amount", "type": "credit"|"debit", "reference", "note"}]}`` or a CSV file
+        (``Content-Type: text/csv``) with the same columns. Small batches are
+        posted before answering; larger ones are queued and can be followed on
+        ``/wallet/bulk/transactions/<id>``.
+        """
+        if not self._authorized():
+            return request.make_json_response({'error': 'forbidden'}, status=403)
+        Job = request.env['wallet.bulk.job'].sudo()
+        httprequest = request.httprequest
+        try:
+            if httprequest.mimetype == 'text/csv':
+                rows = Job._read_csv(httprequest.stream)
+            else:
+                data = json.loads(httprequest.get_data() or b'{}')
+                rows = data.get('rows')
+                name = data.get('name') or name
+                dry_run = data.get('dry_run', dry_run)
+                if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                    raise ValueError('rows must be a list of objects')
+            job = Job.create({'name': name or 'API batch', 'source': 'api'})
+            job._load_rows(rows)
+        except (UserError, ValueError) as e:
+            request.env.cr.rollback()
+            return request.make_json_response({'error': str(e)}, status=400)
+
+        if dry_run not in (True, '1', 'true'):
+            job.action_post()
+        _logger.info("Bulk API batch %s: %s rows, state %s", job.id, job.row_count, job.state)
+        return request.make_json_response(job._report(limit=BULK_REPORT_PAGE), status=201)
+
+    @http.route(['/wallet/bulk/transactions/<int:job_id>'], type='http', auth='public', methods=['GET'], csrf=False)
+    def bulk_status(self, job_id, offset=0, **kw):
+        """Summary and per-row results of a batch, ``BULK_REPORT_PAGE`` rows at a time (``?offset=``)."""
+        if not self._authorized():
+            return request.make_json_response({'error': 'forbidden'}, status=403)
+        job = request.env['wallet.bulk.job'].sudo().browse(job_id).exists()
+        if not job:
+            return request.make_json_response({'error': 'not found'}, status=404)
+        try:
+            offset = max(int(offset), 0)
+        except ValueError:
+            return request.make_json_response({'error': 'offset must be a number'}, status=400)
+        return request.make_json_response(job._report(offset=offset, limit=BULK_REPORT_PAGE))
@@ -1,18 +1,16 @@
 from odoo import http, fields
 from odoo.http import request
+import hmac
 import logging
 import json
-import requests
+
+from ..services import metrics
+from .wallet_metrics import instrumented
 
 _logger = logging.getLogger(__name__)
 
-# For quick setup you can keep the sandbox link, but in production you'll call Flutterwave to create a payment
-ICPSudo = request.env['ir.config_parameter'].sudo()
-FLW_DIRECT_LINK = ICPSudo.get_param('wallet_online_funding.flw_direct_link')
-FLW_SECRET_KEY = ICPSudo.get_param('wallet_online_funding.flw_secret_key')
-FLW_SECRET_HASH = ICPSudo.get_param('wallet_online_funding.flw_secret_hash')
-# Put secret in ir.config_parameter in production:
-# FLW_SECRET_KEY is now fetched from ir.config_parameter
+# Provider settings (payment link, secret key, webhook hash) come from wallet.provider.account,
+# cached per worker and invalidated on change; see WalletProviderAccount._get_config
 
 class WalletOnlineFundingController(http.Controller):
 
@@ -21,6 +19,7 @@ class WalletOnlineFundingController(http.Controller):
         return request.render('wallet_online_funding.wallet_fund_template', {})
 
     @http.route(['/wallet/fund/submit'], type='http', auth='public', website=True, csrf=False, methods=['POST'])
+    @instrumented('fund_submit')
     def wallet_fund_submit(self, **post):
         email = post.get('email')
         phone = post.get('phone')
@@ -43,19 +42,14 @@ class WalletOnlineFundingController(http.Controller):
         if request.env.user.partner_id.id != request.env.ref('base.public_partner').id:
             partner = request.env.user.partner_id
         
-        # 2. If not logged in, search by email/phone
+        # 2. If not logged in, resolve by normalized email/phone
         if not partner:
-            domain = []
-            if email:
-                domain.append(('email', '=', email))
-            if phone:
-                domain.append(('phone', '=', phone))
-            
-            if domain:
-                partner = Partner.search(domain, limit=1)
+            with metrics.timed('lookup'):
+                partner = request.env['wallet.partner.resolver'].sudo()._resolve(email=email, phone=phone)
         
         # 3. Create if not found
         if not partner:
+            metrics.outcome('fund_submit', 'partner_created')
             partner = Partner.create({
                 'name': email or phone or 'Customer', 
                 'email': email or False, 
@@ -63,7 +57,9 @@ class WalletOnlineFundingController(http.Controller):
                 'customer_rank': 1
             })
 
-        # create transaction (pending)
+        config = request.env['wallet.provider.account'].sudo()._get_config('flutterwave')
+
+        # create transaction (pending), under the account it is paid to
         seq = request.env['ir.sequence'].sudo().next_by_code('wallet_online.tx.seq') or str(partner.id)
         tx_ref = f"WALLET_{partner.id}_{seq}"
         tx = request.env['wallet.transaction'].sudo().create({
@@ -72,93 +68,70 @@ class WalletOnlineFundingController(http.Controller):
             'tx_type': 'fund',
             'reference': tx_ref,
             'provider': 'flutterwave',
+            'provider_account_id': config.get('account_id') or False,
             'status': 'pending',
         })
 
         # For quick test we redirect to a static sandbox link; in production create a payment session via Flutterwave API
         # We include tx_ref in the redirect if possible (some payment links may support query params)
-        redirect_url = FLW_DIRECT_LINK
+        redirect_url = config.get('direct_link')
+        if not redirect_url:
+            _logger.error("No Flutterwave payment link configured")
+            metrics.outcome('fund_submit', 'not_configured')
+            return request.render('wallet_online_funding.wallet_error_template', {'message': 'Online funding is not available'})
         if '?' in redirect_url:
             redirect_url = f"{redirect_url}&tx_ref={tx_ref}&amount={amount}&email={partner.email or ''}"
         else:
             redirect_url = f"{redirect_url}?tx_ref={tx_ref}&amount={amount}&email={partner.email or ''}"
 
+        metrics.outcome('fund_submit', 'redirected')
         return request.redirect(redirect_url)
 
-    @http.route(['/wallet/flutterwave/webhook'], type='json', auth='public', csrf=False, methods=['POST'])
-    def flutterwave_webhook(self, **post):
-        """Accept webhook POST from Flutterwave. Expects JSON payload."""
+    @http.route(['/wallet/flutterwave/webhook', '/wallet/flutterwave/webhook/<string:account>'],
+                type='json', auth='public', csrf=False, methods=['POST'])
+    @instrumented('flutterwave_webhook')
+    def flutterwave_webhook(self, account=None, **post):
+        """Accept webhook POST from Flutterwave. Expects JSON payload.
+
+        The event is only validated and queued here; verification, funding and
+        notification run in the ``wallet.webhook.event`` worker so the provider
+        gets its acknowledgement immediately.
+        """
         try:
             data = request.httprequest.get_json(force=True)
         except Exception:
             data = post or {}
-        _logger.info("Flutterwave webhook payload: %s", data)
 
-        # Flutterwave payload keys may differ — adapt here
-        tx_ref = data.get('tx_ref') or (data.get('data') or {}).get('tx_ref') or data.get('reference')
-        status = (data.get('status') or (data.get('data') or {}).get('status') or '').lower()
-        amount = None
-        try:
-            amount = float((data.get('amount') or (data.get('data') or {}).get('amount') or 0) or 0)
-        except Exception:
-            amount = 0.0
+        Event = request.env['wallet.webhook.event'].sudo()
+        tx_ref, status, amount = Event._parse_flutterwave_payload(data)
+        _logger.debug("Flutterwave webhook received for tx_ref %s (status: %s)", tx_ref, status)
 
         if not tx_ref:
-            _logger.warning("Webhook without tx_ref: %s", data)
+            # log the shape of the payload, never its content
+            _logger.warning("Webhook without tx_ref (keys: %s)", sorted(data) if isinstance(data, dict) else type(data).__name__)
+            metrics.outcome('flutterwave_webhook', 'missing_tx_ref')
             return {'status':'error', 'message':'Missing tx_ref'}
 
-        # find transaction
-        tx = request.env['wallet.transaction'].sudo().search([('reference','=',tx_ref)], limit=1)
-        if not tx:
-            _logger.warning("Transaction not found for tx_ref %s", tx_ref)
-            return {'status':'error', 'message':'Transaction not found'}
-
-        # verify with Flutterwave if possible (recommended)
-        verified = False
-        # 1. Webhook Signature Verification (CRITICAL SECURITY FIX)
-        signature = request.httprequest.headers.get('verif-hash')
-        if FLW_SECRET_HASH and signature != FLW_SECRET_HASH:
-            _logger.error("Webhook signature mismatch. Expected %s, got %s", FLW_SECRET_HASH, signature)
+        config = request.env['wallet.provider.account'].sudo()._get_config('flutterwave', account)
+        if not config:
+            _logger.warning("Webhook for unknown Flutterwave account %s", account)
+            metrics.outcome('flutterwave_webhook', 'unknown_account')
+            return {'status':'error', 'message':'Unknown account'}
+
+        # Webhook Signature Verification (CRITICAL SECURITY FIX)
+        signature = request.httprequest.headers.get('verif-hash') or ''
+        secret_hash = config.get('secret_hash')
+        if secret_hash and not hmac.compare_digest(signature, secret_hash):
+            _logger.error("Webhook signature mismatch for tx_ref %s", tx_ref)
+            metrics.outcome('flutterwave_webhook', 'invalid_signature')
             return {'status':'error', 'message':'Invalid signature'}
 
-        # 2. Transaction Verification (Good Practice)
-        verified = False
-        if FLW_SECRET_KEY:
-            try:
-                headers = {'Authorization': f'Bearer {FLW_SECRET_KEY}'}
-                verify_url = f'https://api.flutterwave.com/v3/transactions/verify_by_reference?tx_ref={tx_ref}'
-                r = requests.get(verify_url, headers=headers, timeout=10)
-                jr = r.json()
-                if jr.get('status') == 'success' and jr.get('data'):
-                    amount = float(jr['data'].get('amount') or amount or 0)
-                    verified = True
-            except Exception as e:
-                _logger.warning("Flutterwave verify failed: %s", e)
-        else:
-            # no secret provided — we trust incoming webhook (fine for sandbox/testing)
-            verified = (status == 'successful' or status == 'success')
-
-        if not verified:
-            tx.sudo().write({'status':'failed', 'note': 'Verification failed'})
-            return {'status':'error', 'message':'Verification failed'}
-
-        # mark transaction done and apply
-        tx.sudo().write({'status':'done'})
-        # call apply (now idempotent)
-        try:
-            tx._apply_funding()
-        except Exception as e:
-            _logger.exception("Failed to apply funding for tx %s: %s", tx_ref, e)
-            return {'status':'error', 'message':str(e)}
-
-        # send email notification
-        try:
-            template = request.env.ref('wallet_online_funding.wallet_funded_email_template', raise_if_not_found=False)
-            if template and tx.partner_id.email:
-                template.sudo().with_context(amount="%.2f" % tx.amount).send_mail(tx.partner_id.id, force_send=True)
-        except Exception as e:
-            _logger.warning("Failed to send email: %s", e)
+        # Redeliveries are answered from the idempotency store: one indexed read, no writes
+        Idempotency = request.env['wallet.webhook.idempotency'].sudo()
 
-        # Optionally send SMS here (integration is similar)
-        return {'status':'success'}
+        def enqueue():
+            event = Event._enqueue('flutterwave', data, dict(request.httprequest.headers), account_code=config.get('code'))
+            metrics.outcome('flutterwave_webhook', 'queued')
+            return {'status':'queued', 'event_id': event.id}
 
+        return Idempotency._run_once('flutterwave', Idempotency._event_key(data, tx_ref), enqueue)
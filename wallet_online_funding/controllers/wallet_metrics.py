@@ -0,0 +1,94 @@
+from odoo import http
+from odoo.http import request
+from functools import wraps
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import random
+import time
+
+from ..models.wallet_notification import DISPATCH_STATS
+from ..services import metrics
+
+_logger = logging.getLogger(__name__)
+
+
+def _profiling_settings():
+    """(sample rate, slow threshold in ms) from system parameters; profiling is off unless both are set."""
+    ICP = request.env['ir.config_parameter'].sudo()
+    try:
+        rate = float(ICP.get_param('wallet_online_funding.profile_sample_rate') or 0.0)
+        slow_ms = float(ICP.get_param('wallet_online_funding.profile_slow_ms') or 0.0)
+    except ValueError:
+        return 0.0, 0.0
+    return rate, slow_ms
+
+
+def instrumented(route):
+    """Record latency and SQL query count of a route handler, and profile a sample of slow calls.
+
+    With ``wallet_online_funding.profile_sample_rate`` (0-1) and
+    ``wallet_online_funding.profile_slow_ms`` set, sampled requests run under
+    cProfile and the top functions of those slower than the threshold are logged.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cr = request.env.cr
+            queries = getattr(cr, 'sql_log_count', 0)
+            rate, slow_ms = _profiling_settings()
+            profiler = cProfile.Profile() if rate and slow_ms and random.random() < rate else None
+            start = time.perf_counter()
+            try:
+                if profiler:
+                    return profiler.runcall(func, *args, **kwargs)
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.REQUEST_SECONDS.observe(elapsed, route=route)
+                metrics.REQUEST_QUERIES.observe(getattr(cr, 'sql_log_count', 0) - queries, route=route)
+                if profiler and elapsed * 1000.0 >= slow_ms:
+                    out = io.StringIO()
+                    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+                    _logger.warning("Slow %s request (%.0fms), profile:\n%s", route, elapsed * 1000.0, out.getvalue())
+        return wrapper
+    return decorator
+
+
+class WalletMetricsController(http.Controller):
+
+    def _queue_depths(self):
+        """Pending work per queue; each count runs on the queue's partial index."""
+        cr = request.env.cr
+        cr.execute("""
+            SELECT 'webhook_events', COUNT(*) FROM wallet_webhook_event WHERE state = 'pending'
+             UNION ALL
+            SELECT 'webhook_events_dead', COUNT(*) FROM wallet_webhook_event WHERE state = 'dead'
+             UNION ALL
+            SELECT 'notifications', COUNT(*) FROM wallet_notification WHERE state = 'pending'
+             UNION ALL
+            SELECT 'unapplied_transactions', COUNT(*) FROM wallet_transaction
+             WHERE status = 'done' AND is_applied IS NOT TRUE
+        """)
+        return {(('queue', queue),): depth for queue, depth in cr.fetchall()}
+
+    @http.route(['/wallet/metrics'], type='http', auth='public', methods=['GET'], csrf=False)
+    def wallet_metrics(self, **kw):
+        """Prometheus text exposition; requires ``Authorization: Bearer <wallet_online_funding.metrics_token>``."""
+        token = request.env['ir.config_parameter'].sudo().get_param('wallet_online_funding.metrics_token')
+        auth = request.httprequest.headers.get('Authorization') or ''
+        if not token or not hmac.compare_digest(auth, 'Bearer %s' % token):
+            return request.make_response('Forbidden', status=403)
+
+        lines = metrics.render()
+        lines += metrics.render_values('wallet_queue_depth', 'Pending items per wallet queue.', self._queue_depths())
+        for name, key, doc in (('wallet_notifications_sent_total', 'sent', 'Notifications sent per channel.'),
+                               ('wallet_notifications_failed_total', 'failed', 'Notification send failures per channel.')):
+            lines += metrics.render_values(name, doc, {
+                (('channel', channel),): stats[key] for channel, stats in DISPATCH_STATS.items()}, kind='counter')
+        return request.make_response('\n'.join(lines) + '\n', headers=[
+            ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+        ])
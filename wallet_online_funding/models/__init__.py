@@ -1 +1,13 @@
 from . import wallet_models
+from . import wallet_webhook_event
+from . import wallet_partner_resolver
+from . import wallet_reconciliation
+from . import wallet_notification
+from . import wallet_provider_account
+from . import wallet_webhook_idempotency
+from . import wallet_pending_poller
+from . import wallet_archive
+from . import wallet_rollup
+from . import wallet_balance_audit
+from . import wallet_bulk_job
+from . import wallet_benchmark
@@ -0,0 +1,189 @@
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+from datetime import timedelta
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Pending checkouts older than this were abandoned; the recovery poller had plenty of chances by then
+EXPIRE_PENDING_HOURS = 72
+# Finished transactions stay in the hot table for this long, then move to the archive
+ARCHIVE_RETENTION_DAYS = 365
+
+# Columns copied from wallet_transaction to wallet_transaction_archive
+ARCHIVED_COLUMNS = ['partner_id', 'amount', 'tx_type', 'reference', 'provider', 'status', 'is_applied', 'date', 'note']
+
+
+class WalletTransactionArchive(models.Model):
+    _name = 'wallet.transaction.archive'
+    _description = 'Archived Wallet Transaction'
+    _order = 'date desc, id desc'
+
+    origin_id = fields.Integer(string='Original ID', readonly=True, index=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', readonly=True, ondelete='cascade')
+    amount = fields.Float(string='Amount', readonly=True)
+    tx_type = fields.Selection([('fund', 'Funding'), ('spend', 'Spending')], readonly=True)
+    reference = fields.Char(string='Reference', readonly=True, index=True)
+    provider = fields.Char(string='Provider', readonly=True)
+    status = fields.Selection([('pending','Pending'), ('done','Done'), ('failed','Failed')], readonly=True)
+    is_applied = fields.Boolean(string='Applied', readonly=True)
+    date = fields.Datetime(string='Date', readonly=True)
+    note = fields.Text(string='Notes', readonly=True)
+    archived_at = fields.Datetime(string='Archived At', readonly=True)
+
+    def init(self):
+        # statements read one customer over a date range
+        tools.create_index(self._cr, 'wallet_transaction_archive_partner_date_idx', self._table, ['partner_id', 'date'])
+        # archived (partner, reference) pairs stay taken: replays of old callbacks are checked here
+        tools.create_index(self._cr, 'wallet_transaction_archive_partner_reference_idx', self._table,
+                           ['partner_id', 'reference'])
+        # the daily rollup regroups whole days
+        tools.create_index(self._cr, 'wallet_transaction_archive_date_idx', self._table, ['date'])
+
+
+class WalletTransactionHistory(models.Model):
+    """Hot and archived transactions together, for statements and audits."""
+    _name = 'wallet.transaction.history'
+    _description = 'Wallet Transaction History'
+    _auto = False
+    _order = 'date desc, id desc'
+
+    partner_id = fields.Many2one('res.partner', string='Customer', readonly=True)
+    amount = fields.Float(string='Amount', readonly=True)
+    tx_type = fields.Selection([('fund', 'Funding'), ('spend', 'Spending')], readonly=True)
+    reference = fields.Char(string='Reference', readonly=True)
+    provider = fields.Char(string='Provider', readonly=True)
+    status = fields.Selection([('pending','Pending'), ('done','Done'), ('failed','Failed')], readonly=True)
+    is_applied = fields.Boolean(string='Applied', readonly=True)
+    date = fields.Datetime(string='Date', readonly=True)
+    note = fields.Text(string='Notes', readonly=True)
+    archived = fields.Boolean(string='Archived', readonly=True)
+
+    def init(self):
+        # ids stay those of wallet.transaction, so links to a moved row still resolve here
+        columns = ', '.join(ARCHIVED_COLUMNS)
+        tools.drop_view_if_exists(self._cr, self._table)
+        self._cr.execute("""
+            CREATE VIEW %s AS (
+                SELECT id, %s, FALSE AS archived FROM wallet_transaction
+                 UNION ALL
+                SELECT origin_id AS id, %s, TRUE AS archived FROM wallet_transaction_archive
+            )
+        """ % (self._table, columns, columns))
+
+
+class WalletTransactionRetention(models.Model):
+    _inherit = 'wallet.transaction'
+
+    @api.constrains('partner_id', 'reference')
+    def _check_archived_reference(self):
+        """``partner_reference_uniq`` only sees the hot table; archived references stay taken too."""
+        keys = [(tx.partner_id.id, tx.reference) for tx in self if tx.reference]
+        if self._archived_keys(keys):
+            raise ValidationError('This reference is already used for this customer.')
+
+    @api.model
+    def _archived_keys(self, keys):
+        """The (partner, reference) pairs of ``keys`` found in the archive, in one query."""
+        if not keys:
+            return set()
+        self.env['wallet.transaction.archive'].flush_model(['partner_id', 'reference'])
+        partner_ids, references = zip(*keys)
+        self.env.cr.execute("""
+            SELECT a.partner_id, a.reference
+              FROM unnest(%s::int[], %s::varchar[]) AS k(partner_id, reference)
+              JOIN wallet_transaction_archive a ON a.partner_id = k.partner_id AND a.reference = k.reference
+        """, (list(partner_ids), list(references)))
+        return set(self.env.cr.fetchall())
+
+    @api.model
+    def _fund_from_callback(self, partner, amount, reference):
+        """A reference that was archived has been settled long ago: its replayed callback posts nothing."""
+        if reference and self._archived_keys([(partner.id, reference)]):
+            _logger.info("Ignoring callback for archived reference %s of partner %s", reference, partner.id)
+            return self.browse()
+        return super(WalletTransactionRetention, self)._fund_from_callback(partner, amount, reference)
+
+    @api.model
+    def _expire_pending(self, max_age_hours=EXPIRE_PENDING_HOURS, batch_size=1000, auto_commit=False):
+        """Fail abandoned pending transactions in bounded SQL batches. Returns how many expired."""
+        self.flush_model(['status', 'note', 'date'])
+        cutoff = fields.Datetime.now() - timedelta(hours=max_age_hours)
+        note = 'Expired: no payment confirmation after %s hours' % max_age_hours
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                UPDATE wallet_transaction
+                   SET status = 'failed',
+                       note = COALESCE(note || E'\\n', '') || %s,
+                       write_uid = %s,
+                       write_date = (now() at time zone 'UTC')
+                 WHERE id IN (
+                        SELECT id FROM wallet_transaction
+                         WHERE status = 'pending' AND date < %s
+                         ORDER BY date, id
+                         LIMIT %s
+                           FOR UPDATE SKIP LOCKED)
+            """, (note, self.env.uid, cutoff, batch_size))
+            count = self.env.cr.rowcount
+            total += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        self.invalidate_model(['status', 'note', 'write_uid', 'write_date'])
+        if total:
+            _logger.info("Expired %s abandoned pending wallet transactions", total)
+        return total
+
+    @api.model
+    def _archive_finished(self, retention_days=ARCHIVE_RETENTION_DAYS, batch_size=1000, auto_commit=False):
+        """Move finished transactions older than the retention window to the archive table.
+
+        A confirmed transaction that was never applied is not finished and stays
+        behind for the backlog replay. Each batch is one DELETE ... RETURNING
+        feeding an INSERT, so a row is never in both tables or in neither.
+        Returns how many rows moved.
+        """
+        self.flush_model()
+        cutoff = fields.Datetime.now() - timedelta(days=retention_days)
+        columns = ', '.join(ARCHIVED_COLUMNS)
+        total = 0
+        while True:
+            self.env.cr.execute("""
+                WITH moved AS (
+                    DELETE FROM wallet_transaction
+                     WHERE id IN (
+                            SELECT id FROM wallet_transaction
+                             WHERE date < %%s
+                               AND (status = 'failed' OR (status = 'done' AND is_applied))
+                             ORDER BY date, id
+                             LIMIT %%s
+                               FOR UPDATE SKIP LOCKED)
+                 RETURNING id, %(columns)s, create_uid, create_date
+                )
+                INSERT INTO wallet_transaction_archive
+                       (origin_id, %(columns)s, archived_at, create_uid, create_date, write_uid, write_date)
+                SELECT id, %(columns)s, (now() at time zone 'UTC'), create_uid, create_date,
+                       %%s, (now() at time zone 'UTC')
+                  FROM moved
+            """ % {'columns': columns}, (cutoff, batch_size, self.env.uid))
+            count = self.env.cr.rowcount
+            total += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        self.invalidate_model()
+        if total:
+            _logger.info("Archived %s wallet transactions older than %s days", total, retention_days)
+        return total
+
+    @api.model
+    def _cron_expire_and_archive(self, max_age_hours=EXPIRE_PENDING_HOURS,
+                                 retention_days=ARCHIVE_RETENTION_DAYS, batch_size=1000):
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        expired = self._expire_pending(max_age_hours, batch_size=batch_size, auto_commit=auto_commit)
+        archived = self._archive_finished(retention_days, batch_size=batch_size, auto_commit=auto_commit)
+        return expired, archived
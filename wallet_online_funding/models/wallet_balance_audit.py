@@ -0,0 +1,210 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+AUDIT_CHUNK_SIZE = 5000
+AUDIT_WORKERS = 4
+AMOUNT_TOLERANCE = 0.005
+
+# Balance effect of an applied row: spending (bulk debits) lowers the balance
+SIGNED_AMOUNT = "CASE WHEN tx_type = 'spend' THEN -amount ELSE amount END"
+
+# Applied rows of the partners matching ``{where}``, hot and archived; each table
+# is read through its partner_id index
+APPLIED_ROWS = """
+    SELECT partner_id, """ + SIGNED_AMOUNT + """ AS amount FROM wallet_transaction
+     WHERE is_applied AND {where}
+     UNION ALL
+    SELECT partner_id, """ + SIGNED_AMOUNT + """ FROM wallet_transaction_archive
+     WHERE is_applied AND {where}
+"""
+
+# carwash_wallet posts its own done credit/debit rows (never applied, never archived)
+# and moves the stored balance by them
+CARWASH_FIELDS = ('transaction_type', 'state')
+CARWASH_ROWS = """
+     UNION ALL
+    SELECT partner_id, CASE WHEN transaction_type = 'debit' THEN -amount ELSE amount END FROM wallet_transaction
+     WHERE state = 'done' AND transaction_type IN ('credit', 'debit') AND is_applied IS NOT TRUE AND {where}
+"""
+
+
+class WalletBalanceAudit(models.Model):
+    _name = 'wallet.balance.audit'
+    _description = 'Wallet Balance Audit'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: fields.Date.to_string(fields.Date.today()))
+    state = fields.Selection([('draft', 'Draft'), ('running', 'Running'), ('done', 'Done')],
+                             string='State', default='draft', required=True)
+    repair = fields.Boolean(string='Repair Balances',
+                            help='Reset drifting balances to the sum of their ledger rows.')
+    chunk_size = fields.Integer(string='Partners per Range', default=AUDIT_CHUNK_SIZE, required=True)
+    workers = fields.Integer(string='Parallel Workers', default=AUDIT_WORKERS, required=True)
+    checkpoint_partner_id = fields.Integer(string='Checkpoint', readonly=True,
+                                           help='Every partner up to this id has been audited.')
+    last_partner_id = fields.Integer(string='Last Partner', readonly=True,
+                                     help='Highest partner id when the audit started; later partners are left to the next audit.')
+    started_at = fields.Datetime(string='Started', readonly=True)
+    finished_at = fields.Datetime(string='Finished', readonly=True)
+    ranges_done = fields.Integer(string='Ranges Audited', readonly=True)
+    discrepancy_count = fields.Integer(string='Discrepancies', readonly=True)
+    repaired_count = fields.Integer(string='Repaired', readonly=True)
+    line_ids = fields.One2many('wallet.balance.audit.line', 'audit_id', string='Discrepancies', readonly=True)
+
+    def action_run(self):
+        """Audit from the checkpoint to the end in the foreground."""
+        self.ensure_one()
+        if self.state == 'done':
+            raise UserError('This audit is finished; create a new one.')
+        self._run()
+        return True
+
+    def _has_carwash_ledger(self):
+        return all(name in self.env['wallet.transaction']._fields for name in CARWASH_FIELDS)
+
+    def _expected_balances(self, where):
+        """SQL of the expected balance per partner: the applied rows matching ``where``,
+        plus the done carwash_wallet ledger rows when that module is installed."""
+        rows = APPLIED_ROWS + (CARWASH_ROWS if self._has_carwash_ledger() else '')
+        return "SELECT partner_id, SUM(amount) AS total FROM (%s) ledger GROUP BY partner_id" % rows.format(where=where)
+
+    def _run(self, time_budget=None, auto_commit=False):
+        """Audit partner-id ranges from the checkpoint on, ``workers`` ranges at a time.
+
+        Each worker aggregates its range on a cursor of its own; this thread then
+        records the discrepancies, repairs them if asked and moves the checkpoint
+        past the whole wave before committing. An interrupted or out-of-budget
+        audit stays ``running`` and resumes from its checkpoint.
+        Returns True when the audit is complete.
+        """
+        self.ensure_one()
+        self.env['res.partner'].flush_model(['wallet_balance'])
+        self.env['wallet.transaction'].flush_model(
+            ['partner_id', 'amount', 'tx_type', 'is_applied'] + (list(CARWASH_FIELDS) if self._has_carwash_ledger() else []))
+        if self.state == 'draft':
+            self.env.cr.execute("SELECT COALESCE(MAX(id), 0) FROM res_partner")
+            self.write({
+                'state': 'running',
+                'started_at': fields.Datetime.now(),
+                'last_partner_id': self.env.cr.fetchone()[0],
+            })
+        chunk_size = max(self.chunk_size, 1)
+        workers = max(self.workers, 1)
+        start_time = time.monotonic()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wallet_audit') if workers > 1 else None
+        try:
+            while self.checkpoint_partner_id < self.last_partner_id:
+                if time_budget is not None and time.monotonic() - start_time >= time_budget:
+                    _logger.info("Balance audit %s paused at partner %s", self.id, self.checkpoint_partner_id)
+                    return False
+                bounds = [(start, min(start + chunk_size, self.last_partner_id))
+                          for start in range(self.checkpoint_partner_id, self.last_partner_id, chunk_size)[:workers]]
+                if pool:
+                    results = list(pool.map(lambda bound: self._find_drift_isolated(*bound), bounds))
+                else:
+                    results = [self._find_drift(*bound) for bound in bounds]
+                self._record_wave([row for rows in results for row in rows], bounds[-1][1], len(bounds))
+                if auto_commit:
+                    self.env.cr.commit()
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.write({'state': 'done', 'finished_at': fields.Datetime.now()})
+        _logger.info("Balance audit %s: %s ranges, %s discrepancies, %s repaired", self.id,
+                     self.ranges_done, self.discrepancy_count, self.repaired_count)
+        return True
+
+    def _find_drift_isolated(self, start, end):
+        """``_find_drift`` on a cursor of its own, for use from a worker thread."""
+        with self.env.registry.cursor() as cr:
+            return self.with_env(self.env(cr=cr))._find_drift(start, end)
+
+    def _find_drift(self, start, end):
+        """Partners with ``start < id <= end`` whose stored balance differs from their ledger.
+
+        Returns ``(partner_id, stored, expected)`` tuples.
+        """
+        self.env.cr.execute("""
+            SELECT p.id, COALESCE(p.wallet_balance, 0), COALESCE(e.total, 0)
+              FROM res_partner p
+              LEFT JOIN (""" + self._expected_balances("partner_id > %(start)s AND partner_id <= %(end)s") + """) e
+                     ON e.partner_id = p.id
+             WHERE p.id > %(start)s AND p.id <= %(end)s
+               AND abs(COALESCE(p.wallet_balance, 0) - COALESCE(e.total, 0)) > %(tolerance)s
+        """, {'start': start, 'end': end, 'tolerance': AMOUNT_TOLERANCE})
+        return self.env.cr.fetchall()
+
+    def _record_wave(self, drift, checkpoint, ranges):
+        repaired = set()
+        if drift and self.repair:
+            repaired = self._repair([partner_id for partner_id, stored, expected in drift])
+        if drift:
+            self.env['wallet.balance.audit.line'].create([{
+                'audit_id': self.id,
+                'partner_id': partner_id,
+                'stored_balance': stored,
+                'expected_balance': expected,
+                'repaired': partner_id in repaired,
+            } for partner_id, stored, expected in drift])
+            _logger.warning("Balance audit %s: %s partners drifted (%s repaired)", self.id, len(drift), len(repaired))
+        self.write({
+            'checkpoint_partner_id': checkpoint,
+            'ranges_done': self.ranges_done + ranges,
+            'discrepancy_count': self.discrepancy_count + len(drift),
+            'repaired_count': self.repaired_count + len(repaired),
+        })
+
+    def _repair(self, partner_ids):
+        """Reset the balances of ``partner_ids`` to their ledger sum. Returns the ids updated.
+
+        The partner rows are locked before the sum is taken, so a funding applied
+        concurrently either is already in the sum or adds its amount on top of
+        the repaired value once the lock is released.
+        """
+        cr = self.env.cr
+        cr.execute("SELECT id FROM res_partner WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (partner_ids,))
+        cr.execute("""
+            UPDATE res_partner p
+               SET wallet_balance = COALESCE(e.total, 0)
+              FROM unnest(%(ids)s::int[]) AS d(id)
+              LEFT JOIN (""" + self._expected_balances("partner_id = ANY(%(ids)s)") + """) e ON e.partner_id = d.id
+             WHERE p.id = d.id
+         RETURNING p.id
+        """, {'ids': partner_ids})
+        repaired = {row[0] for row in cr.fetchall()}
+        self.env['res.partner'].invalidate_model(['wallet_balance'])
+        return repaired
+
+    @api.model
+    def _cron_audit(self, time_budget=3000, repair=False):
+        """Continue the unfinished audit, or start a new one; each run stops after ``time_budget`` seconds."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        audit = self.search([('state', '=', 'running')], order='id', limit=1)
+        if not audit:
+            audit = self.create({'name': 'Nightly %s' % fields.Date.to_string(fields.Date.today()), 'repair': repair})
+        return audit._run(time_budget=time_budget, auto_commit=auto_commit)
+
+
+class WalletBalanceAuditLine(models.Model):
+    _name = 'wallet.balance.audit.line'
+    _description = 'Wallet Balance Discrepancy'
+    _order = 'audit_id, partner_id'
+
+    audit_id = fields.Many2one('wallet.balance.audit', string='Audit', required=True, ondelete='cascade', index=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', ondelete='cascade')
+    stored_balance = fields.Float(string='Stored Balance')
+    expected_balance = fields.Float(string='Expected Balance')
+    difference = fields.Float(string='Difference', compute='_compute_difference', store=True)
+    repaired = fields.Boolean(string='Repaired')
+
+    @api.depends('stored_balance', 'expected_balance')
+    def _compute_difference(self):
+        for line in self:
+            line.difference = line.stored_balance - line.expected_balance
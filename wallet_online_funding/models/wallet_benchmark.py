@@ -0,0 +1,112 @@
+from odoo import models, api
+from odoo.exceptions import AccessError
+import logging
+import threading
+
+from odoo.tools import split_every
+
+from .wallet_balance_audit import SIGNED_AMOUNT
+
+_logger = logging.getLogger(__name__)
+
+# res.partner.ref of every customer created by the benchmark seeder
+BENCH_PARTNER_REF = 'wallet_bench'
+
+
+class WalletBenchmark(models.AbstractModel):
+    """Data seeding and invariant checks for benchmarks/run_benchmark.py (called over XML-RPC)."""
+    _name = 'wallet.benchmark'
+    _description = 'Wallet Benchmark Helpers'
+
+    def _check_admin(self):
+        if not self.env.is_admin():
+            raise AccessError("Only administrators can run wallet benchmarks")
+
+    @api.model
+    def seed(self, partners=1000, transactions_per_partner=20, batch_size=2000):
+        """Create benchmark customers and their ledger history.
+
+        Customers go through the ORM in batches (their lookup keys are computed
+        fields); transactions are generated in SQL, about 80% of them applied,
+        and every customer's balance is set to the sum of its applied funding.
+        Batches are committed outside tests. Returns the partner and transaction counts created.
+        """
+        self._check_admin()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Partner = self.env['res.partner'].with_context(tracking_disable=True)
+        self.env.cr.execute("SELECT COUNT(*) FROM res_partner WHERE ref = %s", (BENCH_PARTNER_REF,))
+        offset = self.env.cr.fetchone()[0]
+        created = {'partners': 0, 'transactions': 0}
+        for chunk in split_every(batch_size, range(offset, offset + partners), list):
+            new = Partner.create([{
+                'name': 'Bench Customer %s' % i,
+                'email': 'bench%s@bench.invalid' % i,
+                'phone': '+2348%09d' % i,
+                'ref': BENCH_PARTNER_REF,
+            } for i in chunk])
+            new.flush_recordset()
+            self.env.cr.execute("""
+                INSERT INTO wallet_transaction
+                       (partner_id, amount, tx_type, reference, provider, status, is_applied, date,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT p.id, round((100 + random() * 9900)::numeric, 2), 'fund',
+                       'BENCH_' || p.id || '_' || g, 'flutterwave',
+                       CASE WHEN g %% 10 = 0 THEN 'pending' WHEN g %% 17 = 0 THEN 'failed' ELSE 'done' END,
+                       g %% 10 <> 0 AND g %% 17 <> 0,
+                       (now() at time zone 'UTC') - random() * interval '365 days',
+                       %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+                  FROM unnest(%s::int[]) AS p(id), generate_series(1, %s) AS g
+            """, (self.env.uid, self.env.uid, new.ids, transactions_per_partner))
+            created['transactions'] += self.env.cr.rowcount
+            self.env.cr.execute("""
+                UPDATE res_partner p
+                   SET wallet_balance = s.total
+                  FROM (SELECT partner_id, SUM(amount) AS total
+                          FROM wallet_transaction
+                         WHERE partner_id = ANY(%s) AND is_applied
+                         GROUP BY partner_id) s
+                 WHERE p.id = s.partner_id
+            """, (new.ids,))
+            created['partners'] += len(new)
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info("Benchmark seed: %(partners)s partners, %(transactions)s transactions", created)
+        self.env.invalidate_all()
+        return created
+
+    @api.model
+    def check_invariants(self):
+        """Count violations of the ledger invariants over the benchmark customers; all zero when healthy."""
+        self._check_admin()
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT COUNT(*)
+              FROM res_partner p
+              LEFT JOIN (
+                    SELECT partner_id, SUM(%(signed)s) AS total FROM wallet_transaction WHERE is_applied GROUP BY partner_id
+                     UNION ALL
+                    SELECT partner_id, SUM(%(signed)s) FROM wallet_transaction_archive WHERE is_applied GROUP BY partner_id
+              ) t ON t.partner_id = p.id
+             WHERE p.ref = %%s
+             GROUP BY p.id, p.wallet_balance
+            HAVING abs(COALESCE(p.wallet_balance, 0) - COALESCE(SUM(t.total), 0)) > 0.005
+        """ % {'signed': SIGNED_AMOUNT}, (BENCH_PARTNER_REF,))
+        balance_mismatches = len(cr.fetchall())
+        cr.execute("SELECT COUNT(*) FROM wallet_transaction WHERE is_applied AND status <> 'done'")
+        applied_not_done = cr.fetchone()[0]
+        cr.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT reference FROM wallet_transaction WHERE reference IS NOT NULL
+                 GROUP BY reference HAVING COUNT(*) > 1
+            ) dup
+        """)
+        duplicate_references = cr.fetchone()[0]
+        cr.execute("SELECT COUNT(*) FROM wallet_webhook_event WHERE state = 'dead'")
+        dead_events = cr.fetchone()[0]
+        return {
+            'balance_mismatches': balance_mismatches,
+            'applied_not_done': applied_not_done,
+            'duplicate_references': duplicate_references,
+            'dead_webhook_events': dead_events,
+        }
@@ -0,0 +1,457 @@
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+import csv
+import io
+import logging
+import math
+import threading
+import time
+
+from .wallet_balance_audit import SIGNED_AMOUNT
+from .wallet_partner_resolver import normalize_email
+from ..services import metrics
+
+_logger = logging.getLogger(__name__)
+
+# Rows validated per round of partner / reference lookups
+BULK_VALIDATE_BATCH = 5000
+# Rows posted per transaction; each chunk is one INSERT and one balance UPDATE
+BULK_CHUNK_SIZE = 1000
+# Jobs with at most this many valid rows are posted right away, larger ones by the cron
+BULK_INLINE_ROWS = 2000
+
+# Accepted column headers (matched case-insensitively)
+BULK_COLUMNS = {
+    'partner_id': ('partner_id', 'partner id', 'customer id'),
+    'email': ('email', 'e-mail'),
+    'amount': ('amount',),
+    'type': ('type', 'direction'),
+    'reference': ('reference', 'ref'),
+    'note': ('note', 'description'),
+}
+DIRECTIONS = {'credit': 'fund', 'debit': 'spend'}
+
+
+class _SkippedRows(Exception):
+    """Raised inside the chunk savepoint when the INSERT skipped already-posted references."""
+
+    def __init__(self, keys):
+        super(_SkippedRows, self).__init__(keys)
+        self.keys = keys
+
+
+class WalletBulkJob(models.Model):
+    _name = 'wallet.bulk.job'
+    _description = 'Bulk Wallet Credit/Debit'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: fields.Date.to_string(fields.Date.today()))
+    source = fields.Selection([('upload', 'Upload'), ('api', 'API')], string='Source', default='upload', required=True)
+    data_file = fields.Binary(string='File (CSV)', attachment=True,
+                              help='Columns: partner_id or email, amount, type (credit/debit), reference, note.')
+    data_filename = fields.Char(string='File Name')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('validated', 'Validated'),
+        ('queued', 'Queued'),
+        ('running', 'Posting'),
+        ('done', 'Done'),
+    ], string='State', default='draft', required=True, index=True)
+    chunk_size = fields.Integer(string='Rows per Commit', default=BULK_CHUNK_SIZE, required=True)
+    line_ids = fields.One2many('wallet.bulk.job.line', 'job_id', string='Rows', readonly=True)
+    row_count = fields.Integer(string='Rows', compute='_compute_counts')
+    valid_count = fields.Integer(string='To Post', compute='_compute_counts')
+    done_count = fields.Integer(string='Posted', compute='_compute_counts')
+    invalid_count = fields.Integer(string='Invalid', compute='_compute_counts')
+    duplicate_count = fields.Integer(string='Duplicates', compute='_compute_counts')
+    failed_count = fields.Integer(string='Failed', compute='_compute_counts')
+
+    def _compute_counts(self):
+        counts = {}
+        if self.ids:
+            self.env['wallet.bulk.job.line'].flush_model(['job_id', 'state'])
+            self.env.cr.execute("""
+                SELECT job_id, state, COUNT(*) FROM wallet_bulk_job_line
+                 WHERE job_id IN %s GROUP BY job_id, state
+            """, (tuple(self.ids),))
+            for job_id, state, count in self.env.cr.fetchall():
+                counts.setdefault(job_id, {})[state] = count
+        for job in self:
+            by_state = counts.get(job.id, {})
+            job.row_count = sum(by_state.values())
+            job.valid_count = by_state.get('valid', 0)
+            job.done_count = by_state.get('done', 0)
+            job.invalid_count = by_state.get('invalid', 0)
+            job.duplicate_count = by_state.get('duplicate', 0)
+            job.failed_count = by_state.get('failed', 0)
+
+    # -------------------------------------------------------------------------
+    # Validation
+    # -------------------------------------------------------------------------
+
+    def action_validate(self):
+        """Read the uploaded file and validate its rows."""
+        self.ensure_one()
+        if self.state != 'draft':
+            raise UserError('This batch has already been validated.')
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'data_file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError('Upload a file first.')
+        if attachment.store_fname:
+            # stream from the filestore rather than loading the file in memory
+            with open(attachment._full_path(attachment.store_fname), 'rb') as stream:
+                self._load_rows(self._read_csv(stream))
+        else:
+            self._load_rows(self._read_csv(io.BytesIO(attachment.raw or b'')))
+        return True
+
+    @api.model
+    def _read_csv(self, stream):
+        """Yield one dict per CSV row, keyed by the logical column names."""
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        header = [(h or '').strip().lower() for h in next(reader, [])]
+        columns = {key: next((header.index(c) for c in candidates if c in header), None)
+                   for key, candidates in BULK_COLUMNS.items()}
+        if columns['amount'] is None or columns['reference'] is None or \
+                (columns['partner_id'] is None and columns['email'] is None):
+            raise UserError('The file needs amount, reference and partner_id or email columns.')
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield {key: row[index] if index is not None and index < len(row) else None
+                       for key, index in columns.items()}
+
+    def _load_rows(self, rows):
+        """Validate ``rows`` (dicts with partner_id or email, amount, type, reference, note) into lines.
+
+        Each batch costs a fixed number of queries: one to check partner ids,
+        one to resolve emails and one to find references already posted, hot
+        or archived. A (partner, reference) pair repeated in the batch is a
+        duplicate after its first row.
+        """
+        self.ensure_one()
+        Line = self.env['wallet.bulk.job.line']
+        seen = set()
+        sequence = 0
+        for batch in split_every(BULK_VALIDATE_BATCH, rows, list):
+            parsed = []
+            for row in batch:
+                sequence += 1
+                parsed.append(self._parse_row(sequence, row))
+            self._resolve_partners(parsed)
+            posted = self._posted_references([(vals['partner_id'], vals['reference'])
+                                              for vals in parsed if vals['state'] == 'valid'])
+            for vals in parsed:
+                if vals['state'] != 'valid':
+                    continue
+                key = (vals['partner_id'], vals['reference'])
+                if key in posted:
+                    vals.update(state='duplicate', message='Reference already posted for this customer')
+                elif key in seen:
+                    vals.update(state='duplicate', message='Reference repeated in this batch')
+                seen.add(key)
+            Line.create(parsed)
+        self.write({'state': 'validated'})
+        self.invalidate_recordset(['row_count', 'valid_count', 'invalid_count', 'duplicate_count'])
+        _logger.info("Bulk job %s validated: %s rows, %s to post", self.id, self.row_count, self.valid_count)
+        return True
+
+    def _parse_row(self, sequence, row):
+        vals = {
+            'job_id': self.id,
+            'sequence': sequence,
+            'email': str(row.get('email') or '').strip() or False,
+            'reference': str(row.get('reference') or '').strip(),
+            'note': str(row.get('note') or '').strip() or False,
+            'direction': str(row.get('type') or 'credit').strip().lower(),
+            'partner_id': False,
+            'amount': 0.0,
+            'state': 'valid',
+            'message': False,
+        }
+        direction = vals['direction'] if vals['direction'] in DIRECTIONS else False
+        vals['direction'] = direction
+        try:
+            vals['amount'] = round(float(str(row.get('amount') or '').replace(',', '')), 2)
+        except ValueError:
+            return dict(vals, state='invalid', message='Amount is not a number')
+        try:
+            partner_id = int(row.get('partner_id') or 0)
+        except (TypeError, ValueError):
+            return dict(vals, state='invalid', message='Customer id is not a number')
+        vals['partner_id'] = partner_id or False
+        if not math.isfinite(vals['amount']) or vals['amount'] <= 0:
+            return dict(vals, amount=0.0, state='invalid', message='Amount must be positive')
+        if not direction:
+            return dict(vals, state='invalid', message='Type must be credit or debit')
+        if not vals['reference']:
+            return dict(vals, state='invalid', message='Reference is required')
+        if not vals['partner_id'] and not vals['email']:
+            return dict(vals, state='invalid', message='Customer id or email is required')
+        return vals
+
+    def _resolve_partners(self, parsed):
+        """Check customer ids and look up emails, one query each for the whole batch."""
+        cr = self.env.cr
+        self.env['res.partner'].flush_model(['wallet_email_key'])
+        ids = list({vals['partner_id'] for vals in parsed if vals['state'] == 'valid' and vals['partner_id']})
+        cr.execute("SELECT id FROM res_partner WHERE id = ANY(%s) AND active", (ids,))
+        existing = {row[0] for row in cr.fetchall()}
+        for vals in parsed:
+            if vals['partner_id'] not in existing:
+                vals['partner_id'] = False
+        emails = list({normalize_email(vals['email']) for vals in parsed
+                       if vals['state'] == 'valid' and not vals['partner_id'] and vals['email']})
+        cr.execute("""
+            SELECT wallet_email_key, MIN(id) FROM res_partner
+             WHERE wallet_email_key = ANY(%s) AND active
+             GROUP BY wallet_email_key
+        """, (emails,))
+        by_email = dict(cr.fetchall())
+        for vals in parsed:
+            if vals['state'] != 'valid' or vals['partner_id']:
+                continue
+            vals['partner_id'] = by_email.get(normalize_email(vals['email']), False)
+            if not vals['partner_id']:
+                vals.update(state='invalid', message='Unknown customer')
+
+    def _posted_references(self, keys):
+        """The (partner, reference) pairs of ``keys`` that already exist in the ledger or its archive."""
+        if not keys:
+            return set()
+        self.env['wallet.transaction'].flush_model(['partner_id', 'reference'])
+        partner_ids, references = zip(*keys)
+        self.env.cr.execute("""
+            SELECT t.partner_id, t.reference
+              FROM unnest(%s::int[], %s::varchar[]) AS k(partner_id, reference)
+              JOIN wallet_transaction t ON t.partner_id = k.partner_id AND t.reference = k.reference
+             UNION
+            SELECT a.partner_id, a.reference
+              FROM unnest(%s::int[], %s::varchar[]) AS k(partner_id, reference)
+              JOIN wallet_transaction_archive a ON a.partner_id = k.partner_id AND a.reference = k.reference
+        """, (list(partner_ids), list(references), list(partner_ids), list(references)))
+        return set(self.env.cr.fetchall())
+
+    # -------------------------------------------------------------------------
+    # Posting
+    # -------------------------------------------------------------------------
+
+    def action_post(self):
+        """Post small batches now; larger ones are left to the cron."""
+        self.ensure_one()
+        if self.state != 'validated':
+            raise UserError('Validate the batch before posting it.')
+        if self.valid_count <= BULK_INLINE_ROWS:
+            self._process()
+        else:
+            self.write({'state': 'queued'})
+        return True
+
+    def _process(self, time_budget=None, auto_commit=False):
+        """Post the valid rows in chunks of ``chunk_size``, committing after each one.
+
+        A line leaves the ``valid`` state in the same transaction that posts
+        it, so an interrupted job resumes with exactly the rows still to do.
+        Returns True when every row has been handled.
+        """
+        self.ensure_one()
+        self.write({'state': 'running'})
+        start = time.monotonic()
+        cr = self.env.cr
+        while True:
+            if time_budget is not None and time.monotonic() - start >= time_budget:
+                return False
+            self.env['wallet.bulk.job.line'].flush_model()
+            cr.execute("""
+                SELECT id, partner_id, amount, direction, reference, note
+                  FROM wallet_bulk_job_line
+                 WHERE job_id = %s AND state = 'valid'
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, (self.id, max(self.chunk_size, 1)))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            self._post_chunk(rows)
+            if auto_commit:
+                cr.commit()
+        self.write({'state': 'done'})
+        self.invalidate_recordset(['valid_count', 'done_count', 'duplicate_count', 'failed_count'])
+        _logger.info("Bulk job %s done: %s posted, %s duplicates, %s failed, %s invalid", self.id,
+                     self.done_count, self.duplicate_count, self.failed_count, self.invalid_count)
+        return True
+
+    def _post_chunk(self, rows):
+        """Insert one chunk of ledger rows and apply one aggregated balance change per customer.
+
+        Customers are locked in id order, then debits are checked against the
+        running balance. Rows go in as a single multi-row INSERT, already
+        applied, inside a savepoint. A reference posted concurrently is
+        skipped by the unique constraint; since the running balance counted
+        it, the savepoint is rolled back and the chunk checked again without
+        those rows, which are reported as duplicates.
+        """
+        cr = self.env.cr
+        self.env['res.partner'].flush_model(['wallet_balance'])
+        partner_ids = sorted({row[1] for row in rows if row[1]})
+        cr.execute("SELECT id, COALESCE(wallet_balance, 0) FROM res_partner WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+                   (partner_ids,))
+        locked = dict(cr.fetchall())
+
+        skipped = set()
+        while True:
+            balances = dict(locked)
+            accepted, results = [], {}
+            for line_id, partner_id, amount, direction, reference, note in rows:
+                if partner_id not in balances:
+                    # the customer was deleted after validation
+                    results[line_id] = ('failed', None, 'Unknown customer')
+                    continue
+                if (partner_id, reference) in skipped:
+                    results[line_id] = ('duplicate', None, 'Reference already posted for this customer')
+                    continue
+                if direction == 'debit':
+                    if balances[partner_id] < amount - 0.005:
+                        results[line_id] = ('failed', None, 'Insufficient balance')
+                        continue
+                    balances[partner_id] -= amount
+                else:
+                    balances[partner_id] += amount
+                accepted.append((line_id, partner_id, amount, DIRECTIONS[direction], reference,
+                                 note or 'Bulk %s: %s' % (direction, self.name)))
+            try:
+                posted = self._insert_chunk(accepted)
+            except _SkippedRows as e:
+                skipped |= e.keys
+                continue
+            break
+        for line_id, partner_id, _amount, _tx_type, reference, _note in accepted:
+            results[line_id] = ('done', posted[(partner_id, reference)], None)
+
+        line_ids = list(results)
+        cr.execute("""
+            UPDATE wallet_bulk_job_line l
+               SET state = v.state, transaction_id = v.transaction_id, message = v.message,
+                   write_uid = %s, write_date = (now() at time zone 'UTC')
+              FROM unnest(%s::int[], %s::varchar[], %s::int[], %s::text[])
+                   AS v(id, state, transaction_id, message)
+             WHERE l.id = v.id
+        """, (self.env.uid, line_ids, [results[i][0] for i in line_ids],
+              [results[i][1] for i in line_ids], [results[i][2] for i in line_ids]))
+
+        self.env['wallet.bulk.job.line'].invalidate_model(['state', 'transaction_id', 'message', 'write_uid', 'write_date'])
+        self.env['res.partner'].invalidate_model(['wallet_balance'])
+        self.env['wallet.transaction'].invalidate_model()
+        for state in ('done', 'duplicate', 'failed'):
+            count = sum(1 for result in results.values() if result[0] == state)
+            if count:
+                metrics.OUTCOMES.inc(count, source='bulk', outcome=state)
+        return results
+
+    def _insert_chunk(self, accepted):
+        """Insert the accepted rows and their balance changes; ``{(partner_id, reference): transaction id}``.
+
+        Runs in a savepoint and raises ``_SkippedRows`` (rolling it back) when
+        the unique constraint skipped any row, so that the balances checked by
+        the caller never include an entry that was not posted.
+        """
+        if not accepted:
+            return {}
+        cr = self.env.cr
+        _line_ids, partners, amounts, tx_types, references, notes = (list(column) for column in zip(*accepted))
+        with cr.savepoint(flush=False):
+            cr.execute("""
+                WITH inserted AS (
+                    INSERT INTO wallet_transaction
+                           (partner_id, amount, tx_type, reference, provider, status, is_applied, date, note,
+                            create_uid, create_date, write_uid, write_date)
+                    SELECT v.partner_id, v.amount, v.tx_type, v.reference, 'bulk', 'done', TRUE,
+                           (now() at time zone 'UTC'), v.note,
+                           %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+                      FROM unnest(%s::int[], %s::float8[], %s::varchar[], %s::varchar[], %s::text[])
+                           AS v(partner_id, amount, tx_type, reference, note)
+                        ON CONFLICT (partner_id, reference) DO NOTHING
+                 RETURNING id, partner_id, reference, amount, tx_type
+                ), credited AS (
+                    UPDATE res_partner p
+                       SET wallet_balance = COALESCE(p.wallet_balance, 0) + d.delta
+                      FROM (SELECT partner_id, SUM(""" + SIGNED_AMOUNT + """) AS delta
+                              FROM inserted GROUP BY partner_id) d
+                     WHERE p.id = d.partner_id
+                )
+                SELECT id, partner_id, reference FROM inserted
+            """, (self.env.uid, self.env.uid, partners, amounts, tx_types, references, notes))
+            posted = {(partner_id, reference): tx_id for tx_id, partner_id, reference in cr.fetchall()}
+            if len(posted) < len(accepted):
+                raise _SkippedRows({key for key in zip(partners, references) if key not in posted})
+        return posted
+
+    @api.model
+    def _cron_process(self, time_budget=600):
+        """Post queued jobs and resume interrupted ones until the time budget (seconds) is spent."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        start = time.monotonic()
+        for job in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            remaining = time_budget - (time.monotonic() - start)
+            if remaining <= 0 or not job._process(time_budget=remaining, auto_commit=auto_commit):
+                break
+            if auto_commit:
+                self.env.cr.commit()
+
+    def _report(self, offset=0, limit=None):
+        """Summary and per-row results, as returned by the bulk API."""
+        self.ensure_one()
+        lines = self.env['wallet.bulk.job.line'].search([('job_id', '=', self.id)], offset=offset, limit=limit)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'rows': self.row_count,
+            'to_post': self.valid_count,
+            'posted': self.done_count,
+            'duplicates': self.duplicate_count,
+            'invalid': self.invalid_count,
+            'failed': self.failed_count,
+            'results': [{
+                'row': line.sequence,
+                'reference': line.reference,
+                'partner_id': line.partner_id.id or None,
+                'state': line.state,
+                'message': line.message or None,
+                'transaction_id': line.transaction_id.id or None,
+            } for line in lines],
+        }
+
+
+class WalletBulkJobLine(models.Model):
+    _name = 'wallet.bulk.job.line'
+    _description = 'Bulk Wallet Credit/Debit Row'
+    _order = 'job_id, sequence, id'
+
+    job_id = fields.Many2one('wallet.bulk.job', string='Batch', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer(string='Row')
+    partner_id = fields.Many2one('res.partner', string='Customer', ondelete='set null')
+    email = fields.Char(string='Email')
+    amount = fields.Float(string='Amount')
+    direction = fields.Selection([('credit', 'Credit'), ('debit', 'Debit')], string='Type')
+    reference = fields.Char(string='Reference')
+    note = fields.Char(string='Note')
+    state = fields.Selection([
+        ('valid', 'To Post'),
+        ('done', 'Posted'),
+        ('invalid', 'Invalid'),
+        ('duplicate', 'Duplicate'),
+        ('failed', 'Failed'),
+    ], string='Result', required=True, default='valid')
+    message = fields.Char(string='Message')
+    transaction_id = fields.Many2one('wallet.transaction', string='Transaction', ondelete='set null')
+
+    def init(self):
+        # posting walks the rows still to do of one job, in id order
+        tools.create_index(self._cr, 'wallet_bulk_job_line_todo_idx', self._table, ['job_id', 'id'],
+                           where="state = 'valid'")
@@ -1,5 +1,6 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 import logging
+import threading
 
 _logger = logging.getLogger(__name__)
 
@@ -18,31 +19,163 @@ class WalletTransaction(models.Model):
     tx_type = fields.Selection([('fund', 'Funding'), ('spend', 'Spending')], default='fund')
     reference = fields.Char(string='Reference', index=True)
     provider = fields.Char(string='Provider')  # e.g. 'flutterwave'
+    provider_account_id = fields.Many2one('wallet.provider.account', string='Merchant Account', ondelete='set null',
+                                          help='Empty for the default account of the provider')
     status = fields.Selection([('pending','Pending'), ('done','Done'), ('failed','Failed')], default='pending')
     is_applied = fields.Boolean(string='Applied', default=False, readonly=True)
     date = fields.Datetime(string='Date', default=fields.Datetime.now)
     note = fields.Text(string='Notes')
 
+    # also the index behind (partner, reference) lookups; empty references are not constrained
+    _sql_constraints = [
+        ('partner_reference_uniq', 'unique(partner_id, reference)', 'This reference is already used for this customer.'),
+    ]
+
     # Removed dangerous override of create. Funding should only be applied via webhook.
 
+    def init(self):
+        # Backlog replays only look for confirmed rows that were never applied
+        tools.create_index(
+            self._cr, 'wallet_transaction_unapplied_idx', self._table,
+            ['partner_id', 'id'], where="status = 'done' AND is_applied IS NOT TRUE",
+        )
+
     def _apply_funding(self):
-        """Update partner canonical balance. Ensures idempotency."""
+        """Update partner canonical balance. Ensures idempotency.
+
+        Claiming the transaction (``is_applied``) and crediting the partner are a
+        single SQL statement: the conditional update on ``is_applied`` only returns
+        a row for the first caller, and the balance is incremented in place, so
+        concurrent webhooks can neither double-credit nor lose an update.
+        """
+        # make pending ORM writes (e.g. status='done') visible to SQL
+        self.flush_recordset(['partner_id', 'amount', 'status', 'is_applied'])
+        self.env['res.partner'].flush_model(['wallet_balance'])
+
+        cr = self.env.cr
+        applied = self.browse()
         for rec in self:
-            if rec.is_applied or rec.status != 'done':
-                _logger.info("Skipping application for transaction %s (Applied: %s, Status: %s)", rec.reference, rec.is_applied, rec.status)
+            cr.execute("""
+                WITH claimed AS (
+                    UPDATE wallet_transaction
+                       SET is_applied = TRUE,
+                           write_uid = %s,
+                           write_date = (now() at time zone 'UTC')
+                     WHERE id = %s
+                       AND status = 'done'
+                       AND is_applied IS NOT TRUE
+                 RETURNING partner_id, amount
+                )
+                UPDATE res_partner p
+                   SET wallet_balance = COALESCE(p.wallet_balance, 0) + claimed.amount
+                  FROM claimed
+                 WHERE p.id = claimed.partner_id
+             RETURNING p.id, p.wallet_balance
+            """, (self.env.uid, rec.id))
+            row = cr.fetchone()
+            if not row:
+                _logger.debug("Skipping application for transaction %s (already applied or not done)", rec.reference)
                 continue
+            applied |= rec
+            _logger.debug("Applied funding of %s to partner %s. New balance: %s", rec.amount, row[0], row[1])
+
+        # NOTE: Removed brittle external wallet detection logic. 
+        # If integration with a specific external wallet module is required, 
+        # it should be done via a dedicated, explicit dependency and method override.
+
+        # the cache still holds the pre-update values
+        self.invalidate_recordset(['is_applied', 'write_uid', 'write_date'])
+        self.env['res.partner'].invalidate_model(['wallet_balance'])
+        return applied
+
+    def _apply_funding_bulk(self, chunk_size=1000, auto_commit=False):
+        """Apply many transactions with a fixed number of statements per chunk.
+
+        Rows are processed in ``partner_id`` order so that each chunk needs one
+        aggregated balance update per partner, issued together with the bulk
+        ``is_applied`` claim in a single statement. The same conditional claim as
+        in ``_apply_funding`` makes replays idempotent.
+        Returns the number of transactions applied.
+        """
+        self.flush_recordset(['partner_id', 'amount', 'status', 'is_applied'])
+        self.env['res.partner'].flush_model(['wallet_balance'])
+
+        cr = self.env.cr
+        cr.execute("""
+            SELECT id FROM wallet_transaction
+             WHERE id IN %s AND status = 'done' AND is_applied IS NOT TRUE
+             ORDER BY partner_id, id
+        """, (tuple(self.ids) or (None,),))
+        ids = [row[0] for row in cr.fetchall()]
+
+        total = 0
+        for chunk in tools.split_every(chunk_size, ids, list):
+            cr.execute("""
+                WITH claimed AS (
+                    UPDATE wallet_transaction
+                       SET is_applied = TRUE,
+                           write_uid = %s,
+                           write_date = (now() at time zone 'UTC')
+                     WHERE id IN %s
+                       AND status = 'done'
+                       AND is_applied IS NOT TRUE
+                 RETURNING partner_id, amount
+                ), credited AS (
+                    UPDATE res_partner p
+                       SET wallet_balance = COALESCE(p.wallet_balance, 0) + agg.total
+                      FROM (SELECT partner_id, SUM(amount) AS total FROM claimed GROUP BY partner_id) agg
+                     WHERE p.id = agg.partner_id
+                 RETURNING p.id
+                )
+                SELECT (SELECT count(*) FROM claimed), (SELECT count(*) FROM credited)
+            """, (self.env.uid, tuple(chunk)))
+            applied, partners = cr.fetchone()
+            total += applied
+            _logger.info("Bulk applied %s transactions to %s partners", applied, partners)
+            if auto_commit:
+                cr.commit()
 
-            partner = rec.partner_id
-            
-            # 1) update canonical partner.wallet_balance
-            partner.sudo().write({'wallet_balance': partner.wallet_balance + rec.amount})
+        self.invalidate_recordset(['is_applied', 'write_uid', 'write_date'])
+        self.env['res.partner'].invalidate_model(['wallet_balance'])
+        return total
 
-            # 2) Mark as applied to ensure idempotency
-            rec.write({'is_applied': True})
-            
-            _logger.info("Applied funding of %s to partner %s. New balance: %s", rec.amount, partner.id, partner.wallet_balance)
+    @api.model
+    def _fund_from_callback(self, partner, amount, reference):
+        """Record a funding confirmed by the legacy callback as a done ledger row and apply it.
 
-            # NOTE: Removed brittle external wallet detection logic. 
-            # If integration with a specific external wallet module is required, 
-            # it should be done via a dedicated, explicit dependency and method override.
+        A row the checkout already created for ``reference`` is confirmed and
+        applied instead of adding a second one. Either way the balance only
+        moves through ``_apply_funding``, so every credit is backed by an
+        applied ledger row. Returns the transaction, or an empty recordset when
+        the reference was already settled and archived.
+        """
+        tx = self.browse()
+        if reference:
+            tx = self.search([('partner_id', '=', partner.id), ('reference', '=', reference)], limit=1)
+        if not tx:
+            tx = self.create({
+                'partner_id': partner.id,
+                'amount': amount,
+                'tx_type': 'fund',
+                'reference': reference,
+                'provider': 'flutterwave',
+                'status': 'done',
+                'note': 'Flutterwave callback',
+            })
+        elif tx.status == 'pending':
+            tx.status = 'done'
+        tx._apply_funding()
+        return tx
 
+    @api.model
+    def _cron_apply_done_transactions(self, chunk_size=1000):
+        """Apply every confirmed but unapplied transaction, e.g. after a provider outage."""
+        self.env.cr.execute("""
+            SELECT id FROM wallet_transaction
+             WHERE status = 'done' AND is_applied IS NOT TRUE
+        """)
+        txs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if not txs:
+            return 0
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        return txs._apply_funding_bulk(chunk_size=chunk_size, auto_commit=auto_commit)
@@ -0,0 +1,261 @@
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import logging
+import threading
+import time
+import requests
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 2 * 60 * 60
+# Messages per channel per dispatcher run (the cron runs every minute)
+DEFAULT_RATE_LIMITS = {'email': 500, 'sms': 200}
+
+# Per-process throughput counters: channel -> {'sent', 'failed', 'seconds'}
+DISPATCH_STATS = {}
+
+
+class SmsBackend(object):
+    """Base class for SMS gateways. ``send`` raises on failure."""
+
+    def __init__(self, env):
+        self.env = env
+
+    def send(self, phone, body):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class FakeSmsBackend(SmsBackend):
+    """Keeps messages in memory instead of sending them; for tests and local development."""
+
+    outbox = []
+    fail = False
+
+    def send(self, phone, body):
+        if FakeSmsBackend.fail:
+            raise ConnectionError('Fake SMS gateway unavailable')
+        FakeSmsBackend.outbox.append((phone, body))
+
+
+class HttpSmsBackend(SmsBackend):
+    """Generic JSON gateway: POST ``{to, message}`` with a bearer token over one kept-alive session."""
+
+    def __init__(self, env):
+        super(HttpSmsBackend, self).__init__(env)
+        ICP = env['ir.config_parameter'].sudo()
+        self.url = ICP.get_param('wallet_online_funding.sms_gateway_url')
+        self.token = ICP.get_param('wallet_online_funding.sms_gateway_token')
+        self.session = requests.Session()
+
+    def send(self, phone, body):
+        r = self.session.post(self.url, json={'to': phone, 'message': body},
+                              headers={'Authorization': f'Bearer {self.token}'}, timeout=(3, 10))
+        r.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+
+SMS_BACKENDS = {
+    'fake': FakeSmsBackend,
+    'http': HttpSmsBackend,
+}
+
+
+class WalletNotification(models.Model):
+    _name = 'wallet.notification'
+    _description = 'Wallet Notification Outbox'
+    _order = 'id desc'
+
+    channel = fields.Selection([('email', 'Email'), ('sms', 'SMS')], string='Channel', required=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', ondelete='set null')
+    recipient = fields.Char(string='Recipient', required=True)
+    subject = fields.Char(string='Subject')
+    body = fields.Text(string='Body')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    ], string='State', default='pending', required=True)
+    attempts = fields.Integer(string='Attempts', default=0, readonly=True)
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now)
+    sent_at = fields.Datetime(string='Sent At', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    def init(self):
+        tools.create_index(
+            self._cr, 'wallet_notification_queue_idx', self._table,
+            ['channel', 'next_attempt_at', 'id'], where="state = 'pending'",
+        )
+
+    @api.model
+    def _sms_backend_name(self):
+        return self.env['ir.config_parameter'].sudo().get_param('wallet_online_funding.sms_backend')
+
+    @api.model
+    def _enqueue_funding(self, partner, amount):
+        """Queue the "wallet funded" email (and SMS when a gateway is configured)."""
+        vals_list = []
+        if partner.email:
+            vals_list.append({
+                'channel': 'email',
+                'partner_id': partner.id,
+                'recipient': partner.email,
+                'subject': 'Wallet Funded Successfully',
+                'body': f"""
+                    <p>Hello {partner.name},</p>
+                    <p>Your wallet has been funded with <b>₦{amount:,.2f}</b>.</p>
+                    <p>New balance: <b>₦{partner.wallet_balance:,.2f}</b></p>
+                    <p>Thank you for your patronage.</p>
+                """,
+            })
+        if partner.phone and self._sms_backend_name():
+            vals_list.append({
+                'channel': 'sms',
+                'partner_id': partner.id,
+                'recipient': partner.wallet_phone_key or partner.phone,
+                'body': f"Your wallet has been funded with NGN{amount:,.2f}. New balance: NGN{partner.wallet_balance:,.2f}.",
+            })
+        return self.create(vals_list)
+
+    # -------------------------------------------------------------------------
+    # Dispatcher
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_dispatch(self, batch_size=100):
+        """Dispatch every channel; a channel that breaks is logged and does not hold up the others."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for channel in ('email', 'sms'):
+            try:
+                self._dispatch_channel(channel, batch_size=batch_size, auto_commit=auto_commit)
+            except Exception:
+                if not auto_commit:
+                    raise
+                self.env.cr.rollback()
+                _logger.exception("Dispatching %s notifications failed", channel)
+
+    @api.model
+    def _rate_limit(self, channel):
+        value = self.env['ir.config_parameter'].sudo().get_param(
+            'wallet_online_funding.notification_rate_%s' % channel)
+        return int(value) if value else DEFAULT_RATE_LIMITS[channel]
+
+    @api.model
+    def _claim_batch(self, channel, limit):
+        self.env.cr.execute("""
+            SELECT id FROM wallet_notification
+             WHERE channel = %s AND state = 'pending' AND next_attempt_at <= %s
+             ORDER BY next_attempt_at, id
+             LIMIT %s
+             FOR UPDATE SKIP LOCKED
+        """, (channel, fields.Datetime.now(), limit))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _dispatch_channel(self, channel, batch_size=100, auto_commit=False):
+        """Send due notifications of one channel over a single connection, up to the rate limit."""
+        budget = self._rate_limit(channel)
+        sent = failed = 0
+        start = time.monotonic()
+        try:
+            send, close = self._open_sender(channel)
+        except Exception as e:
+            # e.g. an SMTP outage: the due messages back off like failed sends
+            _logger.warning("Opening the %s channel failed: %s", channel, e)
+            error = str(e) or e.__class__.__name__
+
+            def send(notification):
+                raise ConnectionError(error)
+
+            def close():
+                pass
+        try:
+            while budget > 0:
+                batch = self._claim_batch(channel, min(batch_size, budget))
+                if not batch:
+                    break
+                budget -= len(batch)
+                for notification in batch:
+                    try:
+                        send(notification)
+                    except Exception as e:
+                        _logger.warning("Sending %s notification %s failed: %s", channel, notification.id, e)
+                        notification._schedule_retry(str(e))
+                        failed += 1
+                        continue
+                    notification.write({
+                        'state': 'sent',
+                        'attempts': notification.attempts + 1,
+                        'sent_at': fields.Datetime.now(),
+                        'last_error': False,
+                    })
+                    sent += 1
+                if auto_commit:
+                    self.env.cr.commit()
+        finally:
+            close()
+        elapsed = time.monotonic() - start
+        stats = DISPATCH_STATS.setdefault(channel, {'sent': 0, 'failed': 0, 'seconds': 0.0})
+        stats['sent'] += sent
+        stats['failed'] += failed
+        stats['seconds'] += elapsed
+        if sent or failed:
+            _logger.info("Dispatched %s %s notifications (%s failed) in %.2fs (%.1f/s)",
+                         sent, channel, failed, elapsed, sent / elapsed if elapsed else 0.0)
+        return sent, failed
+
+    @api.model
+    def _open_sender(self, channel):
+        """Return ``(send, close)`` for a channel; the connection is reused for the whole run."""
+        if channel == 'email':
+            IrMailServer = self.env['ir.mail_server'].sudo()
+            smtp_session = IrMailServer.connect()
+            email_from = self.env.company.email_formatted or IrMailServer._get_default_from_address()
+
+            def send(notification):
+                message = IrMailServer.build_email(
+                    email_from=email_from,
+                    email_to=[notification.recipient],
+                    subject=notification.subject or '',
+                    body=notification.body or '',
+                    subtype='html',
+                )
+                IrMailServer.send_email(message, smtp_session=smtp_session)
+
+            def close():
+                if smtp_session:
+                    try:
+                        smtp_session.quit()
+                    except Exception:
+                        pass
+            return send, close
+
+        backend_cls = SMS_BACKENDS.get(self._sms_backend_name())
+        if not backend_cls:
+            def send(notification):
+                raise ValueError('No SMS backend configured (wallet_online_funding.sms_backend)')
+            return send, lambda: None
+        backend = backend_cls(self.env)
+        return (lambda notification: backend.send(notification.recipient, notification.body)), backend.close
+
+    def _schedule_retry(self, error):
+        attempts = self.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            self.write({'state': 'dead', 'attempts': attempts, 'last_error': error})
+            return
+        delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+        self.write({
+            'attempts': attempts,
+            'last_error': error,
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+
+    def action_retry(self):
+        """Put dead-lettered notifications back in the outbox."""
+        self.write({'state': 'pending', 'attempts': 0, 'next_attempt_at': fields.Datetime.now()})
@@ -0,0 +1,103 @@
+from odoo import models, fields, api
+from odoo.tools.lru import LRU
+import logging
+import re
+import time
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_COUNTRY_CODE = '234'
+RESOLVER_CACHE_SIZE = 4096
+RESOLVER_CACHE_TTL = 300
+
+# (dbname, email_key, phone_key) -> (partner_id, key field, key, expires_at); positive hits only
+_resolver_cache = LRU(RESOLVER_CACHE_SIZE)
+
+
+def normalize_email(email):
+    """Lookup key for an email address: trimmed and lower-cased."""
+    email = (email or '').strip().lower()
+    return email or False
+
+
+def normalize_phone(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Lookup key for a phone number in E.164 form (``+2348012345678``).
+
+    Deliberately dependency-free: the key is stored, so it must not change
+    depending on whether an optional phone library happens to be installed.
+    """
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return False
+    if phone.startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    if digits.startswith(country_code) and len(digits) > 10:
+        return '+' + digits
+    if digits.startswith('0'):
+        digits = digits[1:]
+    return '+' + country_code + digits
+
+
+class WalletPartnerResolver(models.AbstractModel):
+    _name = 'wallet.partner.resolver'
+    _description = 'Wallet Partner Resolver'
+
+    @api.model
+    def _country_code(self):
+        return self.env['ir.config_parameter'].sudo().get_param(
+            'wallet_online_funding.default_phone_country_code', DEFAULT_COUNTRY_CODE)
+
+    @api.model
+    def _resolve(self, email=None, phone=None):
+        """Return the partner matching ``email`` (preferred) or ``phone``, or an empty recordset.
+
+        Each probe hits the indexed normalized key. Positive results are kept in a
+        small per-worker LRU for a few minutes. The LRU is not shared between
+        workers, so a hit is only trusted while the partner's stored key still
+        equals the one it was found by (one primary-key read).
+        """
+        Partner = self.env['res.partner']
+        email_key = normalize_email(email)
+        phone_key = normalize_phone(phone, self._country_code())
+        if not email_key and not phone_key:
+            return Partner
+
+        cache_key = (self.env.cr.dbname, email_key, phone_key)
+        cached = _resolver_cache.get(cache_key)
+        if cached and cached[3] > time.monotonic():
+            partner_id, key_field, key = cached[:3]
+            partner = Partner.browse(partner_id).exists()
+            if partner and partner[key_field] == key:
+                return partner
+            try:
+                del _resolver_cache[cache_key]
+            except KeyError:
+                pass
+
+        for key_field, key in (('wallet_email_key', email_key), ('wallet_phone_key', phone_key)):
+            if not key:
+                continue
+            partner = Partner.search([(key_field, '=', key)], order='id', limit=1)
+            if partner:
+                _resolver_cache[cache_key] = (partner.id, key_field, key, time.monotonic() + RESOLVER_CACHE_TTL)
+                return partner
+        return Partner
+
+
+class ResPartnerLookupKeys(models.Model):
+    _inherit = 'res.partner'
+
+    wallet_email_key = fields.Char(string='Email Lookup Key', compute='_compute_wallet_lookup_keys',
+                                   store=True, index=True, copy=False)
+    wallet_phone_key = fields.Char(string='Phone Lookup Key', compute='_compute_wallet_lookup_keys',
+                                   store=True, index=True, copy=False)
+
+    @api.depends('email', 'phone')
+    def _compute_wallet_lookup_keys(self):
+        country_code = self.env['wallet.partner.resolver']._country_code()
+        for partner in self:
+            partner.wallet_email_key = normalize_email(partner.email)
+            partner.wallet_phone_key = normalize_phone(partner.phone, country_code)
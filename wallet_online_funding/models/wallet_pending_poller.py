@@ -0,0 +1,123 @@
+from odoo import models, fields, api, tools
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from ..services.provider_client import ProviderUnavailable
+
+_logger = logging.getLogger(__name__)
+
+# Give the webhook a chance before polling the provider ourselves
+POLL_MIN_AGE_MINUTES = 15
+# Do not ask the provider about the same transaction more often than this
+POLL_RECHECK_MINUTES = 30
+
+
+class WalletTransactionPoller(models.Model):
+    _inherit = 'wallet.transaction'
+
+    last_polled_at = fields.Datetime(string='Last Polled', readonly=True, copy=False)
+
+    def init(self):
+        super(WalletTransactionPoller, self).init()
+        # stale-pending scans (recovery poller, expiry sweeper) walk status + date
+        tools.create_index(self._cr, 'wallet_transaction_status_date_idx', self._table, ['status', 'date'])
+
+    @api.model
+    def _cron_recover_pending(self, batch_size=200, concurrency=8, time_budget=240):
+        """Verify pending transactions whose webhook never arrived and finalize the paid ones.
+
+        Transactions are polled per merchant account, with that account's
+        secret key and HTTP client, so an account without a key or with an
+        open circuit does not hold back the others. Remote verification runs
+        in a bounded thread pool that never touches the cursor; results are
+        written back from this thread in one pass per batch. Stops when the
+        queue is empty or the time budget (seconds) is spent. Returns the run
+        statistics.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Account = self.env['wallet.provider.account']
+        stats = {'checked': 0, 'verified': 0, 'applied': 0, 'unavailable': 0, 'seconds': 0.0}
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='wallet_poll') as pool:
+            for account in self._stale_pending_accounts():
+                code = account.code or None
+                config = Account._get_config('flutterwave', code)
+                if not config.get('secret_key'):
+                    _logger.info("Pending recovery skipped for Flutterwave account %s: no secret key configured",
+                                 code or 'default')
+                    continue
+                client = Account._http_client('flutterwave', code)
+                while time.monotonic() - start < time_budget:
+                    txs = self._stale_pending(batch_size, account)
+                    if not txs:
+                        break
+                    refs = txs.mapped('reference')
+                    results = dict(zip(refs, pool.map(
+                        lambda ref: self._poll_reference(client, ref, config['secret_key']), refs)))
+                    stats['checked'] += len(txs)
+                    stats['unavailable'] += sum(1 for result in results.values() if result is None)
+                    stats['verified'] += sum(1 for result in results.values() if result)
+                    stats['applied'] += txs._finalize_polled(results)
+                    if auto_commit:
+                        self.env.cr.commit()
+                    if client.breaker.state != 'closed':
+                        _logger.warning("Pending recovery stopped for Flutterwave account %s: circuit is %s",
+                                        code or 'default', client.breaker.state)
+                        break
+
+        stats['seconds'] = time.monotonic() - start
+        _logger.info(
+            "Pending recovery: checked %(checked)s, verified %(verified)s, applied %(applied)s, "
+            "provider unavailable %(unavailable)s in %(seconds).1fs", stats)
+        if stats['seconds']:
+            _logger.info("Pending recovery rate: %.1f verifications/s", stats['checked'] / stats['seconds'])
+        return stats
+
+    @api.model
+    def _stale_pending_domain(self):
+        now = fields.Datetime.now()
+        return [
+            ('status', '=', 'pending'),
+            ('provider', '=', 'flutterwave'),
+            ('date', '<', now - timedelta(minutes=POLL_MIN_AGE_MINUTES)),
+            '|', ('last_polled_at', '=', False),
+                 ('last_polled_at', '<', now - timedelta(minutes=POLL_RECHECK_MINUTES)),
+        ]
+
+    @api.model
+    def _stale_pending_accounts(self):
+        """The merchant accounts with stale pending transactions; empty stands for the default account."""
+        groups = self._read_group(self._stale_pending_domain(), groupby=['provider_account_id'])
+        return [account for account, in groups]
+
+    @api.model
+    def _stale_pending(self, limit, account=None):
+        domain = self._stale_pending_domain()
+        if account is not None:
+            domain.append(('provider_account_id', '=', account.id))
+        return self.search(domain, order='date', limit=limit)
+
+    @staticmethod
+    def _poll_reference(client, reference, secret_key):
+        """Runs in a pool thread: HTTP only. Returns True/False, or None if the provider is unavailable."""
+        try:
+            return client.verify_flutterwave(reference, secret_key)
+        except ProviderUnavailable:
+            return None
+
+    def _finalize_polled(self, results):
+        """Write poll results back. Returns how many transactions were credited."""
+        self.write({'last_polled_at': fields.Datetime.now()})
+        paid = self.filtered(lambda tx: results.get(tx.reference))
+        if not paid:
+            return 0
+        paid.write({'status': 'done', 'note': 'Confirmed by pending recovery poller'})
+        applied = paid._apply_funding()
+        Notification = self.env['wallet.notification'].sudo()
+        for tx in applied:
+            Notification._enqueue_funding(tx.partner_id, tx.amount)
+        return len(applied)
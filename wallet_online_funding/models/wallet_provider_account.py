@@ -0,0 +1,109 @@
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
+import logging
+
+from ..services.provider_client import get_client
+
+_logger = logging.getLogger(__name__)
+
+# Legacy single-account settings, used when no account is configured for Flutterwave
+LEGACY_PARAMS = {
+    'flutterwave': {
+        'secret_key': 'wallet_online_funding.flw_secret_key',
+        'secret_hash': 'wallet_online_funding.flw_secret_hash',
+        'direct_link': 'wallet_online_funding.flw_direct_link',
+    },
+}
+
+# Provider API endpoints; overridable through wallet_online_funding.<provider>_api_base (e.g. a local stub)
+API_BASE_URLS = {
+    'flutterwave': 'https://api.flutterwave.com',
+    'paystack': 'https://api.paystack.co',
+}
+
+
+class WalletProviderAccount(models.Model):
+    _name = 'wallet.provider.account'
+    _description = 'Payment Provider Merchant Account'
+    _order = 'provider, sequence, id'
+
+    name = fields.Char(string='Name', required=True)
+    code = fields.Char(string='Code', required=True,
+                       help='Identifies the merchant account in webhook URLs (/wallet/<provider>/webhook/<code>).')
+    provider = fields.Selection([('flutterwave', 'Flutterwave'), ('paystack', 'Paystack')],
+                                string='Provider', required=True, default='flutterwave')
+    sequence = fields.Integer(string='Sequence', default=10, help='The first active account is the default one.')
+    active = fields.Boolean(string='Active', default=True)
+    secret_key = fields.Char(string='Secret Key', groups='base.group_system')
+    secret_hash = fields.Char(string='Webhook Secret Hash', groups='base.group_system')
+    direct_link = fields.Char(string='Payment Link')
+
+    _sql_constraints = [
+        ('provider_code_uniq', 'unique(provider, code)', 'The account code must be unique per provider.'),
+    ]
+
+    @api.model
+    @tools.ormcache('provider', 'code')
+    def _get_config(self, provider, code=None):
+        """Return the settings of a merchant account (the default one when ``code`` is empty).
+
+        The result lives in the registry's ormcache: hot reads cost no SQL, and
+        any write to an account or to ``ir.config_parameter`` clears the cache,
+        which Odoo signals to every other worker.
+        """
+        domain = [('provider', '=', provider)]
+        if code:
+            domain.append(('code', '=', code))
+        account = self.sudo().search(domain, limit=1)
+        if account:
+            return frozendict({
+                'account_id': account.id,
+                'code': account.code,
+                'provider': provider,
+                'secret_key': account.secret_key or False,
+                'secret_hash': account.secret_hash or False,
+                'direct_link': account.direct_link or False,
+            })
+        if code or provider not in LEGACY_PARAMS:
+            return frozendict()
+        ICP = self.env['ir.config_parameter'].sudo()
+        config = {key: ICP.get_param(param) or False for key, param in LEGACY_PARAMS[provider].items()}
+        config.update(account_id=False, code=False, provider=provider)
+        return frozendict(config)
+
+    @api.model
+    def _http_client(self, provider, code=None):
+        """Return the pooled, circuit-broken HTTP client of this worker process for ``provider``.
+
+        A merchant account ``code`` gets a client (and circuit breaker) of its own.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+
+        def param(key, default):
+            return float(ICP.get_param('wallet_online_funding.http_%s' % key, default))
+
+        base_url = ICP.get_param('wallet_online_funding.%s_api_base' % provider, API_BASE_URLS[provider])
+        return get_client(
+            '%s:%s' % (provider, code) if code else provider, base_url,
+            connect_timeout=param('connect_timeout', 2.0),
+            read_timeout=param('read_timeout', 5.0),
+            failure_threshold=int(param('failure_threshold', 5)),
+            reset_timeout=param('reset_timeout', 30.0),
+            cache_ttl=param('cache_ttl', 120.0),
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(WalletProviderAccount, self).create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super(WalletProviderAccount, self).write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super(WalletProviderAccount, self).unlink()
+        self.env.registry.clear_cache()
+        return res
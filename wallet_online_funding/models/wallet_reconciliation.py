@@ -0,0 +1,271 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+import csv
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH_SIZE = 2000
+AMOUNT_TOLERANCE = 0.005
+SUCCESS_STATUSES = {'successful', 'success', 'settled', 'completed'}
+
+# Candidate column headers per provider (matched case-insensitively)
+SETTLEMENT_COLUMNS = {
+    'flutterwave': {
+        'reference': ('tx_ref', 'transaction reference', 'reference', 'txref'),
+        'amount': ('amount', 'charged amount', 'amount charged'),
+        'status': ('status', 'transaction status'),
+        'customer': ('customer email', 'customer', 'email'),
+    },
+    'paystack': {
+        'reference': ('reference', 'transaction reference'),
+        'amount': ('amount', 'transaction amount'),
+        'status': ('status', 'transaction status'),
+        'customer': ('customer email', 'customer (email)', 'email'),
+    },
+}
+
+
+class WalletReconciliation(models.Model):
+    _name = 'wallet.reconciliation'
+    _description = 'Provider Settlement Reconciliation'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: fields.Date.to_string(fields.Date.today()))
+    provider = fields.Selection([('flutterwave', 'Flutterwave'), ('paystack', 'Paystack')],
+                                string='Provider', required=True, default='flutterwave')
+    settlement_file = fields.Binary(string='Settlement File (CSV)', attachment=True)
+    settlement_filename = fields.Char(string='File Name')
+    date_from = fields.Datetime(string='Period Start',
+                                help='Local transactions in this period that are absent from the file are reported as missing at the provider.')
+    date_to = fields.Datetime(string='Period End')
+    auto_apply = fields.Boolean(string='Auto-apply Safe Matches', default=True,
+                                help='Finalize pending or failed local transactions that the provider settled for the exact amount.')
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], string='State', default='draft', required=True)
+    rows_read = fields.Integer(string='Rows Read', readonly=True)
+    matched_count = fields.Integer(string='Matched', readonly=True)
+    mismatch_count = fields.Integer(string='Amount Mismatch', readonly=True)
+    missing_local_count = fields.Integer(string='Missing Locally', readonly=True)
+    missing_provider_count = fields.Integer(string='Missing at Provider', readonly=True)
+    skipped_count = fields.Integer(string='Skipped (not settled)', readonly=True)
+    settled_failed_count = fields.Integer(string='Settled but Failed Locally', readonly=True)
+    ambiguous_count = fields.Integer(string='Ambiguous Reference', readonly=True)
+    applied_count = fields.Integer(string='Auto-applied', readonly=True)
+    line_ids = fields.One2many('wallet.reconciliation.line', 'reconciliation_id', string='Exceptions', readonly=True)
+
+    def action_run(self):
+        """Reconcile the uploaded settlement file."""
+        self.ensure_one()
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'settlement_file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError('Upload a settlement file first.')
+        if attachment.store_fname:
+            # stream from the filestore rather than loading the file in memory
+            with open(attachment._full_path(attachment.store_fname), 'rb') as stream:
+                self._reconcile_stream(stream)
+        else:
+            self._reconcile_stream(io.BytesIO(attachment.raw or b''))
+        return True
+
+    def _reconcile_stream(self, stream, batch_size=RECONCILE_BATCH_SIZE):
+        """Reconcile a binary CSV stream in constant memory.
+
+        Rows are read lazily and looked up by reference in batches. Seen
+        references go to a temporary table so "missing at provider" is a
+        single anti-join at the end instead of an in-memory set.
+        """
+        self.ensure_one()
+        self.line_ids.unlink()
+        cr = self.env.cr
+        self.env['wallet.transaction'].flush_model()
+        cr.execute("DROP TABLE IF EXISTS wallet_reconcile_seen")
+        cr.execute("CREATE TEMPORARY TABLE wallet_reconcile_seen (reference varchar PRIMARY KEY) ON COMMIT DROP")
+
+        counts = dict.fromkeys(('rows', 'matched', 'mismatch', 'missing_local', 'skipped', 'applied',
+                                'settled_failed', 'ambiguous'), 0)
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text)
+        columns = self._settlement_columns(next(reader, []))
+
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            counts['rows'] += 1
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._reconcile_batch(batch, columns, counts)
+                batch = []
+        if batch:
+            self._reconcile_batch(batch, columns, counts)
+
+        missing_provider = self._report_missing_at_provider()
+        cr.execute("DROP TABLE IF EXISTS wallet_reconcile_seen")
+
+        self.write({
+            'state': 'done',
+            'rows_read': counts['rows'],
+            'matched_count': counts['matched'],
+            'mismatch_count': counts['mismatch'],
+            'missing_local_count': counts['missing_local'],
+            'missing_provider_count': missing_provider,
+            'skipped_count': counts['skipped'],
+            'applied_count': counts['applied'],
+            'settled_failed_count': counts['settled_failed'],
+            'ambiguous_count': counts['ambiguous'],
+        })
+        _logger.info("Reconciliation %s: %s", self.id, self._summary())
+        return counts
+
+    def _settlement_columns(self, header):
+        """Map logical columns to positions in the CSV header."""
+        normalized = [(h or '').strip().lower() for h in header]
+        columns = {}
+        for key, candidates in SETTLEMENT_COLUMNS[self.provider].items():
+            columns[key] = next((normalized.index(c) for c in candidates if c in normalized), None)
+        if columns['reference'] is None or columns['amount'] is None:
+            raise UserError('The settlement file needs a reference and an amount column.')
+        return columns
+
+    def _reconcile_batch(self, rows, columns, counts):
+        cr = self.env.cr
+        settled = {}
+        for row in rows:
+            reference = (row[columns['reference']] if len(row) > columns['reference'] else '').strip()
+            status = ''
+            if columns['status'] is not None and len(row) > columns['status']:
+                status = row[columns['status']].strip().lower()
+            if not reference or (status and status not in SUCCESS_STATUSES):
+                counts['skipped'] += 1
+                continue
+            customer = ''
+            if columns['customer'] is not None and len(row) > columns['customer']:
+                customer = row[columns['customer']].strip().lower()
+            try:
+                settled[reference] = (float(row[columns['amount']].replace(',', '')), customer)
+            except (IndexError, ValueError):
+                counts['skipped'] += 1
+
+        if not settled:
+            return
+        references = list(settled)
+        cr.execute("""
+            INSERT INTO wallet_reconcile_seen (reference)
+            SELECT unnest(%s::varchar[])
+                ON CONFLICT DO NOTHING
+        """, (references,))
+        # references are only unique per customer, so keep every candidate
+        cr.execute("""
+            SELECT t.id, t.reference, t.amount, t.status, t.is_applied, lower(p.email)
+              FROM wallet_transaction t
+              JOIN res_partner p ON p.id = t.partner_id
+             WHERE t.reference = ANY(%s)
+        """, (references,))
+        local = {}
+        for tx_id, reference, amount, status, is_applied, email in cr.fetchall():
+            local.setdefault(reference, []).append((tx_id, amount, status, is_applied, email))
+
+        lines = []
+        to_apply = []
+        for reference, (provider_amount, customer) in settled.items():
+            candidates = local.get(reference)
+            if not candidates:
+                counts['missing_local'] += 1
+                lines.append(self._line_vals('missing_local', reference, provider_amount))
+                continue
+            if len(candidates) > 1 and customer:
+                candidates = [c for c in candidates if c[4] == customer]
+            if len(candidates) != 1:
+                # several customers share the reference and the file does not say whose it is
+                counts['ambiguous'] += 1
+                lines.append(self._line_vals('ambiguous', reference, provider_amount))
+                continue
+            tx_id, local_amount, status, is_applied, _email = candidates[0]
+            if abs((local_amount or 0.0) - provider_amount) > AMOUNT_TOLERANCE:
+                counts['mismatch'] += 1
+                lines.append(self._line_vals('mismatch', reference, provider_amount, local_amount, tx_id))
+                continue
+            counts['matched'] += 1
+            if status == 'failed':
+                # e.g. expired before the webhook came; the provider has the customer's money
+                counts['settled_failed'] += 1
+                lines.append(self._line_vals('settled_failed', reference, provider_amount, local_amount, tx_id))
+            if self.auto_apply and not is_applied:
+                to_apply.append(tx_id)
+
+        if to_apply:
+            txs = self.env['wallet.transaction'].browse(to_apply)
+            txs.filtered(lambda tx: tx.status in ('pending', 'failed')).write({
+                'status': 'done',
+                'note': 'Confirmed by settlement reconciliation %s' % self.name,
+            })
+            counts['applied'] += len(txs._apply_funding())
+        if lines:
+            self.env['wallet.reconciliation.line'].create(lines)
+
+    def _report_missing_at_provider(self):
+        """Local done transactions of the period that the provider did not settle.
+
+        The exception lines are written by one INSERT ... SELECT, so the rows
+        never leave the database. Returns how many were reported.
+        """
+        if not self.date_from or not self.date_to:
+            return 0
+        self.env['wallet.reconciliation.line'].flush_model()
+        self.env.cr.execute("""
+            INSERT INTO wallet_reconciliation_line
+                   (reconciliation_id, kind, reference, provider_amount, local_amount, transaction_id,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT %s, 'missing_provider', t.reference, 0.0, t.amount, t.id,
+                   %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+              FROM wallet_transaction t
+             WHERE t.provider = %s
+               AND t.status = 'done'
+               AND t.date BETWEEN %s AND %s
+               AND NOT EXISTS (SELECT 1 FROM wallet_reconcile_seen s WHERE s.reference = t.reference)
+        """, (self.id, self.env.uid, self.env.uid, self.provider, self.date_from, self.date_to))
+        count = self.env.cr.rowcount
+        self.invalidate_recordset(['line_ids'])
+        return count
+
+    def _line_vals(self, kind, reference, provider_amount=0.0, local_amount=0.0, transaction_id=False):
+        return {
+            'reconciliation_id': self.id,
+            'kind': kind,
+            'reference': reference,
+            'provider_amount': provider_amount,
+            'local_amount': local_amount,
+            'transaction_id': transaction_id,
+        }
+
+    def _summary(self):
+        return ("%s rows: %s matched (%s auto-applied, %s failed locally), %s amount mismatches, "
+                "%s ambiguous, %s missing locally, %s missing at provider, %s skipped") % (
+            self.rows_read, self.matched_count, self.applied_count, self.settled_failed_count,
+            self.mismatch_count, self.ambiguous_count, self.missing_local_count,
+            self.missing_provider_count, self.skipped_count)
+
+
+class WalletReconciliationLine(models.Model):
+    _name = 'wallet.reconciliation.line'
+    _description = 'Settlement Reconciliation Exception'
+    _order = 'reconciliation_id, kind, id'
+
+    reconciliation_id = fields.Many2one('wallet.reconciliation', string='Reconciliation',
+                                        required=True, ondelete='cascade', index=True)
+    kind = fields.Selection([
+        ('mismatch', 'Amount Mismatch'),
+        ('settled_failed', 'Settled but Failed Locally'),
+        ('ambiguous', 'Ambiguous Reference'),
+        ('missing_local', 'Missing Locally'),
+        ('missing_provider', 'Missing at Provider'),
+    ], string='Kind', required=True)
+    reference = fields.Char(string='Reference')
+    provider_amount = fields.Float(string='Provider Amount')
+    local_amount = fields.Float(string='Local Amount')
+    transaction_id = fields.Many2one('wallet.transaction', string='Transaction', ondelete='set null')
@@ -0,0 +1,100 @@
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Rows are stamped with their transaction's start time, so a slow transaction can commit
+# a write_date older than the mark; days touched this long before the mark are redone too
+ROLLUP_OVERLAP_MINUTES = 10
+
+# One group per UTC day and dimension combination, from the hot and the archived ledger.
+# Filled in by _refresh_days with the day selection.
+ROLLUP_INSERT = """
+    INSERT INTO wallet_daily_rollup
+           (day, provider, tx_type, status, currency_id, tx_count, amount, source_write_date)
+    SELECT src.date::date, src.provider, src.tx_type, src.status, %%s,
+           COUNT(*), SUM(src.amount), MAX(src.write_date)
+      FROM (
+            SELECT date, provider, tx_type, status, amount, write_date FROM wallet_transaction
+             UNION ALL
+            SELECT date, provider, tx_type, status, amount, NULL FROM wallet_transaction_archive
+      ) src
+      %s
+     GROUP BY src.date::date, src.provider, src.tx_type, src.status
+"""
+
+
+class WalletDailyRollup(models.Model):
+    _name = 'wallet.daily.rollup'
+    _description = 'Wallet Daily Totals'
+    _order = 'day desc'
+    _log_access = False
+
+    day = fields.Date(string='Day', readonly=True, index=True)
+    provider = fields.Char(string='Provider', readonly=True)
+    tx_type = fields.Selection([('fund', 'Funding'), ('spend', 'Spending')], string='Type', readonly=True)
+    status = fields.Selection([('pending','Pending'), ('done','Done'), ('failed','Failed')], string='Status', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    tx_count = fields.Integer(string='Transactions', readonly=True)
+    amount = fields.Monetary(string='Amount', currency_field='currency_id', readonly=True)
+    source_write_date = fields.Datetime(string='Source Updated', readonly=True,
+                                        help='Latest ledger change folded into this row; the refresh high-water mark')
+
+    @api.model
+    def _refresh(self):
+        """Recompute the days that have ledger changes since the last run.
+
+        The high-water mark is the newest ``source_write_date`` in the rollup, so
+        no separate state is kept; an empty rollup is rebuilt in full. Returns the
+        number of days recomputed.
+        """
+        self.env['wallet.transaction'].flush_model()
+        self.env.cr.execute("SELECT MAX(source_write_date) FROM wallet_daily_rollup")
+        mark = self.env.cr.fetchone()[0]
+        if mark is None:
+            return self._rebuild()
+        self.env.cr.execute("""
+            SELECT DISTINCT date::date FROM wallet_transaction
+             WHERE write_date > %s AND date IS NOT NULL
+        """, (mark - timedelta(minutes=ROLLUP_OVERLAP_MINUTES),))
+        days = [row[0] for row in self.env.cr.fetchall()]
+        if days:
+            self._refresh_days(days)
+        return len(days)
+
+    @api.model
+    def _refresh_days(self, days):
+        self.env.cr.execute("DELETE FROM wallet_daily_rollup WHERE day = ANY(%s)", (days,))
+        self.env.cr.execute(
+            ROLLUP_INSERT % "WHERE src.date >= %s AND src.date < %s AND src.date::date = ANY(%s)",
+            (self.env.company.currency_id.id, min(days), max(days) + timedelta(days=1), days))
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Recompute the whole rollup from the ledger, e.g. after a backfill. Returns the number of days."""
+        self.env['wallet.transaction'].flush_model()
+        self.env.cr.execute("DELETE FROM wallet_daily_rollup")
+        self.env.cr.execute(ROLLUP_INSERT % "WHERE src.date IS NOT NULL", (self.env.company.currency_id.id,))
+        self.invalidate_model()
+        self.env.cr.execute("SELECT COUNT(DISTINCT day) FROM wallet_daily_rollup")
+        days = self.env.cr.fetchone()[0]
+        _logger.info("Rebuilt wallet daily rollup: %s days", days)
+        return days
+
+    @api.model
+    def _cron_refresh(self):
+        days = self._refresh()
+        if days:
+            _logger.info("Refreshed wallet daily rollup for %s days", days)
+
+
+class WalletTransactionRollupIndexes(models.Model):
+    _inherit = 'wallet.transaction'
+
+    def init(self):
+        super(WalletTransactionRollupIndexes, self).init()
+        # the rollup refresh finds changed rows by write_date, then regroups their days by date
+        tools.create_index(self._cr, 'wallet_transaction_write_date_idx', self._table, ['write_date'])
+        tools.create_index(self._cr, 'wallet_transaction_date_idx', self._table, ['date'])
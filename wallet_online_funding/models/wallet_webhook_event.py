@@ -0,0 +1,219 @@
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import json
+import logging
+import threading
+
+from ..services import metrics
+
+_logger = logging.getLogger(__name__)
+
+# Retry policy for events that fail with a transient error (provider down, tx not yet visible, ...)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+# Headers we never persist with the raw event (shared secrets)
+SENSITIVE_HEADERS = {'verif-hash', 'authorization', 'cookie'}
+
+
+class WalletWebhookEvent(models.Model):
+    _name = 'wallet.webhook.event'
+    _description = 'Inbound Payment Webhook Event'
+    _order = 'received_at desc, id desc'
+
+    provider = fields.Char(string='Provider', required=True, default='flutterwave')
+    account_code = fields.Char(string='Merchant Account', help='Empty for the default account of the provider')
+    tx_ref = fields.Char(string='Transaction Reference', index=True)
+    payload = fields.Text(string='Raw Payload')
+    headers = fields.Text(string='Headers')
+    received_at = fields.Datetime(string='Received At', default=fields.Datetime.now, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead Letter'),
+    ], string='State', default='pending', required=True)
+    attempts = fields.Integer(string='Attempts', default=0, readonly=True)
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now)
+    processed_at = fields.Datetime(string='Processed At', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+    transaction_id = fields.Many2one('wallet.transaction', string='Transaction', ondelete='set null')
+
+    def init(self):
+        # The worker only ever scans pending events that are due
+        tools.create_index(
+            self._cr, 'wallet_webhook_event_queue_idx', self._table,
+            ['next_attempt_at', 'id'], where="state = 'pending'",
+        )
+        # Dead letters are few and counted by the metrics endpoint on every scrape
+        tools.create_index(
+            self._cr, 'wallet_webhook_event_dead_idx', self._table,
+            ['id'], where="state = 'dead'",
+        )
+
+    @api.model
+    def _parse_flutterwave_payload(self, data):
+        """Return (tx_ref, status, amount) from a Flutterwave payload. Keys may differ between event versions."""
+        inner = data.get('data') or {}
+        tx_ref = data.get('tx_ref') or inner.get('tx_ref') or data.get('reference')
+        status = (data.get('status') or inner.get('status') or '').lower()
+        try:
+            amount = float((data.get('amount') or inner.get('amount') or 0) or 0)
+        except Exception:
+            amount = 0.0
+        return tx_ref, status, amount
+
+    @api.model
+    def _enqueue(self, provider, data, headers=None, account_code=False):
+        """Persist a raw inbound event. Called from the webhook route; does no other work."""
+        tx_ref, _status, _amount = self._parse_flutterwave_payload(data)
+        safe_headers = {k: v for k, v in (headers or {}).items() if k.lower() not in SENSITIVE_HEADERS}
+        return self.create({
+            'provider': provider,
+            'account_code': account_code,
+            'tx_ref': tx_ref,
+            'payload': json.dumps(data),
+            'headers': json.dumps(safe_headers),
+        })
+
+    # -------------------------------------------------------------------------
+    # Worker
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_process_events(self, batch_size=200, max_batches=None):
+        """Drain due events in chunks. Each chunk is committed on its own so a crash only replays one chunk."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        batches = 0
+        while True:
+            events = self._claim_batch(batch_size)
+            if not events:
+                break
+            events._process()
+            if auto_commit:
+                self.env.cr.commit()
+            batches += 1
+            if max_batches and batches >= max_batches:
+                break
+        return batches
+
+    @api.model
+    def _claim_batch(self, batch_size):
+        """Lock a chunk of due events. SKIP LOCKED lets several cron workers drain the queue side by side."""
+        self.env.cr.execute("""
+            SELECT id FROM wallet_webhook_event
+             WHERE state = 'pending' AND next_attempt_at <= %s
+             ORDER BY next_attempt_at, id
+             LIMIT %s
+             FOR UPDATE SKIP LOCKED
+        """, (fields.Datetime.now(), batch_size))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _process(self):
+        for event in self:
+            try:
+                with self.env.cr.savepoint():
+                    handler = getattr(event, '_handle_%s' % event.provider, None)
+                    if handler is None:
+                        event._mark('failed', "No handler for provider %s" % event.provider)
+                        continue
+                    handler()
+            except Exception as e:
+                _logger.warning("Webhook event %s failed (attempt %s): %s", event.id, event.attempts + 1, e)
+                event._schedule_retry(str(e))
+
+    def _mark(self, state, error=False, transaction=None):
+        vals = {
+            'state': state,
+            'attempts': self.attempts + 1,
+            'processed_at': fields.Datetime.now(),
+            'last_error': error,
+        }
+        if transaction:
+            vals['transaction_id'] = transaction.id
+        self.write(vals)
+
+    def _schedule_retry(self, error):
+        attempts = self.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            _logger.error("Webhook event %s moved to dead letter after %s attempts: %s", self.id, attempts, error)
+            self.write({'state': 'dead', 'attempts': attempts, 'last_error': error})
+            return
+        delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+        self.write({
+            'attempts': attempts,
+            'last_error': error,
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+
+    def action_retry(self):
+        """Put failed or dead-lettered events back in the queue."""
+        self.write({'state': 'pending', 'attempts': 0, 'next_attempt_at': fields.Datetime.now()})
+
+    # -------------------------------------------------------------------------
+    # Flutterwave
+    # -------------------------------------------------------------------------
+
+    def _handle_flutterwave(self):
+        """Verify, apply and notify for one Flutterwave event. Raising schedules a retry."""
+        self.ensure_one()
+        data = json.loads(self.payload or '{}')
+        tx_ref, status, amount = self._parse_flutterwave_payload(data)
+        if not tx_ref:
+            self._mark('failed', 'Missing tx_ref')
+            metrics.outcome('webhook_event', 'missing_tx_ref')
+            return
+
+        with metrics.timed('lookup'):
+            tx = self.env['wallet.transaction'].sudo().search([('reference', '=', tx_ref)], limit=1)
+        if not tx:
+            if self.env['wallet.transaction.archive'].sudo().search_count([('reference', '=', tx_ref)], limit=1):
+                # settled and archived long ago: a late redelivery, not a missing checkout
+                self._mark('done', 'Reference already archived')
+                metrics.outcome('webhook_event', 'duplicate')
+                return
+            # The webhook can overtake the commit of the checkout that created the transaction
+            metrics.outcome('webhook_event', 'transaction_not_found')
+            raise ValueError("Transaction not found for tx_ref %s" % tx_ref)
+
+        if tx.is_applied:
+            self._mark('done', transaction=tx)
+            metrics.outcome('webhook_event', 'duplicate')
+            return
+
+        with metrics.timed('remote_verify'):
+            verified = self._verify_flutterwave(tx_ref, status)
+        if not verified:
+            tx.write({'status': 'failed', 'note': 'Verification failed'})
+            self._mark('failed', 'Verification failed', transaction=tx)
+            metrics.outcome('webhook_event', 'verification_failed')
+            return
+
+        # mark transaction done and apply (idempotent)
+        with metrics.timed('apply'):
+            tx.write({'status': 'done'})
+            applied = tx._apply_funding()
+        self._mark('done', transaction=tx)
+        metrics.outcome('webhook_event', 'success' if applied else 'duplicate')
+
+        # queue notifications; the outbox dispatcher sends them off the payment path
+        if applied:
+            with metrics.timed('notify'):
+                self.env['wallet.notification'].sudo()._enqueue_funding(tx.partner_id, tx.amount)
+
+    def _verify_flutterwave(self, tx_ref, status):
+        """Confirm the payment with Flutterwave.
+
+        Network errors and an open circuit raise ProviderUnavailable, which
+        defers the event to a later retry instead of failing the payment.
+        """
+        Account = self.env['wallet.provider.account']
+        config = Account._get_config('flutterwave', self.account_code or None)
+        if not config:
+            raise ValueError("Unknown Flutterwave account %s" % self.account_code)
+        secret_key = config.get('secret_key')
+        if not secret_key:
+            # no secret provided — we trust incoming webhook (fine for sandbox/testing)
+            return status in ('successful', 'success')
+        return Account._http_client('flutterwave', self.account_code or None).verify_flutterwave(tx_ref, secret_key)
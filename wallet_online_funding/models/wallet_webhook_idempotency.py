@@ -0,0 +1,98 @@
+from odoo import models, fields, api
+import json
+import logging
+
+from ..services import metrics
+
+_logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_RETENTION_DAYS = 30
+
+
+class WalletWebhookIdempotency(models.Model):
+    _name = 'wallet.webhook.idempotency'
+    _description = 'Webhook Idempotency Key'
+    _order = 'id desc'
+
+    provider = fields.Char(string='Provider', required=True)
+    event_key = fields.Char(string='Event Key', required=True, help='Provider event id, or tx_ref when the payload has none')
+    response = fields.Text(string='Stored Response')
+
+    # the unique index is also the lookup path of the duplicate fast path
+    _sql_constraints = [
+        ('provider_event_key_uniq', 'unique(provider, event_key)', 'This provider event was already received.'),
+    ]
+
+    @api.model
+    def _event_key(self, data, tx_ref=None):
+        inner = data.get('data') or {}
+        event_id = inner.get('id') or data.get('id')
+        return str(event_id) if event_id else tx_ref
+
+    @api.model
+    def _lookup(self, provider, event_key):
+        """Return the stored response of a known event (``{}`` while the first delivery is in flight), else None.
+
+        One read on the unique index; nothing is written.
+        """
+        self.env.cr.execute("""
+            SELECT response FROM wallet_webhook_idempotency
+             WHERE provider = %s AND event_key = %s
+        """, (provider, event_key))
+        row = self.env.cr.fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]) if row[0] else {}
+
+    @api.model
+    def _claim(self, provider, event_key):
+        """Record the key; False when a concurrent delivery claimed it first."""
+        self.env.cr.execute("""
+            INSERT INTO wallet_webhook_idempotency
+                   (provider, event_key, create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))
+                ON CONFLICT (provider, event_key) DO NOTHING
+         RETURNING id
+        """, (provider, event_key, self.env.uid, self.env.uid))
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _store(self, provider, event_key, response):
+        self.env.cr.execute("""
+            UPDATE wallet_webhook_idempotency
+               SET response = %s, write_date = (now() at time zone 'UTC')
+             WHERE provider = %s AND event_key = %s
+        """, (json.dumps(response), provider, event_key))
+        return response
+
+    @api.model
+    def _run_once(self, provider, event_key, handler):
+        """Call ``handler()`` for the first delivery of an event and replay its response afterwards.
+
+        Error responses are not kept, so the provider's retry is processed again.
+        """
+        stored = self._lookup(provider, event_key)
+        if stored is not None:
+            _logger.info("Duplicate %s delivery for %s", provider, event_key)
+            metrics.outcome(provider, 'duplicate_delivery')
+            return stored or {'status': 'duplicate'}
+        # a failing handler releases the claim together with its own writes
+        with self.env.cr.savepoint():
+            if not self._claim(provider, event_key):
+                return {'status': 'duplicate'}
+            response = handler()
+            if response.get('status') != 'error':
+                return self._store(provider, event_key, response)
+        # let the provider's next delivery try again
+        self.env.cr.execute("""
+            DELETE FROM wallet_webhook_idempotency WHERE provider = %s AND event_key = %s
+        """, (provider, event_key))
+        return response
+
+    @api.autovacuum
+    def _gc_keys(self):
+        """Forget keys older than the provider's redelivery window."""
+        self.env.cr.execute("""
+            DELETE FROM wallet_webhook_idempotency
+             WHERE create_date < (now() at time zone 'UTC') - make_interval(days => %s)
+        """, (IDEMPOTENCY_RETENTION_DAYS,))
@@ -0,0 +1,123 @@
+"""In-process metrics for the wallet payment flow, rendered in the Prometheus text format.
+
+Pure Python and thread-safe. Every Odoo worker process keeps its own values,
+so scrape each worker (or sum them), like any multi-process exporter.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers an indexed lookup up to a slow provider round trip
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL queries per request
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in items)
+
+
+class Counter(object):
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_labels_key(labels), 0)
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s counter' % self.name]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append('%s%s %s' % (self.name, _format_labels(key), value))
+        return lines
+
+
+class Histogram(object):
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self._series.get(_labels_key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    lines.append('%s_bucket%s %s' % (self.name, _format_labels(key, [('le', bound)]), cumulative))
+                lines.append('%s_sum%s %s' % (self.name, _format_labels(key), series[-1]))
+                lines.append('%s_count%s %s' % (self.name, _format_labels(key), cumulative))
+        return lines
+
+
+def render_values(name, documentation, values, kind='gauge'):
+    """Lines for values computed at scrape time; ``values`` maps label pairs (a tuple) to a number."""
+    lines = ['# HELP %s %s' % (name, documentation), '# TYPE %s %s' % (name, kind)]
+    for key, value in sorted(values.items()):
+        lines.append('%s%s %s' % (name, _format_labels(key), value))
+    return lines
+
+
+STAGE_SECONDS = Histogram('wallet_stage_duration_seconds', 'Time spent per payment-flow stage.')
+REQUEST_SECONDS = Histogram('wallet_request_duration_seconds', 'Wallet HTTP request latency per route.')
+REQUEST_QUERIES = Histogram('wallet_request_sql_queries', 'SQL queries issued per wallet HTTP request.', QUERY_BUCKETS)
+OUTCOMES = Counter('wallet_outcomes_total', 'Payment-flow outcomes per source.')
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, REQUEST_QUERIES, OUTCOMES]
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the enclosed block under ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def outcome(source, name):
+    OUTCOMES.inc(source=source, outcome=name)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return lines
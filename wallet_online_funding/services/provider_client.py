@@ -0,0 +1,186 @@
+"""Shared HTTP client for payment-provider API calls.
+
+One client per provider and per worker process keeps a kept-alive connection
+pool, applies short connect/read timeouts, trips a circuit breaker when the
+provider degrades and caches successful verifications for a short time so
+redelivered webhooks do not verify twice.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailable(Exception):
+    """No definitive answer: the provider could not be reached, the circuit is open
+    or our credentials were refused; try again later."""
+
+
+class CircuitBreaker(object):
+    """Opens after ``failure_threshold`` consecutive failures and lets a single
+    probe call through once ``reset_timeout`` seconds have passed."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def end_probe(self):
+        """Let the next half-open probe through, whatever became of this one."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class TTLCache(object):
+    """Small bounded cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, size=2048, ttl=120.0):
+        self.size = size
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.size:
+                # drop the entry closest to expiry
+                del self._data[min(self._data, key=lambda k: self._data[k][1])]
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ProviderClient(object):
+
+    def __init__(self, base_url, connect_timeout=2.0, read_timeout=5.0, pool_size=16,
+                 failure_threshold=5, reset_timeout=30.0, cache_ttl=120.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.cache = TTLCache(ttl=cache_ttl)
+
+    def get_json(self, path, params=None, headers=None):
+        """GET ``path`` and return the decoded JSON body, or raise ProviderUnavailable."""
+        if not self.breaker.allow():
+            raise ProviderUnavailable('Circuit open for %s' % self.base_url)
+        try:
+            r = self.session.get(self.base_url + path, params=params, headers=headers, timeout=self.timeout)
+            if r.status_code >= 500 or r.status_code == 429:
+                raise ProviderUnavailable('%s answered HTTP %s' % (self.base_url, r.status_code))
+            refused = r.status_code in (401, 403)
+            body = None if refused else r.json()
+        except (requests.RequestException, ValueError, ProviderUnavailable) as e:
+            self.breaker.record_failure()
+            if isinstance(e, ProviderUnavailable):
+                raise
+            raise ProviderUnavailable(str(e)) from e
+        finally:
+            # an unexpected error must not leave the breaker waiting for a probe that never reports
+            self.breaker.end_probe()
+        self.breaker.record_success()
+        if refused:
+            # a bad or rotated key is not a "no" from the provider, and the provider itself is up
+            raise ProviderUnavailable('%s refused the credentials (HTTP %s)' % (self.base_url, r.status_code))
+        return body
+
+    def verify_flutterwave(self, tx_ref, secret_key):
+        """Return True/False for a Flutterwave reference.
+
+        Only successful verifications are cached, keyed by the merchant key as
+        well as ``tx_ref`` (the client is shared by every account and database
+        of the process). A "no" is asked again next time.
+        """
+        key = (hashlib.sha256((secret_key or '').encode()).hexdigest(), tx_ref)
+        if self.cache.get(key):
+            return True
+        body = self.get_json(
+            '/v3/transactions/verify_by_reference',
+            params={'tx_ref': tx_ref},
+            headers={'Authorization': f'Bearer {secret_key}'},
+        )
+        verified = bool(body.get('status') == 'success' and body.get('data'))
+        if verified:
+            self.cache.set(key, True)
+        return verified
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, base_url, **options):
+    """Return the process-wide client for ``name``, rebuilding it when its settings change.
+
+    Clients are keyed by pid as well: prefork workers must not share the
+    parent's sockets.
+    """
+    key = (os.getpid(), name)
+    signature = (base_url, tuple(sorted(options.items())))
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry and entry[0] == signature:
+            return entry[1]
+        if entry:
+            entry[1].close()
+        client = ProviderClient(base_url, **options)
+        _clients[key] = (signature, client)
+        return client
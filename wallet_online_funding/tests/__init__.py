@@ -0,0 +1,15 @@
+from . import test_wallet_transaction
+from . import test_webhook_event
+from . import test_apply_funding_concurrency
+from . import test_partner_resolver
+from . import test_wallet_reconciliation
+from . import test_wallet_notification
+from . import test_provider_account
+from . import test_provider_client
+from . import test_webhook_idempotency
+from . import test_recovery_poller
+from . import test_wallet_archive
+from . import test_wallet_rollup
+from . import test_metrics
+from . import test_wallet_balance_audit
+from . import test_wallet_bulk_job
@@ -0,0 +1,80 @@
+from odoo.tests.common import TransactionCase, tagged
+from odoo import api, SUPERUSER_ID
+from odoo.sql_db import db_connect
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+WORKERS = 32
+TRANSACTIONS = 300
+DELIVERIES_PER_TX = 2
+AMOUNT = 10.0
+
+
+@tagged('-standard', '-at_install', 'post_install', 'wallet_stress')
+class TestApplyFundingConcurrency(TransactionCase):
+    """Stress harness for ``_apply_funding``. Run on demand with ``--test-tags wallet_stress``.
+
+    Fixtures are committed through a separate connection (the test cursor is
+    never committed), then every transaction is applied ``DELIVERIES_PER_TX``
+    times from parallel cursors, as redelivered webhooks would.
+    """
+
+    def setUp(self):
+        super(TestApplyFundingConcurrency, self).setUp()
+        self.db = db_connect(self.env.cr.dbname)
+        with self.db.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.partner_id = env['res.partner'].create({
+                'name': 'Stress Wallet User',
+                'wallet_balance': 0.0,
+            }).id
+            self.tx_ids = env['wallet.transaction'].create([{
+                'partner_id': self.partner_id,
+                'amount': AMOUNT,
+                'tx_type': 'fund',
+                'status': 'done',
+                'reference': 'STRESS_%05d' % i,
+            } for i in range(TRANSACTIONS)]).ids
+            cr.commit()
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with self.db.cursor() as cr:
+            cr.execute("DELETE FROM wallet_transaction WHERE id IN %s", (tuple(self.tx_ids),))
+            cr.execute("DELETE FROM res_partner WHERE id = %s", (self.partner_id,))
+            cr.commit()
+
+    def _apply(self, tx_id):
+        with self.db.cursor() as cr:
+            # the statement is atomic, so read committed is enough and no serialization retry is needed
+            cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            applied = env['wallet.transaction'].browse(tx_id)._apply_funding()
+            cr.commit()
+            return len(applied)
+
+    def test_parallel_apply_same_partner(self):
+        """Hundreds of parallel applications on one partner keep the balance exact."""
+        jobs = [tx_id for tx_id in self.tx_ids for _i in range(DELIVERIES_PER_TX)]
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            applied = sum(pool.map(self._apply, jobs))
+        elapsed = time.monotonic() - start
+
+        with self.db.cursor() as cr:
+            cr.execute("SELECT wallet_balance FROM res_partner WHERE id = %s", (self.partner_id,))
+            balance = cr.fetchone()[0]
+            cr.execute("SELECT count(*) FROM wallet_transaction WHERE id IN %s AND is_applied", (tuple(self.tx_ids),))
+            applied_rows = cr.fetchone()[0]
+
+        _logger.info(
+            "apply_funding stress: %s calls, %s workers, %.2fs, %.0f calls/s",
+            len(jobs), WORKERS, elapsed, len(jobs) / elapsed if elapsed else 0,
+        )
+        self.assertEqual(applied, TRANSACTIONS, "Each transaction must be applied exactly once")
+        self.assertEqual(applied_rows, TRANSACTIONS)
+        self.assertAlmostEqual(balance, TRANSACTIONS * AMOUNT, 2, "Concurrent applies lost or duplicated a credit")
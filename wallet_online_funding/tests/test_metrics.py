@@ -0,0 +1,37 @@
+from odoo.tests.common import BaseCase
+
+from ..services.metrics import Counter, Histogram, render_values
+
+
+class TestMetrics(BaseCase):
+
+    def test_01_histogram_buckets_are_cumulative(self):
+        """Test observations land in the first bucket whose bound is not below them, rendered cumulatively."""
+        histogram = Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, stage='apply')
+
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="apply",le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="apply",le="1.0"} 3', lines)
+        self.assertIn('test_seconds_bucket{stage="apply",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{stage="apply"} 4', lines)
+        self.assertEqual(histogram.count(stage='apply'), 4)
+
+    def test_02_counter_labels(self):
+        """Test counters keep one series per label set and escape label values."""
+        counter = Counter('test_total', 'Test counter.')
+        counter.inc(source='webhook', outcome='success')
+        counter.inc(2, source='webhook', outcome='success')
+        counter.inc(source='webhook', outcome='say "hi"')
+
+        self.assertEqual(counter.value(source='webhook', outcome='success'), 3)
+        lines = counter.render()
+        self.assertIn('# TYPE test_total counter', lines)
+        self.assertIn('test_total{outcome="success",source="webhook"} 3', lines)
+        self.assertIn('test_total{outcome="say \\"hi\\"",source="webhook"} 1', lines)
+
+    def test_03_scrape_time_values(self):
+        """Test values computed at scrape time render with their type."""
+        lines = render_values('test_depth', 'Test gauge.', {(('queue', 'events'),): 7})
+        self.assertEqual(lines, ['# HELP test_depth Test gauge.', '# TYPE test_depth gauge', 'test_depth{queue="events"} 7'])
@@ -0,0 +1,53 @@
+from odoo.tests.common import TransactionCase
+
+from ..models.wallet_partner_resolver import normalize_email, normalize_phone
+
+
+class TestPartnerResolver(TransactionCase):
+
+    def setUp(self):
+        super(TestPartnerResolver, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.default_phone_country_code', '234')
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Resolver User',
+            'email': ' Resolver.User@Example.com ',
+            'phone': '0803 123 4567',
+        })
+        self.Resolver = self.env['wallet.partner.resolver']
+
+    def test_01_normalization(self):
+        """Test lookup keys are lower-cased emails and E.164 phones."""
+        self.assertEqual(normalize_email('  A@B.Com '), 'a@b.com')
+        self.assertFalse(normalize_email(''))
+        for raw in ('08031234567', '+234 803 123 4567', '2348031234567', '002348031234567', '(0803) 123-4567'):
+            self.assertEqual(normalize_phone(raw), '+2348031234567', raw)
+        self.assertFalse(normalize_phone('n/a'))
+        self.assertEqual(self.test_partner.wallet_email_key, 'resolver.user@example.com')
+        self.assertEqual(self.test_partner.wallet_phone_key, '+2348031234567')
+
+    def test_02_resolve_by_email_then_phone(self):
+        """Test partners are found whatever the input formatting."""
+        self.assertEqual(self.Resolver._resolve(email='RESOLVER.USER@example.com'), self.test_partner)
+        self.assertEqual(self.Resolver._resolve(phone='+234 (803) 123-4567'), self.test_partner)
+        self.assertEqual(self.Resolver._resolve(email='unknown@example.com', phone='08031234567'), self.test_partner)
+        self.assertFalse(self.Resolver._resolve(email='unknown@example.com'))
+        self.assertFalse(self.Resolver._resolve())
+
+    def test_03_cache_follows_partner_changes(self):
+        """Test a cached hit is dropped when the partner's email changes."""
+        self.assertEqual(self.Resolver._resolve(email='resolver.user@example.com'), self.test_partner)
+        self.test_partner.write({'email': 'renamed@example.com'})
+        self.assertFalse(self.Resolver._resolve(email='resolver.user@example.com'))
+        self.assertEqual(self.Resolver._resolve(email='Renamed@Example.com'), self.test_partner)
+
+    def test_04_cache_checks_key_changed_elsewhere(self):
+        """Test a cached hit is not trusted once another worker changed the partner's email."""
+        self.assertEqual(self.Resolver._resolve(email='resolver.user@example.com'), self.test_partner)
+        # another worker's write: the stored key moves without touching this worker's cache
+        self.env.cr.execute("UPDATE res_partner SET email = %s, wallet_email_key = %s WHERE id = %s",
+                            ('moved@example.com', 'moved@example.com', self.test_partner.id))
+        self.env['res.partner'].invalidate_model(['email', 'wallet_email_key'])
+        self.assertFalse(self.Resolver._resolve(email='resolver.user@example.com'))
+
+        other = self.env['res.partner'].create({'name': 'New Owner', 'email': 'resolver.user@example.com'})
+        self.assertEqual(self.Resolver._resolve(email='resolver.user@example.com'), other)
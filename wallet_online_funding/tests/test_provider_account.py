@@ -0,0 +1,36 @@
+from odoo.tests.common import TransactionCase
+
+
+class TestProviderAccount(TransactionCase):
+
+    def setUp(self):
+        super(TestProviderAccount, self).setUp()
+        self.Account = self.env['wallet.provider.account']
+        self.Account.search([]).unlink()
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.flw_secret_key', 'LEGACY_KEY')
+
+    def test_01_legacy_parameters_fallback(self):
+        """Test the default Flutterwave config falls back to the legacy system parameters."""
+        config = self.Account._get_config('flutterwave')
+        self.assertEqual(config['secret_key'], 'LEGACY_KEY')
+        self.assertFalse(config['account_id'])
+        self.assertFalse(self.Account._get_config('paystack'))
+
+    def test_02_hot_reads_are_cached_and_writes_invalidate(self):
+        """Test cached reads issue no SQL and key rotation is visible without restart."""
+        account = self.Account.create({
+            'name': 'Main', 'code': 'main', 'provider': 'flutterwave', 'secret_key': 'KEY_1',
+        })
+        self.Account.create({
+            'name': 'Fleet', 'code': 'fleet', 'provider': 'flutterwave', 'sequence': 20, 'secret_key': 'KEY_FLEET',
+        })
+        self.assertEqual(self.Account._get_config('flutterwave')['secret_key'], 'KEY_1')
+        self.assertEqual(self.Account._get_config('flutterwave', 'fleet')['secret_key'], 'KEY_FLEET')
+
+        with self.assertQueryCount(0):
+            self.Account._get_config('flutterwave')
+            self.Account._get_config('flutterwave', 'fleet')
+
+        account.write({'secret_key': 'KEY_2'})
+        self.assertEqual(self.Account._get_config('flutterwave')['secret_key'], 'KEY_2')
+        self.assertFalse(self.Account._get_config('flutterwave', 'unknown'))
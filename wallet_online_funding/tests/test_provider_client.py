@@ -0,0 +1,73 @@
+from odoo.tests.common import BaseCase
+from unittest.mock import patch
+
+from ..benchmarks.provider_stub import FlutterwaveStub
+from ..services.provider_client import ProviderClient, ProviderUnavailable
+
+
+class TestProviderClient(BaseCase):
+
+    def setUp(self):
+        super(TestProviderClient, self).setUp()
+        self.server = FlutterwaveStub().start()
+        self.addCleanup(self.server.stop)
+        self.client = ProviderClient(self.server.base_url,
+                                     connect_timeout=1, read_timeout=1,
+                                     failure_threshold=2, reset_timeout=60)
+        self.addCleanup(self.client.close)
+
+    def test_01_verification_is_cached(self):
+        """Test a retried webhook does not verify the same tx_ref twice."""
+        self.assertTrue(self.client.verify_flutterwave('TX_1', 'KEY'))
+        self.assertTrue(self.client.verify_flutterwave('TX_1', 'KEY'))
+        self.assertEqual(self.server.hits, 1)
+
+    def test_02_circuit_opens_and_fails_fast(self):
+        """Test the breaker stops calling a degraded provider."""
+        self.server.fail = True
+        for _i in range(2):
+            with self.assertRaises(ProviderUnavailable):
+                self.client.verify_flutterwave('TX_2', 'KEY')
+        self.assertEqual(self.client.breaker.state, 'open')
+
+        with self.assertRaises(ProviderUnavailable):
+            self.client.verify_flutterwave('TX_3', 'KEY')
+        self.assertEqual(self.server.hits, 2, "An open circuit must not reach the provider")
+
+    def test_03_half_open_probe_closes_circuit(self):
+        """Test one successful probe after the reset timeout closes the breaker."""
+        self.server.fail = True
+        for _i in range(2):
+            with self.assertRaises(ProviderUnavailable):
+                self.client.verify_flutterwave('TX_4', 'KEY')
+        self.server.fail = False
+        self.client.breaker.reset_timeout = 0
+        self.assertTrue(self.client.verify_flutterwave('TX_4', 'KEY'))
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_04_only_successes_are_cached_per_key(self):
+        """Test a declined reference is asked again and cached answers do not cross merchant keys."""
+        self.server.declined.add('TX_5')
+        self.assertFalse(self.client.verify_flutterwave('TX_5', 'KEY'))
+        self.server.declined.discard('TX_5')
+        self.assertTrue(self.client.verify_flutterwave('TX_5', 'KEY'))
+
+        self.server.secret_key = 'KEY'
+        with self.assertRaises(ProviderUnavailable):
+            self.client.verify_flutterwave('TX_5', 'ROTATED')
+        self.assertEqual(self.client.breaker.state, 'closed', "Refused credentials must not trip the breaker")
+        self.assertEqual(self.server.hits, 3)
+
+    def test_05_unexpected_error_ends_probe(self):
+        """Test an unexpected error during the half-open probe lets the next probe through."""
+        self.server.fail = True
+        for _i in range(2):
+            with self.assertRaises(ProviderUnavailable):
+                self.client.verify_flutterwave('TX_6', 'KEY')
+        self.server.fail = False
+        self.client.breaker.reset_timeout = 0
+        with patch.object(self.client.session, 'get', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.client.verify_flutterwave('TX_6', 'KEY')
+        self.assertTrue(self.client.verify_flutterwave('TX_6', 'KEY'))
+        self.assertEqual(self.client.breaker.state, 'closed')
@@ -0,0 +1,128 @@
+from odoo.tests.common import TransactionCase
+from odoo import fields
+from datetime import timedelta
+from unittest.mock import patch
+
+from ..services.provider_client import ProviderUnavailable
+
+
+class FakeBreaker(object):
+    state = 'closed'
+
+
+class FakeClient(object):
+    """Answers verification calls from a dict of tx_ref -> True/False/ProviderUnavailable."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+        self.secret_keys = set()
+        self.breaker = FakeBreaker()
+
+    def verify_flutterwave(self, tx_ref, secret_key):
+        self.calls.append(tx_ref)
+        self.secret_keys.add(secret_key)
+        answer = self.answers.get(tx_ref, False)
+        if answer is ProviderUnavailable:
+            raise ProviderUnavailable('stub down')
+        return answer
+
+
+class TestRecoveryPoller(TransactionCase):
+
+    def setUp(self):
+        super(TestRecoveryPoller, self).setUp()
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Test Poller User',
+            'email': 'poller@example.com',
+            'wallet_balance': 100.00,
+        })
+        self.account = self.env['wallet.provider.account'].create({
+            'name': 'Poller Account',
+            'code': 'poller',
+            'provider': 'flutterwave',
+            'sequence': 0,
+            'secret_key': 'FLWSECK_TEST',
+        })
+        self.Tx = self.env['wallet.transaction']
+
+    def _create_tx(self, reference, amount, age_minutes=60, account=None):
+        return self.Tx.create({
+            'partner_id': self.test_partner.id,
+            'amount': amount,
+            'tx_type': 'fund',
+            'provider': 'flutterwave',
+            'provider_account_id': account.id if account else False,
+            'status': 'pending',
+            'reference': reference,
+            'date': fields.Datetime.now() - timedelta(minutes=age_minutes),
+        })
+
+    def _run(self, client, clients=None, **kwargs):
+        """``clients`` maps account codes to their own fake client; other accounts use ``client``."""
+        Account = type(self.env['wallet.provider.account'])
+        clients = clients or {}
+        with patch.object(Account, '_http_client', lambda self, provider, code=None: clients.get(code, client)):
+            return self.Tx._cron_recover_pending(**kwargs)
+
+    def test_01_paid_transactions_are_applied(self):
+        """Test verified stale transactions are finalized and credited once."""
+        paid = self._create_tx('TEST_POLL_001', 30.00)
+        unpaid = self._create_tx('TEST_POLL_002', 20.00)
+        client = FakeClient({'TEST_POLL_001': True})
+
+        stats = self._run(client, batch_size=10, concurrency=4)
+
+        self.assertEqual(stats['checked'], 2)
+        self.assertEqual(stats['applied'], 1)
+        self.assertEqual(paid.status, 'done')
+        self.assertTrue(paid.is_applied)
+        self.assertEqual(unpaid.status, 'pending', "Unconfirmed payments stay pending")
+        self.assertTrue(unpaid.last_polled_at)
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 130.00, 2)
+
+    def test_02_recent_and_recently_polled_are_skipped(self):
+        """Test fresh transactions and ones polled within the recheck window are left alone."""
+        self._create_tx('TEST_POLL_003', 10.00, age_minutes=1)
+        polled = self._create_tx('TEST_POLL_004', 10.00)
+        polled.last_polled_at = fields.Datetime.now()
+        client = FakeClient({})
+
+        stats = self._run(client)
+
+        self.assertEqual(stats['checked'], 0)
+        self.assertEqual(client.calls, [])
+
+    def test_03_provider_outage_keeps_transaction_pending(self):
+        """Test an unavailable provider neither fails nor credits the transaction."""
+        tx = self._create_tx('TEST_POLL_005', 15.00)
+        client = FakeClient({'TEST_POLL_005': ProviderUnavailable})
+
+        stats = self._run(client)
+
+        self.assertEqual(stats['unavailable'], 1)
+        self.assertEqual(tx.status, 'pending')
+        self.assertFalse(tx.is_applied)
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 100.00, 2)
+
+    def test_04_each_account_is_polled_with_its_own_key(self):
+        """Test pending rows of a non-default account are verified with that account's key and client."""
+        second = self.env['wallet.provider.account'].create({
+            'name': 'Second Account',
+            'code': 'poller_second',
+            'provider': 'flutterwave',
+            'sequence': 5,
+            'secret_key': 'FLWSECK_SECOND',
+        })
+        default_tx = self._create_tx('TEST_POLL_006', 10.00)
+        second_tx = self._create_tx('TEST_POLL_007', 25.00, account=second)
+        default_client = FakeClient({'TEST_POLL_006': True})
+        second_client = FakeClient({'TEST_POLL_007': True})
+
+        stats = self._run(default_client, clients={'poller_second': second_client})
+
+        self.assertEqual(stats['applied'], 2)
+        self.assertEqual((default_client.calls, default_client.secret_keys), (['TEST_POLL_006'], {'FLWSECK_TEST'}))
+        self.assertEqual((second_client.calls, second_client.secret_keys), (['TEST_POLL_007'], {'FLWSECK_SECOND'}))
+        self.assertTrue(default_tx.is_applied and second_tx.is_applied)
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 135.00, 2)
@@ -0,0 +1,87 @@
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import ValidationError
+from odoo import fields
+from datetime import timedelta
+
+
+class TestWalletArchive(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletArchive, self).setUp()
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Test Archive User',
+            'email': 'archive@example.com',
+            'wallet_balance': 100.00,
+        })
+        self.Tx = self.env['wallet.transaction']
+
+    def _create_tx(self, reference, status, days_old, is_applied=False):
+        tx = self.Tx.create({
+            'partner_id': self.test_partner.id,
+            'amount': 10.00,
+            'tx_type': 'fund',
+            'status': status,
+            'reference': reference,
+            'date': fields.Datetime.now() - timedelta(days=days_old),
+        })
+        if is_applied:
+            # is_applied is readonly and only ever set by _apply_funding
+            tx.flush_recordset()
+            self.env.cr.execute("UPDATE wallet_transaction SET is_applied = TRUE WHERE id = %s", (tx.id,))
+            tx.invalidate_recordset(['is_applied'])
+        return tx
+
+    def test_01_expire_stale_pending(self):
+        """Test only pending transactions past the age limit are expired, across several batches."""
+        stale = self._create_tx('TEST_ARC_001', 'pending', 5) | self._create_tx('TEST_ARC_002', 'pending', 4) \
+            | self._create_tx('TEST_ARC_003', 'pending', 10)
+        fresh = self._create_tx('TEST_ARC_004', 'pending', 0)
+
+        expired = self.Tx._expire_pending(max_age_hours=72, batch_size=2)
+
+        self.assertEqual(expired, 3)
+        self.assertEqual(set(stale.mapped('status')), {'failed'})
+        self.assertIn('Expired', stale[0].note)
+        self.assertEqual(fresh.status, 'pending')
+
+    def test_02_archive_moves_finished_rows_only(self):
+        """Test finished rows move to the archive and stay readable through the history view."""
+        applied = self._create_tx('TEST_ARC_010', 'done', 400, is_applied=True)
+        failed = self._create_tx('TEST_ARC_011', 'failed', 400)
+        unapplied = self._create_tx('TEST_ARC_012', 'done', 400)
+        recent = self._create_tx('TEST_ARC_013', 'failed', 10)
+        moved_ids = (applied | failed).ids
+
+        archived = self.Tx._archive_finished(retention_days=365, batch_size=1)
+
+        self.assertEqual(archived, 2)
+        self.assertFalse(self.Tx.browse(moved_ids).exists())
+        self.assertTrue(unapplied.exists(), "Unapplied confirmed rows are kept for the backlog replay")
+        self.assertTrue(recent.exists())
+
+        archive = self.env['wallet.transaction.archive'].search([('origin_id', 'in', moved_ids)])
+        self.assertEqual(sorted(archive.mapped('reference')), ['TEST_ARC_010', 'TEST_ARC_011'])
+
+        history = self.env['wallet.transaction.history'].search([('partner_id', '=', self.test_partner.id)])
+        self.assertEqual(len(history), 4)
+        self.assertEqual(sorted(history.filtered('archived').ids), sorted(moved_ids))
+
+    def test_03_archived_reference_stays_taken(self):
+        """Test a replayed callback for an archived reference credits nothing and the reference cannot be reused."""
+        self._create_tx('TEST_ARC_020', 'done', 400, is_applied=True)
+        self.Tx._archive_finished(retention_days=365)
+        self.env.invalidate_all()
+
+        tx = self.Tx._fund_from_callback(self.test_partner, 10.00, 'TEST_ARC_020')
+        self.assertFalse(tx)
+        self.assertFalse(self.Tx.search([('reference', '=', 'TEST_ARC_020')]))
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 100.00, 2)
+
+        with self.assertRaises(ValidationError):
+            self._create_tx('TEST_ARC_020', 'pending', 0)
+
+        event = self.env['wallet.webhook.event']._enqueue(
+            'flutterwave', {'tx_ref': 'TEST_ARC_020', 'status': 'successful', 'amount': 10.00})
+        event._process()
+        self.assertEqual(event.state, 'done')
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 100.00, 2)
@@ -0,0 +1,107 @@
+from odoo.tests.common import TransactionCase
+
+
+class TestWalletBalanceAudit(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletBalanceAudit, self).setUp()
+        Partner = self.env['res.partner']
+        self.partner_ok = Partner.create({'name': 'Audit OK', 'email': 'audit.ok@example.com'})
+        self.partner_drift = Partner.create({'name': 'Audit Drift', 'email': 'audit.drift@example.com'})
+        self.partner_late = Partner.create({'name': 'Audit Late', 'email': 'audit.late@example.com'})
+        for partner, amount in ((self.partner_ok, 100.00), (self.partner_drift, 40.00), (self.partner_late, 25.00)):
+            self.env['wallet.transaction'].create({
+                'partner_id': partner.id,
+                'amount': amount,
+                'tx_type': 'fund',
+                'provider': 'test_audit',
+                'status': 'done',
+                'reference': 'TEST_AUDIT_%s' % partner.id,
+            })._apply_funding()
+        # balances changed outside the ledger
+        self.partner_drift.wallet_balance = 55.00
+        self.partner_late.wallet_balance = 0.00
+
+    def _audit(self, **vals):
+        return self.env['wallet.balance.audit'].create(dict({'name': 'Test audit', 'chunk_size': 50, 'workers': 1}, **vals))
+
+    def _drifted(self, audit):
+        return {line.partner_id: (line.stored_balance, line.expected_balance, line.repaired)
+                for line in audit.line_ids if line.partner_id in (self.partner_ok | self.partner_drift | self.partner_late)}
+
+    def test_01_report_without_repair(self):
+        """Test drifting balances are reported and left untouched when repair is off."""
+        audit = self._audit()
+        audit.action_run()
+
+        self.assertEqual(audit.state, 'done')
+        self.assertEqual(audit.checkpoint_partner_id, audit.last_partner_id)
+        self.assertEqual(self._drifted(audit), {
+            self.partner_drift: (55.00, 40.00, False),
+            self.partner_late: (0.00, 25.00, False),
+        })
+        self.assertAlmostEqual(self.partner_drift.wallet_balance, 55.00, 2)
+
+    def test_02_repair(self):
+        """Test repair resets drifting balances to the ledger sum and a second audit finds nothing."""
+        audit = self._audit(repair=True)
+        audit.action_run()
+
+        self.assertEqual(self._drifted(audit), {
+            self.partner_drift: (55.00, 40.00, True),
+            self.partner_late: (0.00, 25.00, True),
+        })
+        self.assertAlmostEqual(self.partner_drift.wallet_balance, 40.00, 2)
+        self.assertAlmostEqual(self.partner_late.wallet_balance, 25.00, 2)
+        self.assertAlmostEqual(self.partner_ok.wallet_balance, 100.00, 2)
+
+        again = self._audit()
+        again.action_run()
+        self.assertFalse(self._drifted(again))
+
+    def test_03_resume_from_checkpoint(self):
+        """Test a paused audit stays running and resumes after its checkpoint."""
+        audit = self._audit()
+        self.assertFalse(audit._run(time_budget=0))
+        self.assertEqual(audit.state, 'running')
+        self.assertEqual(audit.checkpoint_partner_id, 0)
+
+        # as if an earlier run had already covered everything up to the drifting partner
+        audit.checkpoint_partner_id = self.partner_drift.id
+        self.assertTrue(audit._run())
+        self.assertEqual(self._drifted(audit), {self.partner_late: (0.00, 25.00, False)})
+
+    def test_04_callback_credit_is_ledger_backed(self):
+        """Test a callback-credited partner has no drift and keeps the credit through a repair run."""
+        partner = self.env['res.partner'].create({'name': 'Audit Callback', 'email': 'audit.callback@example.com'})
+        Tx = self.env['wallet.transaction']
+        tx = Tx._fund_from_callback(partner, 30.00, 'TEST_AUDIT_CALLBACK')
+        self.assertEqual(Tx._fund_from_callback(partner, 30.00, 'TEST_AUDIT_CALLBACK'), tx, "Replayed callback added a row")
+        self.assertTrue(tx.is_applied)
+        self.assertAlmostEqual(partner.wallet_balance, 30.00, 2)
+
+        audit = self._audit(repair=True)
+        audit.action_run()
+        self.assertNotIn(partner, audit.line_ids.partner_id)
+        self.assertAlmostEqual(partner.wallet_balance, 30.00, 2)
+
+    def test_05_carwash_ledger_rows_count(self):
+        """Test carwash_wallet credits and debits are part of the expected balance and survive a repair run."""
+        partner = self.env['res.partner'].create({'name': 'Audit Carwash', 'email': 'audit.carwash@example.com'})
+        if not hasattr(partner, '_post_wallet_entry'):
+            self.skipTest('carwash_wallet is not installed')
+        partner._post_wallet_entry('credit', 50.00, 'TEST_AUDIT_CW_1', 'Top-up')
+        partner._post_wallet_entry('debit', 20.00, 'TEST_AUDIT_CW_2', 'Wash')
+        self.assertAlmostEqual(partner.wallet_balance, 30.00, 2)
+
+        audit = self._audit(repair=True)
+        audit.action_run()
+        self.assertNotIn(partner, audit.line_ids.partner_id)
+        self.assertAlmostEqual(partner.wallet_balance, 30.00, 2)
+
+        partner.wallet_balance = 45.00
+        again = self._audit(repair=True)
+        again.action_run()
+        line = again.line_ids.filtered(lambda l: l.partner_id == partner)
+        self.assertAlmostEqual(line.expected_balance, 30.00, 2)
+        self.assertAlmostEqual(partner.wallet_balance, 30.00, 2)
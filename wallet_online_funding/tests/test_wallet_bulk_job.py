@@ -0,0 +1,168 @@
+from odoo.tests.common import HttpCase, TransactionCase, tagged
+import json
+
+
+class TestWalletBulkJob(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletBulkJob, self).setUp()
+        Partner = self.env['res.partner']
+        self.partner_a = Partner.create({'name': 'Bulk A', 'email': 'bulk.a@example.com'})
+        self.partner_b = Partner.create({'name': 'Bulk B', 'email': 'Bulk.B@Example.com'})
+        self.env['wallet.transaction'].create({
+            'partner_id': self.partner_a.id,
+            'amount': 50.00,
+            'tx_type': 'fund',
+            'provider': 'test_bulk',
+            'status': 'done',
+            'reference': 'TEST_BULK_EXISTING',
+        })._apply_funding()
+
+    def _job(self, rows, **vals):
+        job = self.env['wallet.bulk.job'].create(dict({'name': 'Test batch', 'source': 'api'}, **vals))
+        job._load_rows(rows)
+        return job
+
+    def _results(self, job):
+        return {line.reference: (line.state, line.message) for line in job.line_ids}
+
+    def test_01_validation(self):
+        """Test rows are checked for amount, type, customer and duplicate references before posting."""
+        job = self._job([
+            {'partner_id': self.partner_a.id, 'amount': '10', 'type': 'credit', 'reference': 'B-1'},
+            {'email': ' bulk.b@example.com', 'amount': '5.50', 'type': 'debit', 'reference': 'B-2'},
+            {'partner_id': self.partner_a.id, 'amount': 'ten', 'type': 'credit', 'reference': 'B-3'},
+            {'partner_id': self.partner_a.id, 'amount': '-1', 'type': 'credit', 'reference': 'B-4'},
+            {'partner_id': self.partner_a.id, 'amount': '1', 'type': 'refund', 'reference': 'B-5'},
+            {'email': 'nobody@example.com', 'amount': '1', 'type': 'credit', 'reference': 'B-6'},
+            {'partner_id': self.partner_a.id, 'amount': '1', 'type': 'credit', 'reference': 'TEST_BULK_EXISTING'},
+            {'partner_id': self.partner_a.id, 'amount': '2', 'type': 'credit', 'reference': 'B-1'},
+            {'partner_id': self.partner_a.id, 'amount': 'nan', 'type': 'credit', 'reference': 'B-7'},
+        ])
+
+        self.assertEqual(job.state, 'validated')
+        self.assertEqual((job.row_count, job.valid_count, job.invalid_count, job.duplicate_count), (9, 2, 5, 2))
+        self.assertEqual(job.line_ids.filtered(lambda line: line.reference == 'B-2').partner_id, self.partner_b)
+        results = self._results(job)
+        self.assertEqual(results['B-3'], ('invalid', 'Amount is not a number'))
+        self.assertEqual(results['B-5'], ('invalid', 'Type must be credit or debit'))
+        self.assertEqual(results['B-6'], ('invalid', 'Unknown customer'))
+        self.assertEqual(results['TEST_BULK_EXISTING'][0], 'duplicate')
+        self.assertEqual(results['B-7'], ('invalid', 'Amount must be positive'))
+
+    def test_02_post(self):
+        """Test posting credits and debits in chunks updates balances and the ledger consistently."""
+        job = self._job([
+            {'partner_id': self.partner_a.id, 'amount': '20', 'type': 'credit', 'reference': 'P-1'},
+            {'partner_id': self.partner_a.id, 'amount': '60', 'type': 'debit', 'reference': 'P-2'},
+            {'partner_id': self.partner_b.id, 'amount': '15', 'type': 'credit', 'reference': 'P-3'},
+            {'partner_id': self.partner_b.id, 'amount': '16', 'type': 'debit', 'reference': 'P-4'},
+            {'partner_id': self.partner_b.id, 'amount': '5', 'type': 'debit', 'reference': 'P-5'},
+        ], chunk_size=2)
+        job.action_post()
+
+        self.assertEqual(job.state, 'done')
+        self.assertEqual((job.done_count, job.failed_count, job.valid_count), (4, 1, 0))
+        self.assertEqual(self._results(job)['P-4'], ('failed', 'Insufficient balance'))
+        self.assertAlmostEqual(self.partner_a.wallet_balance, 10.00, 2)
+        self.assertAlmostEqual(self.partner_b.wallet_balance, 10.00, 2)
+
+        debit = job.line_ids.filtered(lambda line: line.reference == 'P-2').transaction_id
+        self.assertEqual((debit.tx_type, debit.status, debit.is_applied), ('spend', 'done', True))
+        drift = self.env['wallet.balance.audit']._find_drift(min(self.partner_a.id, self.partner_b.id) - 1,
+                                                             max(self.partner_a.id, self.partner_b.id))
+        self.assertFalse(drift)
+
+        again = self._job([{'partner_id': self.partner_b.id, 'amount': '15', 'type': 'credit', 'reference': 'P-3'}])
+        self.assertEqual(again.duplicate_count, 1)
+
+    def test_03_resume(self):
+        """Test a job out of time budget keeps its remaining rows and the cron finishes it."""
+        job = self._job([
+            {'partner_id': self.partner_b.id, 'amount': str(i + 1), 'type': 'credit', 'reference': 'R-%s' % i}
+            for i in range(5)
+        ], chunk_size=2)
+        self.assertFalse(job._process(time_budget=0))
+        self.assertEqual((job.state, job.valid_count), ('running', 5))
+
+        self.env['wallet.bulk.job']._cron_process()
+        self.assertEqual((job.state, job.done_count), ('done', 5))
+        self.assertAlmostEqual(self.partner_b.wallet_balance, 15.00, 2)
+
+    def test_04_skipped_credit_does_not_fund_debit(self):
+        """Test a credit skipped as already posted is not counted towards a later debit of the chunk."""
+        job = self._job([
+            {'partner_id': self.partner_b.id, 'amount': '15', 'type': 'credit', 'reference': 'S-1'},
+            {'partner_id': self.partner_b.id, 'amount': '10', 'type': 'debit', 'reference': 'S-2'},
+            {'partner_id': self.partner_b.id, 'amount': '3', 'type': 'credit', 'reference': 'S-3'},
+        ])
+        # posted by another process after validation, not yet applied
+        self.env['wallet.transaction'].create({
+            'partner_id': self.partner_b.id,
+            'amount': 15.00,
+            'tx_type': 'fund',
+            'provider': 'test_bulk',
+            'status': 'pending',
+            'reference': 'S-1',
+        })
+        job.action_post()
+
+        results = self._results(job)
+        self.assertEqual(results['S-1'][0], 'duplicate')
+        self.assertEqual(results['S-2'], ('failed', 'Insufficient balance'))
+        self.assertEqual(results['S-3'][0], 'done')
+        self.assertAlmostEqual(self.partner_b.wallet_balance, 3.00, 2)
+
+
+@tagged('-at_install', 'post_install')
+class TestWalletBulkApi(HttpCase):
+
+    def setUp(self):
+        super(TestWalletBulkApi, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.bulk_api_token', 'TEST_TOKEN')
+        self.partner = self.env['res.partner'].create({'name': 'Bulk API', 'email': 'bulk.api@example.com'})
+
+    def _post(self, body, content_type='application/json', token='TEST_TOKEN'):
+        headers = {'Content-Type': content_type}
+        if token:
+            headers['Authorization'] = 'Bearer %s' % token
+        return self.url_open('/wallet/bulk/transactions', data=body, headers=headers)
+
+    def _rows(self, **payload):
+        return json.dumps(dict({'rows': [
+            {'partner_id': self.partner.id, 'amount': 25, 'type': 'credit', 'reference': 'API-1'},
+        ]}, **payload))
+
+    def test_01_token_is_required(self):
+        """Test the endpoint refuses missing and wrong tokens, and every token while none is configured."""
+        self.assertEqual(self._post(self._rows(), token=None).status_code, 403)
+        self.assertEqual(self._post(self._rows(), token='WRONG').status_code, 403)
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.bulk_api_token', False)
+        self.assertEqual(self._post(self._rows(), token='').status_code, 403)
+        self.assertFalse(self.env['wallet.transaction'].search([('partner_id', '=', self.partner.id)]))
+
+    def test_02_csv_body(self):
+        """Test a CSV body is validated and posted, with one result per row."""
+        body = ('Customer ID,Amount,Type,Ref\n'
+                '%(id)s,40,credit,CSV-1\n'
+                '%(id)s,15,debit,CSV-2\n'
+                '%(id)s,ten,credit,CSV-3\n') % {'id': self.partner.id}
+        response = self._post(body.encode(), content_type='text/csv')
+
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['state'], report['posted'], report['invalid']), ('done', 2, 1))
+        self.assertEqual([row['state'] for row in report['results']], ['done', 'done', 'invalid'])
+        self.partner.invalidate_recordset(['wallet_balance'])
+        self.assertAlmostEqual(self.partner.wallet_balance, 25.00, 2)
+
+    def test_03_dry_run_posts_nothing(self):
+        """Test a dry run returns the validation results and leaves the ledger alone."""
+        response = self._post(self._rows(dry_run=True))
+
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['state'], report['to_post'], report['posted']), ('validated', 1, 0))
+        self.assertFalse(self.env['wallet.transaction'].search([('partner_id', '=', self.partner.id)]))
+        self.partner.invalidate_recordset(['wallet_balance'])
+        self.assertFalse(self.partner.wallet_balance)
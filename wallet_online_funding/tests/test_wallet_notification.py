@@ -0,0 +1,78 @@
+from odoo.tests.common import TransactionCase
+from odoo import fields
+from datetime import timedelta
+from unittest.mock import patch
+
+from ..models.wallet_notification import FakeSmsBackend, MAX_ATTEMPTS
+
+
+class TestWalletNotification(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletNotification, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.sms_backend', 'fake')
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Outbox User',
+            'email': 'outbox@example.com',
+            'phone': '08031234567',
+            'wallet_balance': 150.00,
+        })
+        self.Notification = self.env['wallet.notification']
+        FakeSmsBackend.outbox = []
+        FakeSmsBackend.fail = False
+        self.addCleanup(setattr, FakeSmsBackend, 'fail', False)
+
+    def test_01_enqueue_funding_queues_email_and_sms(self):
+        """Test funding notifications are recorded, not sent inline."""
+        notifications = self.Notification._enqueue_funding(self.test_partner, 50.00)
+
+        self.assertEqual(sorted(notifications.mapped('channel')), ['email', 'sms'])
+        self.assertEqual(notifications.mapped('state'), ['pending', 'pending'])
+        sms = notifications.filtered(lambda n: n.channel == 'sms')
+        self.assertEqual(sms.recipient, '+2348031234567')
+        self.assertFalse(FakeSmsBackend.outbox)
+
+    def test_02_dispatch_sms_through_backend(self):
+        """Test the dispatcher drains the SMS outbox through the configured backend."""
+        notifications = self.Notification._enqueue_funding(self.test_partner, 50.00)
+        sms = notifications.filtered(lambda n: n.channel == 'sms')
+
+        sent, failed = self.Notification._dispatch_channel('sms')
+
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(sms.state, 'sent')
+        self.assertEqual(FakeSmsBackend.outbox, [('+2348031234567', sms.body)])
+
+    def test_03_rate_limit_and_retry(self):
+        """Test the per-run rate limit and the retry/dead-letter path."""
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.notification_rate_sms', '1')
+        first = self.Notification._enqueue_funding(self.test_partner, 10.00).filtered(lambda n: n.channel == 'sms')
+        second = self.Notification._enqueue_funding(self.test_partner, 20.00).filtered(lambda n: n.channel == 'sms')
+
+        FakeSmsBackend.fail = True
+        self.assertEqual(self.Notification._dispatch_channel('sms'), (0, 1))
+        self.assertEqual(first.state, 'pending')
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.next_attempt_at, fields.Datetime.now())
+        self.assertEqual(second.attempts, 0, "Rate limit allows one message per run")
+
+        first.write({'attempts': MAX_ATTEMPTS - 1, 'next_attempt_at': fields.Datetime.now() - timedelta(seconds=1)})
+        self.Notification._dispatch_channel('sms')
+        self.assertEqual(first.state, 'dead')
+
+    def test_04_mail_server_outage(self):
+        """Test an unreachable mail server backs off the emails and the SMS still go out."""
+        notifications = self.Notification._enqueue_funding(self.test_partner, 50.00)
+        email = notifications.filtered(lambda n: n.channel == 'email')
+        sms = notifications.filtered(lambda n: n.channel == 'sms')
+
+        IrMailServer = type(self.env['ir.mail_server'])
+        with patch.object(IrMailServer, 'connect', side_effect=ConnectionRefusedError('SMTP down')):
+            self.Notification._cron_dispatch()
+
+        self.assertEqual(email.state, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('SMTP down', email.last_error)
+        self.assertGreater(email.next_attempt_at, fields.Datetime.now())
+        self.assertEqual(sms.state, 'sent')
+        self.assertEqual(FakeSmsBackend.outbox, [('+2348031234567', sms.body)])
@@ -0,0 +1,119 @@
+from odoo.tests.common import TransactionCase
+from odoo.tools.misc import file_open
+from odoo import fields
+from datetime import timedelta
+import io
+
+from ..models.wallet_reconciliation import RECONCILE_BATCH_SIZE
+
+
+class TestWalletReconciliation(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletReconciliation, self).setUp()
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Reconciliation User',
+            'email': 'reconcile@example.com',
+            'wallet_balance': 0.00,
+        })
+        Tx = self.env['wallet.transaction']
+        vals = {'partner_id': self.test_partner.id, 'tx_type': 'fund', 'provider': 'flutterwave'}
+        self.tx_match = Tx.create(dict(vals, amount=1500.00, status='done', reference='TEST_REC_MATCH'))
+        self.tx_match._apply_funding()
+        self.tx_pending = Tx.create(dict(vals, amount=250.00, status='pending', reference='TEST_REC_PENDING'))
+        self.tx_mismatch = Tx.create(dict(vals, amount=200.00, status='pending', reference='TEST_REC_MISMATCH'))
+        self.tx_local_only = Tx.create(dict(vals, amount=60.00, status='done', reference='TEST_REC_LOCAL_ONLY'))
+
+    def test_01_reconcile_fixture_file(self):
+        """Test each settlement row is classified and safe matches are applied once."""
+        now = fields.Datetime.now()
+        run = self.env['wallet.reconciliation'].create({
+            'name': 'Fixture run',
+            'provider': 'flutterwave',
+            'date_from': now - timedelta(days=1),
+            'date_to': now + timedelta(days=1),
+        })
+        with file_open('wallet_online_funding/tests/fixtures/flutterwave_settlement.csv', 'rb') as stream:
+            run._reconcile_stream(stream, batch_size=2)
+
+        self.assertEqual(run.state, 'done')
+        self.assertEqual(run.rows_read, 5)
+        self.assertEqual(run.matched_count, 2)
+        self.assertEqual(run.applied_count, 1, "Only the pending match should be applied")
+        self.assertEqual(run.mismatch_count, 1)
+        self.assertEqual(run.missing_local_count, 1)
+        self.assertEqual(run.missing_provider_count, 1)
+        self.assertEqual(run.skipped_count, 1)
+
+        lines = {line.reference: line.kind for line in run.line_ids}
+        self.assertEqual(lines, {
+            'TEST_REC_MISMATCH': 'mismatch',
+            'TEST_REC_UNKNOWN': 'missing_local',
+            'TEST_REC_LOCAL_ONLY': 'missing_provider',
+        })
+        self.assertTrue(self.tx_pending.is_applied)
+        self.assertEqual(self.tx_mismatch.status, 'pending', "Mismatched amounts must not be applied")
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 1750.00, 2)
+
+    def test_02_missing_at_provider_beyond_one_batch(self):
+        """Test every unsettled local transaction is reported, not only the first batch."""
+        extra = RECONCILE_BATCH_SIZE + 5
+        self.env['wallet.transaction'].create([{
+            'partner_id': self.test_partner.id,
+            'amount': 1.00,
+            'tx_type': 'fund',
+            'provider': 'flutterwave',
+            'status': 'done',
+            'reference': 'TEST_REC_BULK_%05d' % i,
+        } for i in range(extra)])
+        now = fields.Datetime.now()
+        run = self.env['wallet.reconciliation'].create({
+            'name': 'Large run',
+            'provider': 'flutterwave',
+            'date_from': now - timedelta(days=1),
+            'date_to': now + timedelta(days=1),
+        })
+        run._reconcile_stream(io.BytesIO(b'Transaction Reference,Amount,Status\nTEST_REC_MATCH,1500.00,successful\n'))
+
+        # the extra rows plus TEST_REC_LOCAL_ONLY
+        self.assertEqual(run.missing_provider_count, extra + 1)
+        self.assertEqual(len(run.line_ids.filtered(lambda line: line.kind == 'missing_provider')), extra + 1)
+
+    def test_03_settled_but_failed_locally(self):
+        """Test a settled payment whose local row already failed is reported and applied."""
+        self.tx_pending.status = 'failed'
+        run = self.env['wallet.reconciliation'].create({'name': 'Failed run', 'provider': 'flutterwave'})
+        run._reconcile_stream(io.BytesIO(b'Transaction Reference,Amount,Status\nTEST_REC_PENDING,250.00,successful\n'))
+
+        self.assertEqual(run.settled_failed_count, 1)
+        self.assertEqual(run.line_ids.mapped('kind'), ['settled_failed'])
+        self.assertEqual(run.line_ids.transaction_id, self.tx_pending)
+        self.assertEqual(self.tx_pending.status, 'done')
+        self.assertTrue(self.tx_pending.is_applied)
+
+        run.auto_apply = False
+        self.tx_mismatch.write({'status': 'failed'})
+        run._reconcile_stream(io.BytesIO(b'Transaction Reference,Amount,Status\nTEST_REC_MISMATCH,200.00,successful\n'))
+        self.assertEqual(run.line_ids.mapped('kind'), ['settled_failed'])
+        self.assertEqual(self.tx_mismatch.status, 'failed', "Without auto-apply the row is only reported")
+
+    def test_04_reference_shared_by_two_customers(self):
+        """Test a reference used by two customers is matched by email or reported, never overwritten."""
+        other = self.env['res.partner'].create({'name': 'Other Reconciliation User', 'email': 'other@example.com'})
+        other_tx = self.env['wallet.transaction'].create({
+            'partner_id': other.id, 'amount': 70.00, 'tx_type': 'fund', 'provider': 'flutterwave',
+            'status': 'pending', 'reference': 'TEST_REC_PENDING',
+        })
+        run = self.env['wallet.reconciliation'].create({'name': 'Shared run', 'provider': 'flutterwave'})
+        run._reconcile_stream(io.BytesIO(b'Transaction Reference,Amount,Status\nTEST_REC_PENDING,70.00,successful\n'))
+        self.assertEqual(run.ambiguous_count, 1)
+        self.assertEqual(run.line_ids.mapped('kind'), ['ambiguous'])
+        self.assertFalse(other_tx.is_applied)
+        self.assertFalse(self.tx_pending.is_applied)
+
+        run._reconcile_stream(io.BytesIO(
+            b'Transaction Reference,Amount,Status,Customer Email\nTEST_REC_PENDING,70.00,successful,Other@example.com\n'))
+        self.assertEqual(run.ambiguous_count, 0)
+        self.assertEqual(run.matched_count, 1)
+        self.assertTrue(other_tx.is_applied)
+        self.assertFalse(self.tx_pending.is_applied)
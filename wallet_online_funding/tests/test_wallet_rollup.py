@@ -0,0 +1,94 @@
+from odoo.tests.common import TransactionCase
+from odoo import fields
+from datetime import timedelta
+
+
+class TestWalletRollup(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletRollup, self).setUp()
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Test Rollup User',
+            'email': 'rollup@example.com',
+        })
+        self.Rollup = self.env['wallet.daily.rollup']
+        self.today = fields.Datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def _create_tx(self, reference, amount, status, days_ago=0):
+        return self.env['wallet.transaction'].create({
+            'partner_id': self.test_partner.id,
+            'amount': amount,
+            'tx_type': 'fund',
+            'provider': 'test_rollup',
+            'status': status,
+            'reference': reference,
+            'date': self.today - timedelta(days=days_ago),
+        })
+
+    def _totals(self):
+        rows = self.Rollup.search([('provider', '=', 'test_rollup')])
+        return {(row.day, row.status): (row.tx_count, row.amount) for row in rows}
+
+    def test_01_incremental_refresh(self):
+        """Test the refresh picks up new rows and status changes since the last run."""
+        self.Rollup._rebuild()
+        self._create_tx('TEST_ROLL_001', 10.00, 'done')
+        self._create_tx('TEST_ROLL_002', 5.00, 'done')
+        pending = self._create_tx('TEST_ROLL_003', 7.00, 'pending', days_ago=1)
+
+        self.Rollup._refresh()
+        today, yesterday = self.today.date(), (self.today - timedelta(days=1)).date()
+        self.assertEqual(self._totals(), {
+            (today, 'done'): (2, 15.00),
+            (yesterday, 'pending'): (1, 7.00),
+        })
+
+        pending.status = 'done'
+        self.Rollup._refresh()
+        self.assertEqual(self._totals(), {
+            (today, 'done'): (2, 15.00),
+            (yesterday, 'done'): (1, 7.00),
+        })
+
+    def test_02_rebuild_matches_refresh(self):
+        """Test a full rebuild gives the same totals as the incremental refresh, archived rows included."""
+        self.Rollup._rebuild()
+        self._create_tx('TEST_ROLL_010', 3.00, 'failed', days_ago=2)
+        self._create_tx('TEST_ROLL_011', 4.00, 'failed', days_ago=2)
+        self.Rollup._refresh()
+        incremental = self._totals()
+
+        self.env['wallet.transaction']._archive_finished(retention_days=1)
+        self.Rollup._rebuild()
+
+        self.assertEqual(self._totals(), incremental)
+        self.assertEqual(incremental[((self.today - timedelta(days=2)).date(), 'failed')], (2, 7.00))
+
+    def _stamp(self, transaction, write_date):
+        """Give a row a write_date of its own; every row of a test shares the transaction's timestamp."""
+        transaction.flush_recordset()
+        self.env.cr.execute("UPDATE wallet_transaction SET write_date = %s WHERE id = %s", (write_date, transaction.id))
+        transaction.invalidate_recordset(['write_date'])
+
+    def test_03_refresh_from_the_high_water_mark(self):
+        """Test the refresh regroups a day written after the mark and counts a row inside the overlap once."""
+        # a mark in the future keeps the other ledger rows of the database outside the window
+        mark = fields.Datetime.now() + timedelta(days=1)
+        old = self._create_tx('TEST_ROLL_020', 2.00, 'done', days_ago=3)
+        overlap = self._create_tx('TEST_ROLL_021', 3.00, 'done', days_ago=3)
+        self.Rollup._rebuild()
+        self._stamp(old, mark - timedelta(hours=1))
+        self._stamp(overlap, mark - timedelta(minutes=3))
+        self.env.cr.execute("UPDATE wallet_daily_rollup SET source_write_date = %s", (mark,))
+        self.Rollup.invalidate_model()
+
+        late = self._create_tx('TEST_ROLL_022', 6.00, 'done', days_ago=4)
+        self._stamp(late, mark + timedelta(minutes=5))
+
+        self.assertEqual(self.Rollup._refresh(), 2, "Only the late row's day and the overlap row's day are redone")
+        three, four = (self.today - timedelta(days=3)).date(), (self.today - timedelta(days=4)).date()
+        totals = self._totals()
+        self.assertEqual(totals[(three, 'done')], (2, 5.00), "The overlap row was counted twice")
+        self.assertEqual(totals[(four, 'done')], (1, 6.00))
+        self.assertEqual(self.Rollup.search([('provider', '=', 'test_rollup'), ('day', '=', four)]).source_write_date,
+                         mark + timedelta(minutes=5))
@@ -1,4 +1,6 @@
 from odoo.tests.common import TransactionCase
+from odoo.tools import mute_logger
+from psycopg2 import IntegrityError
 
 class TestWalletTransaction(TransactionCase):
 
@@ -96,3 +98,44 @@ class TestWalletTransaction(TransactionCase):
         # The balance should remain the same as after the first application
         self.assertAlmostEqual(self.test_partner.wallet_balance, expected_balance, 2, "Balance should not change after second apply (Idempotency Check)")
         self.assertTrue(tx.is_applied, "Transaction should remain marked as applied")
+
+    def test_04_bulk_apply_groups_per_partner(self):
+        """Test bulk application credits each partner with the sum of its done transactions."""
+        other_partner = self.env['res.partner'].create({
+            'name': 'Other Wallet User',
+            'email': 'other@example.com',
+            'wallet_balance': 0.00,
+        })
+        Tx = self.env['wallet.transaction']
+        txs = Tx.create([
+            {'partner_id': self.test_partner.id, 'amount': 10.00, 'status': 'done', 'reference': 'TEST_BULK_001'},
+            {'partner_id': self.test_partner.id, 'amount': 15.00, 'status': 'done', 'reference': 'TEST_BULK_002'},
+            {'partner_id': other_partner.id, 'amount': 7.50, 'status': 'done', 'reference': 'TEST_BULK_003'},
+            {'partner_id': other_partner.id, 'amount': 99.00, 'status': 'pending', 'reference': 'TEST_BULK_004'},
+        ])
+
+        applied = txs._apply_funding_bulk(chunk_size=2)
+
+        self.assertEqual(applied, 3, "Only done transactions should be applied")
+        self.assertEqual(txs.mapped('is_applied'), [True, True, True, False])
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 125.00, 2)
+        self.assertAlmostEqual(other_partner.wallet_balance, 7.50, 2)
+
+    def test_05_bulk_apply_idempotency(self):
+        """Test bulk application never re-applies transactions already applied one by one or in bulk."""
+        Tx = self.env['wallet.transaction']
+        single = Tx.create({'partner_id': self.test_partner.id, 'amount': 20.00, 'status': 'done', 'reference': 'TEST_BULK_IDEM_001'})
+        single._apply_funding()
+        txs = single | Tx.create({'partner_id': self.test_partner.id, 'amount': 5.00, 'status': 'done', 'reference': 'TEST_BULK_IDEM_002'})
+
+        self.assertEqual(txs._apply_funding_bulk(), 1)
+        self.assertEqual(txs._apply_funding_bulk(), 0, "Second bulk run must be a no-op")
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 125.00, 2, "Bulk apply double-credited")
+
+    def test_06_reference_unique_per_partner(self):
+        """Test a reference cannot be reused for the same customer."""
+        Tx = self.env['wallet.transaction']
+        Tx.create({'partner_id': self.test_partner.id, 'amount': 10.00, 'reference': 'TEST_UNIQ_001'})
+        with self.assertRaises(IntegrityError), mute_logger('odoo.sql_db'):
+            Tx.create({'partner_id': self.test_partner.id, 'amount': 10.00, 'reference': 'TEST_UNIQ_001'})
+            Tx.flush_model()
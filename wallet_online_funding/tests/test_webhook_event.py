@@ -0,0 +1,101 @@
+from odoo.tests.common import TransactionCase
+from odoo import fields
+from datetime import timedelta
+from unittest.mock import patch
+
+from ..models.wallet_webhook_event import MAX_ATTEMPTS
+
+
+class TestWebhookEvent(TransactionCase):
+
+    def setUp(self):
+        super(TestWebhookEvent, self).setUp()
+        self.test_partner = self.env['res.partner'].create({
+            'name': 'Test Webhook User',
+            'email': 'webhook@example.com',
+            'wallet_balance': 100.00,
+        })
+        # Verification falls back to the payload status when no secret key is configured
+        self.env['ir.config_parameter'].sudo().set_param('wallet_online_funding.flw_secret_key', '')
+        self.Event = self.env['wallet.webhook.event']
+
+    def _create_tx(self, reference, amount):
+        return self.env['wallet.transaction'].create({
+            'partner_id': self.test_partner.id,
+            'amount': amount,
+            'tx_type': 'fund',
+            'status': 'pending',
+            'reference': reference,
+        })
+
+    def test_01_enqueue_does_not_touch_transaction(self):
+        """Queuing an event must not verify or apply anything."""
+        tx = self._create_tx('TEST_EVT_001', 40.00)
+        event = self.Event._enqueue('flutterwave', {'tx_ref': 'TEST_EVT_001', 'status': 'successful'}, {'verif-hash': 'secret'})
+
+        self.assertEqual(event.state, 'pending')
+        self.assertEqual(event.tx_ref, 'TEST_EVT_001')
+        self.assertNotIn('secret', event.headers, "Signature header must not be persisted")
+        self.assertEqual(tx.status, 'pending')
+        self.assertFalse(tx.is_applied)
+
+    def test_02_worker_applies_and_is_idempotent(self):
+        """Draining the queue applies funding once, even for duplicate deliveries."""
+        tx = self._create_tx('TEST_EVT_002', 25.00)
+        payload = {'data': {'tx_ref': 'TEST_EVT_002', 'status': 'successful', 'amount': 25}}
+        first = self.Event._enqueue('flutterwave', payload)
+        second = self.Event._enqueue('flutterwave', payload)
+
+        self.Event._cron_process_events(batch_size=1)
+
+        self.assertEqual((first | second).mapped('state'), ['done', 'done'])
+        self.assertEqual(tx.status, 'done')
+        self.assertTrue(tx.is_applied)
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 125.00, 2, "Duplicate event must not double-credit")
+
+    def test_03_unsuccessful_payment_fails_transaction(self):
+        """A payload that does not verify marks both event and transaction as failed."""
+        tx = self._create_tx('TEST_EVT_003', 10.00)
+        event = self.Event._enqueue('flutterwave', {'tx_ref': 'TEST_EVT_003', 'status': 'cancelled'})
+
+        self.Event._cron_process_events()
+
+        self.assertEqual(event.state, 'failed')
+        self.assertEqual(tx.status, 'failed')
+        self.assertAlmostEqual(self.test_partner.wallet_balance, 100.00, 2)
+
+    def test_04_retry_backoff_and_dead_letter(self):
+        """Transient errors are retried later and eventually dead-lettered."""
+        event = self.Event._enqueue('flutterwave', {'tx_ref': 'TEST_EVT_UNKNOWN', 'status': 'successful'})
+
+        self.Event._cron_process_events()
+        self.assertEqual(event.state, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, fields.Datetime.now())
+
+        event.write({'attempts': MAX_ATTEMPTS - 1, 'next_attempt_at': fields.Datetime.now() - timedelta(seconds=1)})
+        self.Event._cron_process_events()
+        self.assertEqual(event.state, 'dead')
+        self.assertIn('TEST_EVT_UNKNOWN', event.last_error)
+
+    def test_05_verification_uses_the_event_account_client(self):
+        """Test an event for a non-default account verifies through that account's client and key."""
+        self.env['wallet.provider.account'].create({
+            'name': 'Second Account',
+            'code': 'second',
+            'provider': 'flutterwave',
+            'secret_key': 'FLWSECK_SECOND',
+        })
+        event = self.Event._enqueue('flutterwave', {'tx_ref': 'TEST_EVT_005', 'status': 'successful'},
+                                    account_code='second')
+        calls = []
+
+        class Client(object):
+            def verify_flutterwave(self, tx_ref, secret_key):
+                calls.append((tx_ref, secret_key))
+                return True
+
+        Account = type(self.env['wallet.provider.account'])
+        with patch.object(Account, '_http_client', lambda self, provider, code=None: calls.append(code) or Client()):
+            self.assertTrue(event._verify_flutterwave('TEST_EVT_005', 'successful'))
+        self.assertEqual(calls, ['second', ('TEST_EVT_005', 'FLWSECK_SECOND')])
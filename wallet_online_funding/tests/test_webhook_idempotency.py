@@ -0,0 +1,76 @@
+from odoo.tests.common import HttpCase, TransactionCase
+import json
+
+
+class TestWebhookIdempotency(TransactionCase):
+
+    def setUp(self):
+        super(TestWebhookIdempotency, self).setUp()
+        self.Idempotency = self.env['wallet.webhook.idempotency']
+        self.calls = []
+
+    def _handler(self, response):
+        def handler():
+            self.calls.append(response)
+            return response
+        return handler
+
+    def test_01_event_key(self):
+        """Test the provider event id is preferred over the tx_ref."""
+        self.assertEqual(self.Idempotency._event_key({'data': {'id': 4242}}, 'TX_1'), '4242')
+        self.assertEqual(self.Idempotency._event_key({'status': 'successful'}, 'TX_1'), 'TX_1')
+
+    def test_02_duplicate_replays_stored_response(self):
+        """Test a duplicate delivery returns the first response with one read and no writes."""
+        first = self.Idempotency._run_once('flutterwave', 'EVT_1', self._handler({'status': 'queued', 'event_id': 7}))
+        self.env.flush_all()
+
+        with self.assertQueryCount(1):
+            second = self.Idempotency._run_once('flutterwave', 'EVT_1', self._handler({'status': 'queued', 'event_id': 8}))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.calls), 1, "Handler must run only for the first delivery")
+
+    def test_03_errors_are_not_remembered(self):
+        """Test failed deliveries are processed again on redelivery."""
+        self.Idempotency._run_once('flutterwave', 'EVT_2', self._handler({'status': 'error', 'message': 'Customer not found'}))
+        response = self.Idempotency._run_once('flutterwave', 'EVT_2', self._handler({'status': 'success'}))
+
+        self.assertEqual(response, {'status': 'success'})
+        self.assertEqual(len(self.calls), 2)
+
+        def crash():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            self.Idempotency._run_once('flutterwave', 'EVT_3', crash)
+        self.assertIsNone(self.Idempotency._lookup('flutterwave', 'EVT_3'), "A crashing handler must release its claim")
+
+
+class TestFlutterwaveCallback(HttpCase):
+
+    def setUp(self):
+        super(TestFlutterwaveCallback, self).setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Callback User', 'email': 'callback@example.com'})
+        self.env['wallet.provider.account'].create({
+            'name': 'Default', 'code': 'TEST_CALLBACK', 'provider': 'flutterwave', 'sequence': -1,
+            'secret_hash': 'TEST_HASH',
+        })
+
+    def _post(self, signature=None):
+        headers = {'Content-Type': 'application/json'}
+        if signature:
+            headers['verif-hash'] = signature
+        body = json.dumps({'tx_ref': 'TEST_CALLBACK_1', 'status': 'successful', 'amount': 40,
+                           'customer': {'email': 'callback@example.com'}})
+        return self.url_open('/wallet/flutterwave/callback', data=body, headers=headers).json()['result']
+
+    def test_01_signature_is_required(self):
+        """Test unsigned or wrongly signed callbacks credit nothing and a signed one credits once."""
+        self.assertEqual(self._post()['message'], 'Invalid signature')
+        self.assertEqual(self._post('WRONG')['message'], 'Invalid signature')
+        self.assertFalse(self.env['wallet.transaction'].search([('partner_id', '=', self.partner.id)]))
+
+        self.assertEqual(self._post('TEST_HASH'), {'status': 'success'})
+        self.partner.invalidate_recordset(['wallet_balance'])
+        self.assertAlmostEqual(self.partner.wallet_balance, 40.00, 2)
@@ -1,16 +1,25 @@
 {
     'name': 'Customer Wallet System',
-    'version': '1.0',
+    'version': '1.2',
     'category': 'Website',
     'summary': 'Allow customers to manage wallet, top-up online, and use for payments',
     'author': 'Joseph Benson', 
     'depends': ['base', 'website', 'sale', 'mail'],
     'data': [
+        'security/wallet_security.xml',
+        'security/ir.model.access.csv',
+        'views/wallet_statement_views.xml',
         'views/wallet_menu.xml',
         'views/wallet_template.xml',
         'views/wallet_view.xml',
         'data/mail_template.xml',
+        'data/wallet_cron.xml',
     ],
+    'assets': {
+        'web.assets_frontend': [
+            'wallet_system/static/src/js/wallet_history.js',
+        ],
+    },
     'installable': True,
     'application': True,
 }
@@ -1,17 +1,204 @@
-from odoo import http
+from odoo import http, fields, api
 from odoo.http import request
+import hashlib
+import logging
+import time
+
+from ..models.wallet_statement import STATEMENT_INLINE_ROWS
+
+_logger = logging.getLogger(__name__)
+
+# Transactions rendered per page on /wallet and returned per "load more" call
+PAGE_SIZE = 50
+# Maximum number of partners in one batch balance call
+BALANCE_BATCH_LIMIT = 500
+# Recent statement requests listed on /wallet
+STATEMENT_LIST_SIZE = 5
+
 
 class WalletController(http.Controller):
 
-    @http.route(['/wallet'], type='http', auth='user', website=True)
-    def wallet_page(self, **kw):
+    def _get_wallet(self, create=False):
         customer = request.env.user.partner_id
         wallet = request.env['wallet.system'].sudo().search([('customer_id', '=', customer.id)], limit=1)
-        if not wallet:
+        if not wallet and create:
             wallet = request.env['wallet.system'].sudo().create({'customer_id': customer.id})
-        transactions = request.env['wallet.transaction'].sudo().search([('wallet_id', '=', wallet.id)], order='date desc')
+        return wallet
+
+    def _decode_cursor(self, cursor):
+        """A cursor is ``<date>,<id>`` of the last row already shown; None if it is malformed."""
+        try:
+            date, rec_id = cursor.rsplit(',', 1)
+            date = fields.Datetime.to_datetime(date)
+            return (date, int(rec_id)) if date else None
+        except (AttributeError, ValueError):
+            return None
+
+    def _fetch_transactions(self, wallet, after=None, limit=PAGE_SIZE):
+        """Return one page of history and the cursor for the next one (keyset pagination on (date, id))."""
+        rows, more = wallet.sudo()._history_page(after=after, limit=limit)
+        next_cursor = None
+        if more:
+            last = rows[-1]
+            next_cursor = '%s,%s' % (fields.Datetime.to_string(last['date']), last['id'])
+        return rows, next_cursor
+
+    @http.route(['/wallet'], type='http', auth='user', website=True)
+    def wallet_page(self, **kw):
+        wallet = self._get_wallet(create=True)
+        transactions, next_cursor = self._fetch_transactions(wallet)
+        statements = request.env['wallet.statement'].sudo().search(
+            [('wallet_id', '=', wallet.id)], limit=STATEMENT_LIST_SIZE)
         return request.render('wallet_system.wallet_page_template', {
             'wallet': wallet,
             'transactions': transactions,
+            'next_cursor': next_cursor,
+            'statements': statements,
+            'statement_error': kw.get('statement_error'),
         })
 
+    @http.route(['/wallet/transactions'], type='http', auth='user', methods=['GET'])
+    def wallet_transactions(self, cursor=None, **kw):
+        """Next page of the transaction history as JSON ("load more")."""
+        after = None
+        if cursor:
+            after = self._decode_cursor(cursor)
+            if not after:
+                # never silently restart at page 1: the client would show rows twice
+                return request.make_json_response({'error': 'invalid cursor'}, status=400)
+        wallet = self._get_wallet()
+        if not wallet:
+            return request.make_json_response({'transactions': [], 'next_cursor': None})
+        rows, next_cursor = self._fetch_transactions(wallet, after=after)
+        for row in rows:
+            row['date'] = fields.Datetime.to_string(row['date'])
+        return request.make_json_response({'transactions': rows, 'next_cursor': next_cursor})
+
+    # -------------------------------------------------------------------------
+    # Statements
+    # -------------------------------------------------------------------------
+
+    def _stream_csv(self, statement):
+        """Stream a CSV statement as it is read; the request cursor is gone by then, so open one."""
+        registry, uid, context, statement_id = request.env.registry, request.env.uid, request.env.context, statement.id
+
+        def generate():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                yield from env['wallet.statement'].sudo().browse(statement_id)._csv_chunks()
+
+        return request.make_response(generate(), headers=[
+            ('Content-Type', 'text/csv; charset=utf-8'),
+            ('Content-Disposition', 'attachment; filename="%s"' % statement._filename()),
+            ('Cache-Control', 'no-store'),
+        ])
+
+    @http.route(['/wallet/statement'], type='http', auth='user', website=True, methods=['POST'])
+    def wallet_statement(self, date_from=None, date_to=None, file_format='csv', **kw):
+        """Statement of the logged-in customer's wallet for a date range.
+
+        Small CSV statements stream straight to the browser; PDFs and large
+        ranges are built by the cron and listed on /wallet for download.
+        """
+        try:
+            start = fields.Date.to_date(date_from)
+            end = fields.Date.to_date(date_to) or fields.Date.today()
+        except ValueError:
+            start = end = None
+        if not start or start > end:
+            return request.redirect('/wallet?statement_error=1')
+        statement = request.env['wallet.statement'].sudo().create({
+            'wallet_id': self._get_wallet(create=True).id,
+            'date_from': start,
+            'date_to': end,
+            'file_format': 'pdf' if file_format == 'pdf' else 'csv',
+        })
+        summary = statement._summary_values()
+        if statement.file_format == 'csv' and summary['row_count'] <= STATEMENT_INLINE_ROWS:
+            # sent once to the browser and not kept, hence no attachment
+            statement.write(dict(summary, state='streamed'))
+            return self._stream_csv(statement)
+        return request.redirect('/wallet')
+
+    @http.route(['/wallet/statement/<int:statement_id>/download'], type='http', auth='user', methods=['GET'])
+    def wallet_statement_download(self, statement_id, **kw):
+        wallet = self._get_wallet()
+        statement = request.env['wallet.statement'].sudo().browse(statement_id).exists()
+        if not wallet or not statement or statement.wallet_id != wallet or not statement.attachment_id:
+            return request.not_found()
+        return request.env['ir.binary']._get_stream_from(statement.attachment_id).get_response(as_attachment=True)
+
+    # -------------------------------------------------------------------------
+    # Balance polling (POS, mobile)
+    # -------------------------------------------------------------------------
+
+    def _balance_versions(self, partner_ids):
+        """Wallet id and balance version per partner, read from wallet_system alone.
+
+        ``balance_version`` is bumped by every ledger create batch, by edits of
+        an entry's date and by snapshot repairs, i.e. whenever the balance or
+        last transaction date served here may change. A ``304`` therefore reads
+        this one table and never touches the transaction or snapshot tables.
+        """
+        request.env['wallet.system'].sudo().flush_model(['customer_id', 'balance_version'])
+        request.env.cr.execute("""
+            SELECT DISTINCT ON (customer_id) customer_id, id, COALESCE(balance_version, 0)
+              FROM wallet_system
+             WHERE customer_id = ANY(%s)
+             ORDER BY customer_id, id
+        """, (list(partner_ids),))
+        return {partner_id: (wallet_id, version) for partner_id, wallet_id, version in request.env.cr.fetchall()}
+
+    def _balance_response(self, partner_ids, batch=False):
+        """JSON balances with a strong ETag; ``304`` when the client's copy is current."""
+        start = time.perf_counter()
+        partner_ids = sorted(set(partner_ids))
+        versions = self._balance_versions(partner_ids)
+        etag = hashlib.sha1(repr([(pid, versions.get(pid)) for pid in partner_ids]).encode()).hexdigest()
+        version_ms = (time.perf_counter() - start) * 1000.0
+        headers = [('ETag', '"%s"' % etag), ('Cache-Control', 'private, no-cache')]
+
+        if request.httprequest.if_none_match.contains(etag):
+            headers.append(('Server-Timing', 'version;dur=%.2f, total;dur=%.2f' % (version_ms, version_ms)))
+            _logger.debug("Balance poll for %s partners: 304 in %.2fms", len(partner_ids), version_ms)
+            return request.make_response('', headers=headers, status=304)
+
+        ledger_start = time.perf_counter()
+        wallets = request.env['wallet.system'].sudo().browse([wallet_id for wallet_id, _version in versions.values()])
+        ledger = wallets._read_ledger()
+        balances = []
+        for partner_id in partner_ids:
+            wallet_id, version = versions.get(partner_id, (False, 0))
+            balance, last_date = ledger.get(wallet_id, (0.0, False))
+            balances.append({
+                'partner_id': partner_id,
+                'balance': balance,
+                'last_transaction_date': fields.Datetime.to_string(last_date) if last_date else None,
+                'version': version,
+            })
+        ledger_ms = (time.perf_counter() - ledger_start) * 1000.0
+        total_ms = (time.perf_counter() - start) * 1000.0
+        headers.append(('Server-Timing', 'version;dur=%.2f, ledger;dur=%.2f, total;dur=%.2f' % (
+            version_ms, ledger_ms, total_ms)))
+        _logger.debug("Balance poll for %s partners: 200 in %.2fms (ledger %.2fms)",
+                      len(partner_ids), total_ms, ledger_ms)
+        return request.make_json_response({'balances': balances} if batch else balances[0], headers=headers)
+
+    @http.route(['/wallet/balance'], type='http', auth='user', methods=['GET'])
+    def wallet_balance(self, **kw):
+        """Balance of the logged-in customer."""
+        return self._balance_response([request.env.user.partner_id.id])
+
+    @http.route(['/wallet/balance/batch'], type='http', auth='user', methods=['GET'])
+    def wallet_balance_batch(self, partner_ids='', **kw):
+        """Balances of many customers in one call (``?partner_ids=1,2,3``); wallet managers only."""
+        if not request.env.user.has_group('wallet_system.group_wallet_manager'):
+            return request.make_json_response({'error': 'forbidden'}, status=403)
+        try:
+            ids = [int(pid) for pid in partner_ids.split(',') if pid.strip()]
+        except ValueError:
+            return request.make_json_response({'error': 'partner_ids must be a comma separated list of ids'}, status=400)
+        if not ids or len(ids) > BALANCE_BATCH_LIMIT:
+            return request.make_json_response(
+                {'error': 'between 1 and %s partner ids are required' % BALANCE_BATCH_LIMIT}, status=400)
+        return self._balance_response(ids, batch=True)
@@ -0,0 +1,25 @@
+def migrate(cr, version):
+    """Seed one snapshot per wallet from the legacy stored balance.
+
+    ``wallet.system.balance`` used to be a stored field updated on every
+    transaction. It is now read from the ledger, so the last stored value
+    (which includes any manually entered opening balance) becomes the base
+    snapshot at the current ledger position, marked ``opening`` so the
+    snapshot audit measures from it.
+    """
+    cr.execute("""
+        SELECT 1 FROM information_schema.columns
+         WHERE table_name = 'wallet_system' AND column_name = 'balance'
+    """)
+    if not cr.fetchone():
+        return
+    cr.execute("""
+        INSERT INTO wallet_balance_snapshot
+               (wallet_id, balance, last_transaction_id, entry_count, opening, create_date, write_date)
+        SELECT w.id, COALESCE(w.balance, 0), COALESCE(MAX(t.id), 0), COUNT(t.id), TRUE,
+               (now() at time zone 'UTC'), (now() at time zone 'UTC')
+          FROM wallet_system w
+          LEFT JOIN wallet_transaction t ON t.wallet_id = w.id
+         GROUP BY w.id, w.balance
+            ON CONFLICT (wallet_id, last_transaction_id) DO NOTHING
+    """)
@@ -0,0 +1,10 @@
+def migrate(cr, version):
+    """Mark the snapshots the 1.1 migration seeded as opening balances.
+
+    They are the only ones written without a user: ``_take_snapshots``
+    always records ``create_uid``.
+    """
+    cr.execute("""
+        UPDATE wallet_balance_snapshot SET opening = TRUE
+         WHERE create_uid IS NULL AND opening IS NOT TRUE
+    """)
@@ -1,2 +1,3 @@
 from . import wallet
 
+from . import wallet_statement
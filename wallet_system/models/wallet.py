@@ -1,18 +1,276 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from collections import Counter
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# The snapshot cron folds a wallet once it has at least this many newer entries
+SNAPSHOT_EVERY = 100
+# Only entries older than this are folded, so a transaction that allocated a lower
+# id but commits late is not hidden behind a snapshot high-water mark
+SNAPSHOT_SETTLE_SECONDS = 600
+
+# Ledger fields that make up the balance and may never change once posted
+LEDGER_FIELDS = {'wallet_id', 'amount', 'type'}
+
+# Last wallet id checked by the snapshot audit; the nightly run resumes after it
+SNAPSHOT_AUDIT_CHECKPOINT = 'wallet_system.snapshot_audit_checkpoint'
+
 
 class Wallet(models.Model):
     _name = 'wallet.system'
     _description = 'Customer Wallet'
 
-    customer_id = fields.Many2one('res.partner', string='Customer', required=True)
-    balance = fields.Float(string='Wallet Balance', default=0.0)
-    last_transaction_date = fields.Datetime(string='Last Transaction', readonly=True)
-    transaction_count = fields.Integer(string='Transaction Count', compute='_compute_transactions')
+    customer_id = fields.Many2one('res.partner', string='Customer', required=True, index=True)
+    balance = fields.Float(string='Wallet Balance', compute='_compute_ledger')
+    last_transaction_date = fields.Datetime(string='Last Transaction', compute='_compute_ledger')
+    transaction_count = fields.Integer(string='Transaction Count', compute='_compute_transactions', store=True, readonly=True)
+    balance_version = fields.Integer(string='Balance Version', default=0, readonly=True,
+                                     help='Bumped whenever the served balance or last transaction date may change')
+    snapshot_ids = fields.One2many('wallet.balance.snapshot', 'wallet_id', string='Balance Snapshots', readonly=True)
 
-    @api.depends('customer_id')
     def _compute_transactions(self):
+        """Full count in one grouped query. Runs for new wallets and on install; afterwards
+        the stored value is kept current by ``wallet.transaction.create``, one UPDATE per batch."""
+        ids = [wallet_id for wallet_id in self.ids if isinstance(wallet_id, int)]
+        counts = {}
+        if ids:
+            counts = dict(self.env['wallet.transaction']._read_group(
+                [('wallet_id', 'in', ids)], groupby=['wallet_id'], aggregates=['__count']))
         for rec in self:
-            rec.transaction_count = self.env['wallet.transaction'].search_count([('wallet_id', '=', rec.id)])
+            rec.transaction_count = counts.get(rec._origin, 0)
+
+    @api.model
+    def _bump_balance_versions(self, wallet_ids):
+        """Give the wallets a new balance version, e.g. after their snapshots were repaired."""
+        if not wallet_ids:
+            return
+        self.flush_model(['balance_version'])
+        self.env.cr.execute("""
+            UPDATE wallet_system SET balance_version = COALESCE(balance_version, 0) + 1 WHERE id = ANY(%s)
+        """, (list(wallet_ids),))
+        self.browse(wallet_ids).invalidate_recordset(['balance_version'])
+
+    def _compute_ledger(self):
+        """Balance = latest snapshot + newer ledger deltas, for the whole recordset in one query."""
+        ledger = self._read_ledger()
+        for wallet in self:
+            wallet.balance, wallet.last_transaction_date = ledger.get(wallet.id, (0.0, False))
+
+    def _history_page(self, after=None, limit=50):
+        """One page of the wallet's history, newest first, and whether more rows follow.
+
+        ``after`` is the ``(date, id)`` of the last row already shown. The row
+        comparison is a single range condition on the (wallet_id, date desc,
+        id desc) index, so Postgres seeks straight to the page and every page
+        costs the same however deep it is. Rows without a date cannot carry a
+        cursor and are left out of the history.
+        """
+        self.ensure_one()
+        self.env['wallet.transaction'].flush_model(['wallet_id', 'date', 'type', 'amount', 'reference'])
+        where, params = "", [self.id]
+        if after:
+            where = "AND (date, id) < (%s, %s)"
+            params += list(after)
+        self.env.cr.execute("""
+            SELECT id, date, type, amount, reference
+              FROM wallet_transaction
+             WHERE wallet_id = %s AND date IS NOT NULL """ + where + """
+             ORDER BY date DESC, id DESC
+             LIMIT %s
+        """, params + [limit + 1])
+        rows = self.env.cr.dictfetchall()
+        return rows[:limit], len(rows) > limit
+
+    def _read_ledger(self):
+        """``(balance, last date)`` per wallet id."""
+        ids = tuple(wallet_id for wallet_id in self.ids if isinstance(wallet_id, int))
+        if not ids:
+            return {}
+        self.env['wallet.transaction'].flush_model(['wallet_id', 'amount', 'type', 'date'])
+        self.env['wallet.balance.snapshot'].flush_model()
+        self.env.cr.execute("""
+            SELECT w.id,
+                   COALESCE(s.balance, 0) + COALESCE(d.delta, 0),
+                   (SELECT MAX(date) FROM wallet_transaction WHERE wallet_id = w.id)
+              FROM wallet_system w
+              LEFT JOIN LATERAL (
+                    SELECT balance, last_transaction_id
+                      FROM wallet_balance_snapshot
+                     WHERE wallet_id = w.id
+                     ORDER BY last_transaction_id DESC
+                     LIMIT 1
+              ) s ON TRUE
+              LEFT JOIN LATERAL (
+                    SELECT SUM(CASE WHEN type = 'credit' THEN amount ELSE -amount END) AS delta
+                      FROM wallet_transaction
+                     WHERE wallet_id = w.id AND id > COALESCE(s.last_transaction_id, 0)
+              ) d ON TRUE
+             WHERE w.id IN %s
+        """, (ids,))
+        return {wallet_id: (balance, last_date) for wallet_id, balance, last_date in self.env.cr.fetchall()}
+
+    @api.model
+    def _take_snapshots(self, wallet_ids=None, min_entries=1, settle_seconds=SNAPSHOT_SETTLE_SECONDS):
+        """Fold settled ledger entries into new snapshots in one INSERT ... SELECT.
+
+        Only wallets with at least ``min_entries`` settled entries since their last
+        snapshot get a new one. Entries are folded up to (excluding) the oldest
+        unsettled one, so the high-water mark does not skip over a younger row.
+        Returns the number of snapshots written.
+        """
+        self.env['wallet.transaction'].flush_model(['wallet_id', 'amount', 'type'])
+        cutoff = fields.Datetime.subtract(fields.Datetime.now(), seconds=settle_seconds)
+        where = "TRUE"
+        params = [self.env.uid, self.env.uid, cutoff]
+        if wallet_ids is not None:
+            if not wallet_ids:
+                return 0
+            where = "w.id IN %s"
+            params.append(tuple(wallet_ids))
+        params.append(min_entries)
+        self.env.cr.execute("""
+            INSERT INTO wallet_balance_snapshot
+                   (wallet_id, balance, last_transaction_id, entry_count, opening,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT w.id,
+                   COALESCE(s.balance, 0) + SUM(CASE WHEN t.type = 'credit' THEN t.amount ELSE -t.amount END),
+                   MAX(t.id),
+                   COUNT(t.id),
+                   FALSE,
+                   %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC')
+              FROM wallet_system w
+              LEFT JOIN LATERAL (
+                    SELECT balance, last_transaction_id
+                      FROM wallet_balance_snapshot
+                     WHERE wallet_id = w.id
+                     ORDER BY last_transaction_id DESC
+                     LIMIT 1
+              ) s ON TRUE
+              LEFT JOIN LATERAL (
+                    SELECT MIN(id) AS id
+                      FROM wallet_transaction
+                     WHERE wallet_id = w.id
+                       AND id > COALESCE(s.last_transaction_id, 0)
+                       AND create_date >= %s
+              ) u ON TRUE
+              JOIN wallet_transaction t
+                ON t.wallet_id = w.id
+               AND t.id > COALESCE(s.last_transaction_id, 0)
+               AND (u.id IS NULL OR t.id < u.id)
+             WHERE """ + where + """
+             GROUP BY w.id, s.balance
+            HAVING COUNT(t.id) >= %s
+                ON CONFLICT (wallet_id, last_transaction_id) DO NOTHING
+        """, params)
+        count = self.env.cr.rowcount
+        self.env['wallet.balance.snapshot'].invalidate_model()
+        return count
+
+    @api.model
+    def _cron_take_snapshots(self, min_entries=SNAPSHOT_EVERY):
+        count = self._take_snapshots(min_entries=min_entries)
+        _logger.info("Wrote %s wallet balance snapshots", count)
+
+    @api.model
+    def _audit_snapshots(self, start, end, repair=False):
+        """Check every snapshot of the wallets with ``start < id <= end`` against the ledger.
+
+        Only an ``opening`` snapshot (seeded by the 1.1 migration) may carry a
+        balance that has no ledger entry. Every other snapshot must equal the
+        opening balance (or 0) plus all entries up to its high-water mark. The
+        entries are summed once per range with a running total, however many
+        snapshots a wallet has. Repairing a wallet drops all its snapshots but
+        the opening one and folds the ledger again. Returns the ids of the
+        drifting wallets.
+        """
+        self.env['wallet.transaction'].flush_model(['wallet_id', 'amount', 'type'])
+        self.env['wallet.balance.snapshot'].flush_model()
+        self.env.cr.execute("""
+            WITH running AS (
+                SELECT wallet_id, id,
+                       SUM(CASE WHEN type = 'credit' THEN amount ELSE -amount END)
+                           OVER (PARTITION BY wallet_id ORDER BY id ROWS UNBOUNDED PRECEDING) AS total
+                  FROM wallet_transaction
+                 WHERE wallet_id > %(start)s AND wallet_id <= %(end)s
+            ), opening AS (
+                SELECT DISTINCT ON (wallet_id) wallet_id, balance, last_transaction_id
+                  FROM wallet_balance_snapshot
+                 WHERE wallet_id > %(start)s AND wallet_id <= %(end)s AND opening
+                 ORDER BY wallet_id, last_transaction_id
+            )
+            SELECT s.wallet_id, s.last_transaction_id, s.balance,
+                   COALESCE(o.balance, 0) + COALESCE(rs.total, 0) - COALESCE(ro.total, 0) AS expected
+              FROM wallet_balance_snapshot s
+              LEFT JOIN opening o ON o.wallet_id = s.wallet_id
+              LEFT JOIN running rs ON rs.wallet_id = s.wallet_id AND rs.id = s.last_transaction_id
+              LEFT JOIN running ro ON ro.wallet_id = s.wallet_id AND ro.id = o.last_transaction_id
+             WHERE s.wallet_id > %(start)s AND s.wallet_id <= %(end)s
+               AND s.opening IS NOT TRUE
+               AND abs(s.balance - (COALESCE(o.balance, 0) + COALESCE(rs.total, 0) - COALESCE(ro.total, 0))) > 0.005
+             ORDER BY s.wallet_id, s.last_transaction_id
+        """, {'start': start, 'end': end})
+        drift = self.env.cr.fetchall()
+        for wallet_id, last_id, stored, expected in drift:
+            _logger.warning("Wallet %s snapshot at entry %s drifted: %s stored, %s expected",
+                            wallet_id, last_id, stored, expected)
+        wallet_ids = sorted({row[0] for row in drift})
+        if wallet_ids and repair:
+            self.env.cr.execute("""
+                DELETE FROM wallet_balance_snapshot
+                 WHERE wallet_id = ANY(%s) AND opening IS NOT TRUE
+            """, (wallet_ids,))
+            self.env['wallet.balance.snapshot'].invalidate_model()
+            self._take_snapshots(wallet_ids)
+            self._bump_balance_versions(wallet_ids)
+            self.browse(wallet_ids).invalidate_recordset(['balance', 'last_transaction_date'])
+        return wallet_ids
+
+    @api.model
+    def _cron_audit_snapshots(self, chunk_size=5000, time_budget=1800, repair=True):
+        """Audit snapshots in wallet-id ranges, resuming from the checkpoint of the previous run."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        ICP = self.env['ir.config_parameter'].sudo()
+        checkpoint = int(ICP.get_param(SNAPSHOT_AUDIT_CHECKPOINT, 0))
+        self.env.cr.execute("SELECT COALESCE(MAX(id), 0) FROM wallet_system")
+        last_id = self.env.cr.fetchone()[0]
+        start_time = time.monotonic()
+        drifted = 0
+        while checkpoint < last_id and time.monotonic() - start_time < time_budget:
+            end = min(checkpoint + chunk_size, last_id)
+            drifted += len(self._audit_snapshots(checkpoint, end, repair=repair))
+            checkpoint = end
+            ICP.set_param(SNAPSHOT_AUDIT_CHECKPOINT, checkpoint)
+            if auto_commit:
+                self.env.cr.commit()
+        if checkpoint >= last_id:
+            # full pass done: the next run starts over
+            ICP.set_param(SNAPSHOT_AUDIT_CHECKPOINT, 0)
+        _logger.info("Snapshot audit reached wallet %s of %s: %s drifted", checkpoint, last_id, drifted)
+        return drifted
+
+
+class WalletBalanceSnapshot(models.Model):
+    _name = 'wallet.balance.snapshot'
+    _description = 'Wallet Balance Snapshot'
+    _order = 'wallet_id, last_transaction_id desc'
+
+    wallet_id = fields.Many2one('wallet.system', string='Wallet', required=True, ondelete='cascade')
+    balance = fields.Float(string='Balance', readonly=True)
+    last_transaction_id = fields.Integer(string='Last Ledger Entry', readonly=True,
+                                         help='Highest wallet.transaction id folded into this balance')
+    entry_count = fields.Integer(string='Entries Folded', readonly=True)
+    opening = fields.Boolean(string='Opening Balance', readonly=True,
+                             help='Seeded from the legacy stored balance; the only snapshot the ledger alone does not explain')
+
+    # the unique index also serves "latest snapshot of a wallet" lookups
+    _sql_constraints = [
+        ('wallet_entry_uniq', 'unique(wallet_id, last_transaction_id)', 'A snapshot already exists for this ledger position.'),
+    ]
+
 
 class WalletTransaction(models.Model):
     _name = 'wallet.transaction'
@@ -25,14 +283,52 @@ class WalletTransaction(models.Model):
     date = fields.Datetime(string='Date', default=fields.Datetime.now)
     notes = fields.Text(string='Notes')
 
-    @api.model
-    def create(self, vals):
-        record = super(WalletTransaction, self).create(vals)
-        wallet = record.wallet_id
-        if record.type == 'credit':
-            wallet.balance += record.amount
-        else:
-            wallet.balance -= record.amount
-        wallet.last_transaction_date = fields.Datetime.now()
-        return record
+    def init(self):
+        # balance reads sum the entries newer than the wallet's latest snapshot
+        tools.create_index(self._cr, 'wallet_transaction_wallet_id_id_idx', self._table, ['wallet_id', 'id'])
+        # portal history is keyset-paginated on (date, id) per wallet
+        tools.create_index(self._cr, 'wallet_transaction_history_idx', self._table, ['wallet_id', 'date DESC', 'id DESC'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Append ledger entries. Balances are read from the ledger; the only wallet
+        write is one UPDATE per batch bumping the stored transaction counts (so
+        lists can sort on them) and balance versions. Folding is left to the
+        snapshot cron."""
+        records = super(WalletTransaction, self).create(vals_list)
+        counts = Counter(rec.wallet_id.id for rec in records if rec.wallet_id)
+        if counts:
+            self.env['wallet.system'].flush_model(['transaction_count', 'balance_version'])
+            self.env.cr.execute("""
+                UPDATE wallet_system w
+                   SET transaction_count = COALESCE(w.transaction_count, 0) + v.cnt,
+                       balance_version = COALESCE(w.balance_version, 0) + 1
+                  FROM unnest(%s::int[], %s::int[]) AS v(id, cnt)
+                 WHERE w.id = v.id
+            """, (list(counts), list(counts.values())))
+        wallets = records.mapped('wallet_id')
+        wallets.invalidate_recordset(['balance', 'last_transaction_date', 'transaction_count', 'balance_version'])
+        return records
+
+    def write(self, vals):
+        if LEDGER_FIELDS & set(vals):
+            raise UserError('Wallet transactions are immutable. Post a reversing entry instead.')
+        res = super(WalletTransaction, self).write(vals)
+        if 'date' in vals:
+            # the served last transaction date may move
+            self.env['wallet.system']._bump_balance_versions(self.mapped('wallet_id').ids)
+            self.mapped('wallet_id').invalidate_recordset(['last_transaction_date'])
+        return res
+
+    def unlink(self):
+        raise UserError('Wallet transactions cannot be deleted. Post a reversing entry instead.')
 
+    def action_reverse(self):
+        """Post the opposite entry for each transaction."""
+        return self.create([{
+            'wallet_id': rec.wallet_id.id,
+            'amount': rec.amount,
+            'type': 'debit' if rec.type == 'credit' else 'credit',
+            'reference': rec.reference,
+            'notes': 'Reversal of transaction %s' % rec.id,
+        } for rec in self])
@@ -0,0 +1,318 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+from contextlib import ExitStack
+from datetime import datetime, time as dt_time, timedelta
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+import csv
+import io
+import logging
+import shutil
+import tempfile
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Ledger rows fetched per round trip from the server-side cursor
+STATEMENT_CHUNK_SIZE = 2000
+# Larger statements are built by the cron instead of during the request
+STATEMENT_INLINE_ROWS = 20000
+# Generated statements are removed after this many days
+STATEMENT_RETENTION_DAYS = 30
+
+STATEMENT_COLUMNS = ['Date', 'Type', 'Reference', 'Notes', 'Amount', 'Balance']
+PDF_ROWS_PER_PAGE = 45
+# reportlab keeps every page of a canvas until it is saved, so PDFs are drawn
+# onto a fresh canvas (and temporary file) every this many pages and joined at the end
+PDF_PAGES_PER_PART = 200
+# Bytes copied at a time when a single-part PDF is moved onto the output stream
+FILE_COPY_BLOCK = 1 << 20
+
+
+class WalletStatement(models.Model):
+    _name = 'wallet.statement'
+    _description = 'Wallet Statement'
+    _order = 'id desc'
+
+    wallet_id = fields.Many2one('wallet.system', string='Wallet', required=True, ondelete='cascade', index=True)
+    partner_id = fields.Many2one(related='wallet_id.customer_id', string='Customer', store=True)
+    date_from = fields.Date(string='From', required=True)
+    date_to = fields.Date(string='To', required=True, default=fields.Date.context_today)
+    file_format = fields.Selection([('csv', 'CSV'), ('pdf', 'PDF')], string='Format', default='csv', required=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('streamed', 'Streamed'),
+        ('failed', 'Failed'),
+    ], string='State', default='queued', required=True, index=True)
+    row_count = fields.Integer(string='Transactions', readonly=True)
+    opening_balance = fields.Float(string='Opening Balance', readonly=True)
+    closing_balance = fields.Float(string='Closing Balance', readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string='File', readonly=True, ondelete='set null')
+    error = fields.Text(string='Error', readonly=True)
+
+    _sql_constraints = [
+        ('date_range_check', 'CHECK(date_from <= date_to)', 'The statement period ends before it starts.'),
+    ]
+
+    def _period(self):
+        """Half-open UTC datetime range covering the statement days."""
+        return (datetime.combine(self.date_from, dt_time.min),
+                datetime.combine(self.date_to + timedelta(days=1), dt_time.min))
+
+    def _filename(self):
+        return 'wallet-statement-%s-%s-%s.%s' % (self.wallet_id.id, self.date_from, self.date_to, self.file_format)
+
+    def _period_totals(self):
+        """``(row count, net amount)`` of the period, from one range scan of the history index."""
+        start, end = self._period()
+        self.env['wallet.transaction'].flush_model(['wallet_id', 'amount', 'type', 'date'])
+        self.env.cr.execute("""
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN type = 'credit' THEN amount ELSE -amount END), 0)
+              FROM wallet_transaction
+             WHERE wallet_id = %s AND date >= %s AND date < %s
+        """, (self.wallet_id.id, start, end))
+        return self.env.cr.fetchone()
+
+    def _summary_values(self):
+        """Row count and balances of the period, as stored on the statement."""
+        row_count, net = self._period_totals()
+        opening = self._opening_balance()
+        return {
+            'row_count': row_count,
+            'opening_balance': opening,
+            'closing_balance': opening + net,
+        }
+
+    def _opening_balance(self):
+        """Balance at the start of the period: the current balance minus everything posted since.
+
+        Going back from the current balance keeps opening balances carried by
+        snapshots (which have no ledger entry) in the figure.
+        """
+        start = self._period()[0]
+        current = self.wallet_id._read_ledger().get(self.wallet_id.id, (0.0, False))[0]
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(CASE WHEN type = 'credit' THEN amount ELSE -amount END), 0)
+              FROM wallet_transaction
+             WHERE wallet_id = %s AND date >= %s
+        """, (self.wallet_id.id, start))
+        return current - self.env.cr.fetchone()[0]
+
+    def _iter_chunks(self, opening):
+        """Yield the period's ledger rows in chunks of ``STATEMENT_CHUNK_SIZE``, oldest first.
+
+        The rows come from a server-side cursor, so neither the database driver
+        nor this process ever holds more than one chunk. Each row is
+        ``(date, type, reference, notes, amount, running balance)``.
+        """
+        start, end = self._period()
+        cursor_name = 'wallet_statement_%s' % self.id
+        cr = self.env.cr
+        cr.execute("""
+            DECLARE """ + cursor_name + """ NO SCROLL CURSOR FOR
+            SELECT date, type, reference, notes, amount,
+                   %s + SUM(CASE WHEN type = 'credit' THEN amount ELSE -amount END)
+                        OVER (ORDER BY date, id ROWS UNBOUNDED PRECEDING)
+              FROM wallet_transaction
+             WHERE wallet_id = %s AND date >= %s AND date < %s
+             ORDER BY date, id
+        """, (opening, self.wallet_id.id, start, end))
+        try:
+            while True:
+                cr.execute("FETCH %s FROM " + cursor_name, (STATEMENT_CHUNK_SIZE,))
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cr.execute("CLOSE " + cursor_name)
+
+    def _csv_chunks(self):
+        """The CSV statement as a sequence of encoded chunks, one per fetched block of rows."""
+        self.ensure_one()
+        self.env['wallet.transaction'].flush_model()
+        opening = self._opening_balance()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Statement', self.wallet_id.customer_id.display_name, str(self.date_from), str(self.date_to)])
+        writer.writerow(['Opening balance', '', '', '', '', '%.2f' % opening])
+        writer.writerow(STATEMENT_COLUMNS)
+        for rows in self._iter_chunks(opening):
+            for date, tx_type, reference, notes, amount, balance in rows:
+                writer.writerow([fields.Datetime.to_string(date), tx_type, reference or '', notes or '',
+                                 '%.2f' % (amount if tx_type == 'credit' else -amount), '%.2f' % balance])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+
+    def _write_pdf(self, stream):
+        """Draw the statement page by page onto ``stream``; returns the closing balance.
+
+        Rows are drawn as they are fetched and never kept. Every
+        ``PDF_PAGES_PER_PART`` pages the canvas is saved to its own temporary
+        file and a new one is started, so memory is bounded by one part rather
+        than the whole statement; the parts are then joined onto ``stream``.
+        """
+        self.ensure_one()
+        self.env['wallet.transaction'].flush_model()
+        opening = balance = self._opening_balance()
+        width, height = A4
+        offsets = [40, 150, 200, 330, 440, 510]
+        with ExitStack() as stack:
+            parts = []
+            pdf = None
+            page = 0
+
+            def start_page():
+                nonlocal pdf, page
+                if page % PDF_PAGES_PER_PART == 0:
+                    if pdf:
+                        pdf.save()
+                    part = stack.enter_context(tempfile.TemporaryFile())
+                    parts.append(part)
+                    pdf = canvas.Canvas(part, pagesize=A4, pageCompression=1)
+                page += 1
+                pdf.setFont('Helvetica-Bold', 12)
+                pdf.drawString(40, height - 40, 'Wallet statement: %s' % self.wallet_id.customer_id.display_name)
+                pdf.setFont('Helvetica', 9)
+                pdf.drawString(40, height - 56, 'Period %s to %s' % (self.date_from, self.date_to))
+                pdf.drawRightString(width - 40, height - 56, 'Page %s' % page)
+                pdf.setFont('Helvetica-Bold', 9)
+                for x, title in zip(offsets, STATEMENT_COLUMNS):
+                    pdf.drawString(x, height - 80, title)
+                pdf.setFont('Helvetica', 8)
+                return height - 96
+
+            y = start_page()
+            pdf.drawString(offsets[0], y, 'Opening balance')
+            pdf.drawRightString(width - 40, y, '%.2f' % opening)
+            y -= 14
+            lines = 1
+            for rows in self._iter_chunks(opening):
+                for date, tx_type, reference, notes, amount, balance in rows:
+                    if lines >= PDF_ROWS_PER_PAGE:
+                        pdf.showPage()
+                        y = start_page()
+                        lines = 0
+                    values = [fields.Datetime.to_string(date), tx_type, (reference or '')[:24], (notes or '')[:22],
+                              '%.2f' % (amount if tx_type == 'credit' else -amount)]
+                    for x, value in zip(offsets, values):
+                        pdf.drawString(x, y, value)
+                    pdf.drawRightString(width - 40, y, '%.2f' % balance)
+                    y -= 14
+                    lines += 1
+            pdf.setFont('Helvetica-Bold', 9)
+            pdf.drawString(offsets[0], y - 6, 'Closing balance')
+            pdf.drawRightString(width - 40, y - 6, '%.2f' % balance)
+            pdf.showPage()
+            pdf.save()
+
+            if len(parts) == 1:
+                parts[0].seek(0)
+                shutil.copyfileobj(parts[0], stream, FILE_COPY_BLOCK)
+            else:
+                # the readers load page content from their files as the writer outputs it
+                writer = PdfFileWriter()
+                for part in parts:
+                    part.seek(0)
+                    reader = PdfFileReader(part, strict=False)
+                    for index in range(reader.getNumPages()):
+                        writer.addPage(reader.getPage(index))
+                writer.write(stream)
+        return balance
+
+    def _attach(self, stream):
+        """Attach the file built in ``stream`` to the statement.
+
+        The statement is built in a temporary file and read back once here;
+        storage (filestore or database) is left to ``ir.attachment``.
+        """
+        stream.seek(0)
+        return self.env['ir.attachment'].sudo().create({
+            'name': self._filename(),
+            'res_model': self._name,
+            'res_id': self.id,
+            'mimetype': 'application/pdf' if self.file_format == 'pdf' else 'text/csv',
+            'raw': stream.read(),
+        })
+
+    def _generate(self):
+        """Build the file into a temporary file and attach it to the statement."""
+        self.ensure_one()
+        self.write({'state': 'running', 'error': False})
+        summary = self._summary_values()
+        with tempfile.TemporaryFile() as stream:
+            if self.file_format == 'pdf':
+                self._write_pdf(stream)
+            else:
+                for chunk in self._csv_chunks():
+                    stream.write(chunk)
+            attachment = self._attach(stream)
+        if self.attachment_id:
+            self.attachment_id.sudo().unlink()
+        self.write(dict(summary, state='done', attachment_id=attachment.id))
+        return attachment
+
+    def action_generate(self):
+        """Build small statements now; larger ones are left to the cron."""
+        for statement in self:
+            if statement.state == 'running':
+                raise UserError('This statement is already being generated.')
+            if statement._period_totals()[0] <= STATEMENT_INLINE_ROWS:
+                statement._generate()
+            else:
+                statement.write({'state': 'queued', 'error': False})
+        return True
+
+    def action_download(self):
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError('The statement has not been generated yet.')
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % self.attachment_id.id,
+            'target': 'self',
+        }
+
+    @api.model
+    def _cron_generate(self, limit=10):
+        """Generate queued statements, claiming each one so parallel cron workers never build it twice."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        done = 0
+        for _i in range(limit):
+            self.env.cr.execute("""
+                UPDATE wallet_statement SET state = 'running'
+                 WHERE id = (SELECT id FROM wallet_statement WHERE state = 'queued'
+                              ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED)
+             RETURNING id
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            statement = self.browse(row[0])
+            statement.invalidate_recordset(['state'])
+            if auto_commit:
+                self.env.cr.commit()
+            try:
+                statement._generate()
+            except Exception as e:
+                if not auto_commit:
+                    raise
+                self.env.cr.rollback()
+                _logger.exception("Wallet statement %s failed", statement.id)
+                statement.write({'state': 'failed', 'error': str(e)})
+            else:
+                done += 1
+            if auto_commit:
+                self.env.cr.commit()
+        return done
+
+    @api.autovacuum
+    def _gc_statements(self):
+        old = self.search([('create_date', '<', fields.Datetime.now() - timedelta(days=STATEMENT_RETENTION_DAYS))])
+        old.attachment_id.sudo().unlink()
+        old.unlink()
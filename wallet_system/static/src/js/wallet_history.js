@@ -0,0 +1,32 @@
+/** Appends the next page of /wallet history when "Load more" is clicked. */
+document.addEventListener('click', async function (ev) {
+    const button = ev.target.closest('.o_wallet_load_more');
+    if (!button) {
+        return;
+    }
+    button.disabled = true;
+    const response = await fetch('/wallet/transactions?cursor=' + encodeURIComponent(button.dataset.cursor), {
+        credentials: 'same-origin',
+    });
+    if (!response.ok) {
+        button.remove();
+        return;
+    }
+    const page = await response.json();
+    const body = document.querySelector('.o_wallet_history');
+    for (const txn of page.transactions) {
+        const row = document.createElement('tr');
+        for (const value of [txn.date, txn.type, txn.amount, txn.reference]) {
+            const cell = document.createElement('td');
+            cell.textContent = value === false || value === null ? '' : value;
+            row.appendChild(cell);
+        }
+        body.appendChild(row);
+    }
+    if (page.next_cursor) {
+        button.dataset.cursor = page.next_cursor;
+        button.disabled = false;
+    } else {
+        button.remove();
+    }
+});
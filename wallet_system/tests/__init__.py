@@ -0,0 +1,4 @@
+from . import test_wallet_history
+from . import test_wallet_statement
+from . import test_wallet_ledger
+from . import test_wallet_balance_api
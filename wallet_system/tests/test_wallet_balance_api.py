@@ -0,0 +1,82 @@
+from odoo.tests.common import HttpCase, new_test_user, tagged
+from odoo.tools import mute_logger
+
+
+@tagged('-at_install', 'post_install')
+class TestWalletBalanceApi(HttpCase):
+
+    def setUp(self):
+        super(TestWalletBalanceApi, self).setUp()
+        self.customer = new_test_user(self.env, login='balance_portal', groups='base.group_portal')
+        self.cashier = new_test_user(self.env, login='balance_cashier', groups='base.group_user')
+        self.manager = new_test_user(self.env, login='balance_manager', groups='wallet_system.group_wallet_manager')
+        self.wallet = self.env['wallet.system'].create({'customer_id': self.customer.partner_id.id})
+        self._post(40.0)
+
+    def _post(self, amount):
+        self.env['wallet.transaction'].create({
+            'wallet_id': self.wallet.id, 'type': 'credit', 'amount': amount, 'reference': 'TEST_BALANCE_API'})
+        self.env.flush_all()
+
+    def test_01_unchanged_balance_answers_304(self):
+        """Test a poll with the current ETag gets 304 and a new entry changes the ETag."""
+        self.authenticate('balance_portal', 'balance_portal')
+        response = self.url_open('/wallet/balance')
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['balance'], 40.0, 2)
+        etag = response.headers['ETag']
+
+        again = self.url_open('/wallet/balance', headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertFalse(again.content)
+        self.assertEqual(again.headers['ETag'], etag)
+
+        self._post(2.5)
+        changed = self.url_open('/wallet/balance', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertAlmostEqual(changed.json()['balance'], 42.5, 2)
+
+    def test_02_batch_is_for_wallet_managers(self):
+        """Test the batch lookup refuses portal and plain internal users and answers per partner, with or without a wallet."""
+        ids = '%s,%s' % (self.customer.partner_id.id, self.cashier.partner_id.id)
+        for login in ('balance_portal', 'balance_cashier'):
+            self.authenticate(login, login)
+            self.assertEqual(self.url_open('/wallet/balance/batch?partner_ids=%s' % ids).status_code, 403)
+
+        self.authenticate('balance_manager', 'balance_manager')
+        self.assertEqual(self.url_open('/wallet/balance/batch?partner_ids=1,x').status_code, 400)
+        response = self.url_open('/wallet/balance/batch?partner_ids=%s' % ids)
+        self.assertEqual(response.status_code, 200)
+        balances = {row['partner_id']: row['balance'] for row in response.json()['balances']}
+        self.assertEqual(balances, {self.customer.partner_id.id: 40.0, self.cashier.partner_id.id: 0.0})
+
+        cached = self.url_open('/wallet/balance/batch?partner_ids=%s' % ids,
+                               headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_03_repair_and_date_edit_change_the_etag(self):
+        """Test a snapshot repair and an edited entry date both invalidate the client's copy."""
+        self.env.cr.execute("UPDATE wallet_transaction SET create_date = create_date - interval '1 hour' WHERE wallet_id = %s",
+                            (self.wallet.id,))
+        self.env['wallet.system']._take_snapshots(self.wallet.ids)
+        self.env.cr.execute("UPDATE wallet_balance_snapshot SET balance = 999 WHERE wallet_id = %s", (self.wallet.id,))
+        self.env.invalidate_all()
+
+        self.authenticate('balance_portal', 'balance_portal')
+        stale = self.url_open('/wallet/balance')
+        self.assertAlmostEqual(stale.json()['balance'], 999.0, 2)
+
+        with mute_logger('odoo.addons.wallet_system.models.wallet'):
+            self.env['wallet.system']._audit_snapshots(self.wallet.id - 1, self.wallet.id, repair=True)
+        self.env.flush_all()
+        repaired = self.url_open('/wallet/balance', headers={'If-None-Match': stale.headers['ETag']})
+        self.assertEqual(repaired.status_code, 200)
+        self.assertNotEqual(repaired.headers['ETag'], stale.headers['ETag'])
+        self.assertAlmostEqual(repaired.json()['balance'], 40.0, 2)
+
+        self.env['wallet.transaction'].search([('wallet_id', '=', self.wallet.id)]).write({'date': '2020-01-01 00:00:00'})
+        self.env.flush_all()
+        redated = self.url_open('/wallet/balance', headers={'If-None-Match': repaired.headers['ETag']})
+        self.assertEqual(redated.status_code, 200)
+        self.assertEqual(redated.json()['last_transaction_date'], '2020-01-01 00:00:00')
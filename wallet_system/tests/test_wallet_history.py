@@ -0,0 +1,43 @@
+from odoo.tests.common import TransactionCase
+from datetime import datetime
+
+
+class TestWalletHistory(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletHistory, self).setUp()
+        partner = self.env['res.partner'].create({'name': 'History Customer'})
+        self.wallet = self.env['wallet.system'].create({'customer_id': partner.id})
+        # several entries share a date, so pages must break ties on id
+        dates = [datetime(2024, 5, day, 10, 0) for day in (1, 1, 2, 2, 2, 3, 4)]
+        self.txs = self.env['wallet.transaction'].create([{
+            'wallet_id': self.wallet.id,
+            'amount': 10.0 + i,
+            'type': 'credit',
+            'reference': 'TEST_HISTORY_%s' % i,
+            'date': date,
+        } for i, date in enumerate(dates)])
+        self.undated = self.env['wallet.transaction'].create({
+            'wallet_id': self.wallet.id, 'amount': 1.0, 'type': 'credit', 'reference': 'TEST_HISTORY_UNDATED'})
+        self.undated.write({'date': False})
+
+    def test_01_pages_follow_date_and_id(self):
+        """Test paging walks every dated entry once, newest first, with ties broken by id."""
+        seen, after, pages = [], None, 0
+        while True:
+            rows, more = self.wallet._history_page(after=after, limit=3)
+            seen += [row['id'] for row in rows]
+            pages += 1
+            if not more:
+                break
+            after = (rows[-1]['date'], rows[-1]['id'])
+
+        expected = self.txs.sorted(key=lambda tx: (tx.date, tx.id), reverse=True).ids
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+        self.assertNotIn(self.undated.id, seen, "Entries without a date cannot be paginated")
+
+    def test_02_page_after_last_row_is_empty(self):
+        """Test the page after the oldest entry is empty and reports no more rows."""
+        oldest = self.txs.sorted(key=lambda tx: (tx.date, tx.id))[0]
+        self.assertEqual(self.wallet._history_page(after=(oldest.date, oldest.id)), ([], False))
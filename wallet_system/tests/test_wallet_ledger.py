@@ -0,0 +1,161 @@
+from odoo.exceptions import UserError
+from odoo.modules.migration import load_script
+from odoo.tests.common import TransactionCase
+from odoo.tools import file_path, mute_logger
+
+
+class TestWalletLedger(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletLedger, self).setUp()
+        partner = self.env['res.partner'].create({'name': 'Ledger Customer'})
+        self.wallet = self.env['wallet.system'].create({'customer_id': partner.id})
+        self.Transaction = self.env['wallet.transaction']
+
+    def _post(self, *entries):
+        return self.Transaction.create([{
+            'wallet_id': self.wallet.id,
+            'type': tx_type,
+            'amount': amount,
+            'reference': 'TEST_LEDGER',
+        } for tx_type, amount in entries])
+
+    def _age(self, transactions, minutes=60):
+        """Make entries look committed ``minutes`` ago, past the snapshot settle window."""
+        self.Transaction.flush_model()
+        self.env.cr.execute("""
+            UPDATE wallet_transaction SET create_date = create_date - make_interval(mins => %s) WHERE id IN %s
+        """, (minutes, tuple(transactions.ids)))
+        self.Transaction.invalidate_model(['create_date'])
+
+    def test_01_balance_folds_into_snapshots(self):
+        """Test the balance is the latest snapshot plus newer entries, before and after folding."""
+        first = self._post(('credit', 100.0), ('debit', 30.0))
+        self._age(first)
+        self.assertAlmostEqual(self.wallet.balance, 70.0, 2)
+
+        self.assertEqual(self.env['wallet.system']._take_snapshots(self.wallet.ids), 1)
+        snapshot = self.wallet.snapshot_ids
+        self.assertEqual((snapshot.last_transaction_id, snapshot.entry_count), (max(first.ids), 2))
+        self.assertAlmostEqual(snapshot.balance, 70.0, 2)
+
+        self._post(('credit', 5.0))
+        self.wallet.invalidate_recordset(['balance'])
+        self.assertAlmostEqual(self.wallet.balance, 75.0, 2)
+        self.assertEqual(self.env['wallet.system']._take_snapshots(self.wallet.ids), 0,
+                         "An entry still inside the settle window is not folded")
+
+    def test_02_late_entry_holds_back_the_snapshot(self):
+        """Test folding stops before the oldest unsettled entry, even if higher ids have settled."""
+        early, late, settled = self._post(('credit', 10.0), ('credit', 20.0), ('credit', 40.0))
+        # ``late`` allocated its id before ``settled`` but committed after it
+        self._age(early | settled)
+
+        self.assertEqual(self.env['wallet.system']._take_snapshots(self.wallet.ids), 1)
+        self.assertEqual(self.wallet.snapshot_ids.last_transaction_id, early.id)
+        self.assertAlmostEqual(self.wallet.snapshot_ids.balance, 10.0, 2)
+        self.assertAlmostEqual(self.wallet.balance, 70.0, 2)
+
+        self._age(late)
+        self.assertEqual(self.env['wallet.system']._take_snapshots(self.wallet.ids), 1)
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        self.assertEqual(self.wallet.snapshot_ids[0].last_transaction_id, settled.id)
+        self.assertAlmostEqual(self.wallet.balance, 70.0, 2)
+
+    def test_03_migration_anchors_the_legacy_balance(self):
+        """Test the 1.1 migration keeps a legacy opening balance and the audit measures from it."""
+        entry = self._post(('credit', 30.0))
+        self.env.flush_all()
+        # the pre-1.1 stored balance includes a 70.00 opening balance with no ledger entry
+        self.env.cr.execute("ALTER TABLE wallet_system ADD COLUMN balance numeric")
+        self.env.cr.execute("UPDATE wallet_system SET balance = 100 WHERE id = %s", (self.wallet.id,))
+        migration = load_script(file_path('wallet_system/migrations/1.1/post-migrate.py'), 'wallet_system')
+        migration.migrate(self.env.cr, '1.0')
+        self.env.cr.execute("ALTER TABLE wallet_system DROP COLUMN balance")
+        self.env.invalidate_all()
+
+        anchor = self.wallet.snapshot_ids
+        self.assertTrue(anchor.opening)
+        self.assertEqual(anchor.last_transaction_id, entry.id)
+        self.assertAlmostEqual(anchor.balance, 100.0, 2)
+        self.assertAlmostEqual(self.wallet.balance, 100.0, 2)
+
+        later = self._post(('debit', 25.0))
+        self._age(later)
+        self.env['wallet.system']._take_snapshots(self.wallet.ids)
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        self.assertEqual(len(self.wallet.snapshot_ids), 2)
+        self.assertAlmostEqual(self.wallet.balance, 75.0, 2)
+        self.assertFalse(self.env['wallet.system']._audit_snapshots(self.wallet.id - 1, self.wallet.id))
+
+        self.env.cr.execute("UPDATE wallet_balance_snapshot SET balance = balance + 1 WHERE wallet_id = %s "
+                            "AND last_transaction_id = %s", (self.wallet.id, later.id))
+        with mute_logger('odoo.addons.wallet_system.models.wallet'):
+            drift = self.env['wallet.system']._audit_snapshots(self.wallet.id - 1, self.wallet.id, repair=True)
+        self.assertEqual(drift, self.wallet.ids)
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        self.assertIn(anchor, self.wallet.snapshot_ids, "Repair keeps the opening snapshot")
+        self.assertAlmostEqual(self.wallet.balance, 75.0, 2)
+
+    def test_04_ledger_is_immutable(self):
+        """Test posted amounts cannot be edited or deleted, only reversed."""
+        entry = self._post(('credit', 50.0))
+        with self.assertRaises(UserError):
+            entry.write({'amount': 500.0})
+        with self.assertRaises(UserError):
+            entry.write({'type': 'debit'})
+        with self.assertRaises(UserError):
+            entry.unlink()
+        entry.write({'notes': 'Checked'})
+
+        reversal = entry.action_reverse()
+        self.assertEqual((reversal.type, reversal.amount), ('debit', 50.0))
+        self.wallet.invalidate_recordset(['balance'])
+        self.assertAlmostEqual(self.wallet.balance, 0.0, 2)
+
+    def test_05_transaction_count_follows_creates(self):
+        """Test the stored transaction count grows with each create, is sortable and matches a full recount."""
+        other = self.env['wallet.system'].create({'customer_id': self.env['res.partner'].create({'name': 'Other'}).id})
+        self.assertEqual(self.wallet.transaction_count, 0)
+        self._post(('credit', 10.0), ('debit', 1.0))
+        self.Transaction.create([
+            {'wallet_id': self.wallet.id, 'type': 'credit', 'amount': 2.0},
+            {'wallet_id': other.id, 'type': 'credit', 'amount': 3.0},
+        ])
+        self.assertEqual((self.wallet.transaction_count, other.transaction_count), (3, 1))
+
+        wallets = self.env['wallet.system'].search([('id', 'in', (self.wallet | other).ids)],
+                                                   order='transaction_count desc')
+        self.assertEqual(wallets.ids, [self.wallet.id, other.id])
+        wallets._compute_transactions()
+        self.assertEqual(wallets.mapped('transaction_count'), [3, 1])
+
+    def test_06_snapshots_are_left_to_the_cron(self):
+        """Test posting never folds entries inline and the cron only folds busy wallets."""
+        entries = self._post(*[('credit', 1.0)] * 3)
+        self._age(entries)
+        self.assertFalse(self.wallet.snapshot_ids)
+
+        self.env['wallet.system']._cron_take_snapshots(min_entries=4)
+        self.assertFalse(self.wallet.snapshot_ids, "Quiet wallets are not folded")
+        self.env['wallet.system']._cron_take_snapshots(min_entries=3)
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        self.assertEqual(self.wallet.snapshot_ids.entry_count, 3)
+        self.assertAlmostEqual(self.wallet.balance, 3.0, 2)
+
+    def test_07_audit_checks_a_wallet_with_one_snapshot(self):
+        """Test a wrong first fold is reported and refolded, and is never taken as an anchor."""
+        entries = self._post(('credit', 40.0), ('debit', 15.0))
+        self._age(entries)
+        self.env['wallet.system']._take_snapshots(self.wallet.ids)
+        self.assertFalse(self.env['wallet.system']._audit_snapshots(self.wallet.id - 1, self.wallet.id))
+
+        self.env.cr.execute("UPDATE wallet_balance_snapshot SET balance = 999 WHERE wallet_id = %s", (self.wallet.id,))
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        with mute_logger('odoo.addons.wallet_system.models.wallet'):
+            drift = self.env['wallet.system']._audit_snapshots(self.wallet.id - 1, self.wallet.id, repair=True)
+        self.assertEqual(drift, self.wallet.ids)
+        self.wallet.invalidate_recordset(['snapshot_ids', 'balance'])
+        self.assertEqual(len(self.wallet.snapshot_ids), 1)
+        self.assertAlmostEqual(self.wallet.snapshot_ids.balance, 25.0, 2)
+        self.assertAlmostEqual(self.wallet.balance, 25.0, 2)
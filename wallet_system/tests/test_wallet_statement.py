@@ -0,0 +1,101 @@
+from odoo import http
+from odoo.tests.common import HttpCase, TransactionCase, new_test_user, tagged
+from odoo.tools.pdf import PdfFileReader
+from datetime import date, datetime
+from unittest.mock import patch
+import io
+
+from ..models import wallet_statement
+
+
+def _post_ledger(wallet):
+    """One entry before the period and three inside 2024-06-01..2024-06-03."""
+    wallet.env['wallet.transaction'].create([{
+        'wallet_id': wallet.id,
+        'amount': amount,
+        'type': tx_type,
+        'reference': 'TEST_STATEMENT_%s' % i,
+        'date': tx_date,
+    } for i, (tx_type, amount, tx_date) in enumerate([
+        ('credit', 50.0, datetime(2024, 5, 20, 9, 0)),
+        ('credit', 100.0, datetime(2024, 6, 1, 9, 0)),
+        ('debit', 30.0, datetime(2024, 6, 2, 9, 0)),
+        ('credit', 20.0, datetime(2024, 6, 3, 9, 0)),
+    ])])
+
+
+class TestWalletStatement(TransactionCase):
+
+    def setUp(self):
+        super(TestWalletStatement, self).setUp()
+        partner = self.env['res.partner'].create({'name': 'Statement Customer'})
+        self.wallet = self.env['wallet.system'].create({'customer_id': partner.id})
+        _post_ledger(self.wallet)
+
+    def _statement(self, file_format):
+        return self.env['wallet.statement'].create({
+            'wallet_id': self.wallet.id,
+            'date_from': date(2024, 6, 1),
+            'date_to': date(2024, 6, 3),
+            'file_format': file_format,
+        })
+
+    def test_01_csv_statement(self):
+        """Test a generated CSV carries the period's rows and running balances, and is attached whole."""
+        statement = self._statement('csv')
+        attachment = statement._generate()
+
+        self.assertEqual(statement.state, 'done')
+        self.assertEqual(statement.attachment_id, attachment)
+        self.assertEqual(statement.row_count, 3)
+        self.assertAlmostEqual(statement.opening_balance, 50.0, 2)
+        self.assertAlmostEqual(statement.closing_balance, 140.0, 2)
+
+        lines = attachment.raw.decode().splitlines()
+        self.assertEqual(lines[1], 'Opening balance,,,,,50.00')
+        self.assertEqual([line.rsplit(',', 2)[1:] for line in lines[3:]],
+                         [['100.00', '150.00'], ['-30.00', '120.00'], ['20.00', '140.00']])
+        self.assertEqual(attachment.file_size, len(attachment.raw))
+
+    def test_02_pdf_statement_is_built_in_parts(self):
+        """Test a PDF drawn across several canvases is joined into one document with every page."""
+        statement = self._statement('pdf')
+        with patch.object(wallet_statement, 'PDF_ROWS_PER_PAGE', 2), \
+                patch.object(wallet_statement, 'PDF_PAGES_PER_PART', 1):
+            attachment = statement._generate()
+
+        self.assertEqual(statement.state, 'done')
+        self.assertAlmostEqual(statement.closing_balance, 140.0, 2)
+        # opening line and one row on page 1, the last two rows on page 2
+        self.assertEqual(PdfFileReader(io.BytesIO(attachment.raw), strict=False).getNumPages(), 2)
+
+
+@tagged('-at_install', 'post_install')
+class TestWalletStatementHttp(HttpCase):
+
+    def setUp(self):
+        super(TestWalletStatementHttp, self).setUp()
+        self.user = new_test_user(self.env, login='statement_portal', groups='base.group_portal')
+        self.wallet = self.env['wallet.system'].create({'customer_id': self.user.partner_id.id})
+        _post_ledger(self.wallet)
+
+    def test_01_small_csv_is_streamed(self):
+        """Test a small CSV statement streams to the browser and is recorded with its balances."""
+        self.authenticate('statement_portal', 'statement_portal')
+        response = self.url_open('/wallet/statement', data={
+            'date_from': '2024-06-01',
+            'date_to': '2024-06-03',
+            'file_format': 'csv',
+            'csrf_token': http.Request.csrf_token(self),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/csv', response.headers['Content-Type'])
+        lines = response.text.splitlines()
+        self.assertEqual(lines[-1].rsplit(',', 1)[1], '140.00')
+
+        statement = self.env['wallet.statement'].search([('wallet_id', '=', self.wallet.id)])
+        self.assertEqual(statement.state, 'streamed')
+        self.assertFalse(statement.attachment_id)
+        self.assertEqual(statement.row_count, 3)
+        self.assertAlmostEqual(statement.opening_balance, 50.0, 2)
+        self.assertAlmostEqual(statement.closing_balance, 140.0, 2)